@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import EmailVerification
+from .models import EmailVerification, OutgoingEmail
 
 class EmailVerificationInline(admin.StackedInline):
     """Inline pour afficher la vérification d'email dans l'admin utilisateur"""
@@ -37,6 +37,14 @@ class EmailVerificationAdmin(admin.ModelAdmin):
         """Empêche la création manuelle de vérifications"""
         return False
 
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    """Admin pour la file d'envoi des emails"""
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'recipients')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+
 # Désenregistre l'admin utilisateur par défaut et enregistre le nôtre
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+
+class ObjectCache:
+    """
+    Cache à durée de vie limitée d'instances de modèles (utilisateurs résolus
+    depuis un JWT, appareils résolus depuis un jeton d'appareil).
+
+    Les instances sont stockées dans le cache Django partagé par les workers
+    (AUTH_OBJECT_CACHE) : une invalidation par les signaux est vue par tous
+    les processus, pas seulement celui qui a traité la modification. La durée
+    de vie ne borne que les écritures qui n'émettent pas de signal (.update()).
+    """
+
+    def __init__(self, key_prefix, ttl_setting):
+        self.key_prefix = key_prefix
+        self.ttl_setting = ttl_setting
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'AUTH_OBJECT_CACHE', 'default')]
+
+    @property
+    def ttl(self):
+        return getattr(settings, self.ttl_setting, 60)
+
+    def _key(self, object_id):
+        return f'{self.key_prefix}:{object_id}'
+
+    def get(self, object_id):
+        if self.ttl <= 0:
+            return None
+        # Instance désérialisée : les modifications faites pendant une requête ne touchent pas le cache
+        return self.cache.get(self._key(object_id))
+
+    def set(self, object_id, instance):
+        if self.ttl <= 0:
+            return
+        self.cache.set(self._key(object_id), instance, timeout=self.ttl)
+
+    def invalidate(self, object_id):
+        """
+        Supprime l'entrée immédiatement puis après le commit, pour qu'une
+        lecture concurrente pendant la transaction ne remette pas en cache
+        l'état précédent.
+        """
+        key = self._key(object_id)
+        self.cache.delete(key)
+        transaction.on_commit(lambda: self.cache.delete(key))
+
+    def clear(self):
+        """Vide le cache partagé entier (tests)"""
+        self.cache.clear()
+
+
+user_cache = ObjectCache('auth:user', 'AUTH_USER_CACHE_TTL')
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication qui évite la requête sur auth_user pour les utilisateurs récents"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            return super().get_user(validated_token)
+
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+            return user
+
+        if not user.is_active:
+            raise AuthenticationFailed("L'utilisateur est inactif", code="user_inactive")
+        return user
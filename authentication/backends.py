@@ -0,0 +1,29 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+
+class EmailBackend(ModelBackend):
+    """
+    Authentification par email : une seule requête (index auth_user_email_idx)
+    qui charge aussi le statut de vérification de l'email.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+
+        user = (
+            User._default_manager
+            .select_related('email_verification')
+            .filter(email=email)
+            .order_by('pk')
+            .first()
+        )
+        if user is None:
+            # Hacher quand même le mot de passe pour ne pas révéler l'existence du compte
+            User().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,121 @@
+import threading
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.html import conditional_escape
+
+VERIFICATION_SUBJECT = 'Vérifiez votre adresse email - Antivol'
+VERIFICATION_TEMPLATE = 'authentication/verification_email.html'
+
+VERIFICATION_PLAIN_TEMPLATE = """
+Bonjour {first_name},
+
+Merci de vous être inscrit sur Antivol. Pour activer votre compte, vous avez deux options :
+
+1. Cliquer sur ce lien : {verification_url}
+
+2. Ou saisir ce code dans l'application : {verification_code}
+
+Si vous n'avez pas créé ce compte, vous pouvez ignorer cet email.
+
+Cordialement,
+L'équipe Antivol
+            """
+
+# Marqueurs insérés à la place des champs propres à chaque utilisateur
+PLACEHOLDERS = {
+    'first_name': '@@ANTIVOL_FIRST_NAME@@',
+    'verification_url': '@@ANTIVOL_VERIFICATION_URL@@',
+    'verification_code': '@@ANTIVOL_VERIFICATION_CODE@@',
+}
+
+
+class CompiledEmailTemplate:
+    """
+    Gabarit d'email rendu une seule fois avec des marqueurs, puis découpé en
+    segments statiques : chaque envoi ne fait plus que concaténer les segments
+    et les valeurs de l'utilisateur échappées.
+    """
+
+    def __init__(self, template_name, context):
+        self.template_name = template_name
+        self.context = context
+        self._segments = None
+        self._lock = threading.Lock()
+
+    def compile(self):
+        rendered = render_to_string(self.template_name, self.context)
+        markers = {marker: field for field, marker in PLACEHOLDERS.items()}
+        segments = [rendered]
+        for marker, field in markers.items():
+            split_segments = []
+            for segment in segments:
+                if isinstance(segment, str):
+                    parts = segment.split(marker)
+                    for index, part in enumerate(parts):
+                        if index:
+                            split_segments.append((field,))
+                        split_segments.append(part)
+                else:
+                    split_segments.append(segment)
+            segments = split_segments
+        return segments
+
+    @property
+    def segments(self):
+        if self._segments is None:
+            with self._lock:
+                if self._segments is None:
+                    self._segments = self.compile()
+        return self._segments
+
+    def clear(self):
+        self._segments = None
+
+    def render(self, **values):
+        escaped = {field: conditional_escape(value) for field, value in values.items()}
+        return ''.join(
+            segment if isinstance(segment, str) else escaped[segment[0]]
+            for segment in self.segments
+        )
+
+
+verification_html = CompiledEmailTemplate(VERIFICATION_TEMPLATE, {
+    'user': {'first_name': PLACEHOLDERS['first_name']},
+    'verification_url': PLACEHOLDERS['verification_url'],
+    'verification_code': PLACEHOLDERS['verification_code'],
+})
+
+
+def get_verification_url(verification):
+    return f"{getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')}/verify-email/{verification.verification_token}"
+
+
+def build_verification_email(user, verification):
+    """Retourne (sujet, texte, html) de l'email de vérification"""
+    values = {
+        'first_name': user.first_name,
+        'verification_url': get_verification_url(verification),
+        'verification_code': verification.verification_code,
+    }
+    return (
+        VERIFICATION_SUBJECT,
+        VERIFICATION_PLAIN_TEMPLATE.format(**values),
+        verification_html.render(**values),
+    )
+
+
+def render_verification_email_uncached(user, verification):
+    """Rendu complet via render_to_string (référence pour le benchmark)"""
+    verification_url = get_verification_url(verification)
+    html_message = render_to_string(VERIFICATION_TEMPLATE, {
+        'user': user,
+        'verification_url': verification_url,
+        'verification_code': verification.verification_code,
+    })
+    plain_message = VERIFICATION_PLAIN_TEMPLATE.format(
+        first_name=user.first_name,
+        verification_url=verification_url,
+        verification_code=verification.verification_code,
+    )
+    return VERIFICATION_SUBJECT, plain_message, html_message
@@ -0,0 +1,109 @@
+import smtplib
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from media_app.tasks import run_in_background
+
+from .models import OutgoingEmail
+
+
+def enqueue_email(subject, body, recipients, html_body='', from_email=None):
+    """Ajoute un email à la file d'envoi (aucun appel SMTP dans la requête)"""
+    email = OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipients),
+    )
+    if getattr(settings, 'EMAIL_QUEUE_AUTODRAIN', True):
+        # Vider la file en arrière-plan si aucun worker dédié n'est utilisé
+        transaction.on_commit(lambda: run_in_background(drain_queue))
+    return email
+
+
+def retry_delay(attempts):
+    """Délai avant la prochaine tentative (backoff exponentiel plafonné)"""
+    base = getattr(settings, 'EMAIL_QUEUE_RETRY_DELAY', 60)
+    return timezone.timedelta(seconds=min(base * 2 ** (attempts - 1), 6 * 3600))
+
+
+def reschedule(email, error, max_attempts):
+    """Compte un échec d'envoi : nouvelle tentative plus tard, ou abandon au-delà de max_attempts"""
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def claim_batch(batch_size):
+    """Réserve un lot d'emails à envoyer en les retirant temporairement de la file"""
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = OutgoingEmail.objects.filter(status='pending', next_attempt_at__lte=now)
+        if db_connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        batch = list(queryset.order_by('next_attempt_at', 'id')[:batch_size])
+        # Repousser l'échéance pour qu'un autre worker ne les prenne pas entre-temps
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            next_attempt_at=now + timezone.timedelta(minutes=5)
+        )
+    return batch
+
+
+def drain_queue(batch_size=None, max_batches=None):
+    """
+    Envoie les emails en attente par lots en réutilisant une seule connexion
+    SMTP par lot. Retourne le nombre d'emails envoyés et en échec.
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_QUEUE_BATCH_SIZE', 50)
+    max_attempts = getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+    sent = failed = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        batch = claim_batch(batch_size)
+        if not batch:
+            break
+        batches += 1
+
+        connection = get_connection()
+        handled = 0
+        try:
+            connection.open()
+            for email in batch:
+                message = EmailMultiAlternatives(
+                    email.subject, email.body, email.from_email, email.recipients,
+                    connection=connection
+                )
+                if email.html_body:
+                    message.attach_alternative(email.html_body, 'text/html')
+                try:
+                    message.send(fail_silently=False)
+                except (OSError, smtplib.SMTPException) as e:
+                    failed += 1
+                    handled += 1
+                    reschedule(email, e, max_attempts)
+                    continue
+                sent += 1
+                email.attempts += 1
+                email.status = 'sent'
+                email.sent_at = timezone.now()
+                email.save(update_fields=['attempts', 'status', 'sent_at'])
+                handled += 1
+        except (OSError, smtplib.SMTPException) as e:
+            # Connexion SMTP perdue : seuls les emails non traités sont replanifiés
+            print(f"Erreur de connexion SMTP: {e}")
+            for email in batch[handled:]:
+                reschedule(email, e, max_attempts)
+            failed += len(batch) - handled
+            break
+        finally:
+            connection.close()
+
+    return sent, failed
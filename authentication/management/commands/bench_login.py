@@ -0,0 +1,92 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from authentication.models import EmailVerification
+
+BENCH_EMAIL = 'bench-login@example.invalid'
+BENCH_PASSWORD = 'bench-login-password-2024'
+# MD5 en seul hacheur : aucun mot de passe réel n'est re-haché, et tout est annulé en fin de mesure
+FAST_PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le débit de connexion (logins/s) et la latence p50/p95/p99 de "
+        "api/auth/login/ avec le profil de hachage courant (PASSWORD_HASHER_PROFILE). "
+        "Tout est exécuté dans une transaction annulée à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument(
+            '--fast-hasher', action='store_true',
+            help="Hacher en MD5 pour mesurer le coût hors hachage"
+        )
+
+    def handle(self, *args, **options):
+        profile = settings.PASSWORD_HASHER_PROFILE
+        if options['fast_hasher']:
+            profile = 'fast (MD5)'
+            with override_settings(PASSWORD_HASHERS=FAST_PASSWORD_HASHERS):
+                query_count, latencies, total = self.run_bench(options)
+        else:
+            query_count, latencies, total = self.run_bench(options)
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(f"Profil de hachage : {profile}")
+        self.stdout.write(f"Requêtes SQL par connexion : {query_count}")
+        self.stdout.write(f"Débit : {len(latencies) / total:.1f} logins/s")
+        self.stdout.write(
+            f"Latence : p50 {percentiles[49] * 1000:.1f} ms, "
+            f"p95 {percentiles[94] * 1000:.1f} ms, p99 {percentiles[98] * 1000:.1f} ms"
+        )
+
+    def run_bench(self, options):
+        url = reverse('authentication:login')
+        payload = {'email': BENCH_EMAIL, 'password': BENCH_PASSWORD}
+
+        def login(_):
+            client = APIClient()
+            start = time.perf_counter()
+            response = client.post(url, payload, format='json')
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise RuntimeError(f"Échec de connexion : {response.status_code}")
+            return elapsed
+
+        shared = connections[DEFAULT_DB_ALIAS]
+
+        def share_connection():
+            # Les threads voient l'utilisateur de test via la connexion de la transaction
+            connections[DEFAULT_DB_ALIAS] = shared
+
+        with transaction.atomic():
+            user = User.objects.create_user(BENCH_EMAIL, BENCH_EMAIL, BENCH_PASSWORD)
+            EmailVerification.objects.create(user=user)
+
+            with CaptureQueriesContext(connection) as queries:
+                login(0)
+            # Relevé avant que les requêtes suivantes ne réinitialisent le journal de la connexion
+            query_count = len(queries)
+
+            shared.inc_thread_sharing()
+            try:
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['threads'], initializer=share_connection) as executor:
+                    latencies = sorted(executor.map(login, range(options['logins'])))
+                total = time.perf_counter() - start
+            finally:
+                shared.dec_thread_sharing()
+            transaction.set_rollback(True)
+
+        return query_count, latencies, total
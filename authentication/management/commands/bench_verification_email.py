@@ -0,0 +1,48 @@
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from authentication.emails import (
+    build_verification_email, render_verification_email_uncached, verification_html
+)
+from authentication.models import EmailVerification
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark du rendu de l'email de vérification : render_to_string "
+        "à chaque envoi comparé au gabarit pré-compilé"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        # Objets non enregistrés : le benchmark ne touche pas à la base
+        user = User(first_name='Jean <Dupont>', email='jean@example.com')
+        verification = EmailVerification(
+            user=user, verification_token=uuid.uuid4(), verification_code='123456'
+        )
+
+        if build_verification_email(user, verification) != render_verification_email_uncached(user, verification):
+            self.stderr.write("Attention : les deux rendus diffèrent")
+
+        verification_html.clear()
+        results = {}
+        for label, render in (
+            ('render_to_string', render_verification_email_uncached),
+            ('gabarit compilé', build_verification_email),
+        ):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                render(user, verification)
+            elapsed = time.perf_counter() - start
+            results[label] = iterations / elapsed
+            self.stdout.write(f"{label:<18} {results[label]:>10.0f} emails/s")
+
+        self.stdout.write(
+            f"Accélération : x{results['gabarit compilé'] / results['render_to_string']:.1f}"
+        )
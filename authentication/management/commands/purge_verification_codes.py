@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from authentication.models import EmailVerification
+
+
+class Command(BaseCommand):
+    help = (
+        "Efface par lots les codes des vérifications déjà validées ou expirées "
+        "afin que l'ensemble des codes en attente (indexé) reste petit"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Compter sans modifier')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        stale = EmailVerification.objects.exclude(verification_code='').filter(
+            Q(is_verified=True) | Q(code_expires_at__lte=timezone.now())
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"{stale.count()} code(s) à purger")
+            return
+
+        purged = 0
+        while True:
+            ids = list(stale.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            # La ligne est conservée (statut de vérification), seul le code est effacé
+            purged += EmailVerification.objects.filter(pk__in=ids).update(verification_code='')
+        self.stdout.write(f"{purged} code(s) purgé(s)")
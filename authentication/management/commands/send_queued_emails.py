@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.mail_queue import drain_queue
+
+
+class Command(BaseCommand):
+    help = "Envoie les emails en file d'attente (inscription, renvoi de vérification)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Nombre d'emails par connexion SMTP")
+        parser.add_argument('--loop', action='store_true', help='Tourner en continu comme worker')
+        parser.add_argument('--interval', type=float, default=5, help='Pause entre deux passages (secondes)')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_queue(batch_size=options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(f"{sent} email(s) envoyé(s), {failed} en échec")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
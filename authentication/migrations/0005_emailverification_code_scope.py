@@ -0,0 +1,54 @@
+# Generated by Django 5.1.5 on 2026-10-17 14:40
+
+import authentication.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_emails(apps, schema_editor):
+    """Recopie l'email de l'utilisateur dans les vérifications existantes"""
+    EmailVerification = apps.get_model('authentication', 'EmailVerification')
+    batch = []
+    for verification in EmailVerification.objects.select_related('user').iterator():
+        verification.email = verification.user.email
+        batch.append(verification)
+        if len(batch) >= 500:
+            EmailVerification.objects.bulk_update(batch, ['email'])
+            batch = []
+    if batch:
+        EmailVerification.objects.bulk_update(batch, ['email'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0004_outgoingemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailverification',
+            name='code_expires_at',
+            field=models.DateTimeField(default=authentication.models.get_code_expiry),
+        ),
+        migrations.AddField(
+            model_name='emailverification',
+            name='email',
+            field=models.EmailField(blank=True, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='emailverification',
+            name='verification_code',
+            field=models.CharField(blank=True, default=authentication.models.generate_verification_code, max_length=6),
+        ),
+        migrations.RunPython(populate_emails, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='emailverification',
+            index=models.Index(fields=['verification_code', 'email'], name='auth_emailverif_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailverification',
+            index=models.Index(fields=['is_verified', 'code_expires_at'], name='auth_emailverif_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+USER_EMAIL_INDEX = models.Index(fields=['email'], name='auth_user_email_idx')
+
+
+def add_user_email_index(apps, schema_editor):
+    """Index sur auth_user.email (table de django.contrib.auth)"""
+    schema_editor.add_index(apps.get_model('auth', 'User'), USER_EMAIL_INDEX)
+
+
+def remove_user_email_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('auth', 'User'), USER_EMAIL_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('authentication', '0005_emailverification_code_scope'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_user_email_index, remove_user_email_index),
+    ]
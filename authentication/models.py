@@ -1,18 +1,28 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid
-import random
+import secrets
 
 def generate_verification_code():
     """Génère un code de vérification à 6 chiffres"""
-    return str(random.randint(100000, 999999))
+    return str(100000 + secrets.randbelow(900000))
+
+def get_code_expiry():
+    """Date d'expiration d'un nouveau code de vérification"""
+    return timezone.now() + timezone.timedelta(
+        seconds=getattr(settings, 'EMAIL_VERIFICATION_CODE_TTL', 86400)
+    )
 
 class EmailVerification(models.Model):
     """Modèle pour gérer la vérification des emails"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='email_verification')
     verification_token = models.UUIDField(default=uuid.uuid4, unique=True)
-    verification_code = models.CharField(max_length=6, default=generate_verification_code)
+    verification_code = models.CharField(max_length=6, blank=True, default=generate_verification_code)
+    # Email de l'utilisateur dupliqué pour rechercher un code par (code, email) via l'index
+    email = models.EmailField(blank=True)
+    code_expires_at = models.DateTimeField(default=get_code_expiry)
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     verified_at = models.DateTimeField(null=True, blank=True)
@@ -20,6 +30,15 @@ class EmailVerification(models.Model):
     def __str__(self):
         return f"Email verification for {self.user.email}"
 
+    def save(self, *args, **kwargs):
+        if not self.email:
+            self.email = self.user.email
+        super().save(*args, **kwargs)
+
+    @property
+    def is_code_expired(self):
+        return self.code_expires_at <= timezone.now()
+
     def verify(self):
         """Marque l'email comme vérifié"""
         self.is_verified = True
@@ -29,8 +48,47 @@ class EmailVerification(models.Model):
     def regenerate_code(self):
         """Régénère un nouveau code de vérification"""
         self.verification_code = generate_verification_code()
+        self.code_expires_at = get_code_expiry()
         self.save()
 
     class Meta:
         verbose_name = "Vérification d'email"
         verbose_name_plural = "Vérifications d'emails"
+        indexes = [
+            # Sert la recherche par code seul (préfixe) et par (code, email)
+            models.Index(fields=['verification_code', 'email'], name='auth_emailverif_code_idx'),
+            models.Index(fields=['is_verified', 'code_expires_at'], name='auth_emailverif_pending_idx'),
+        ]
+
+
+class OutgoingEmail(models.Model):
+    """Email en file d'attente, envoyé par la commande send_queued_emails"""
+
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('sent', 'Envoyé'),
+        ('failed', 'Échec définitif'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField(help_text="Liste des destinataires")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Email en attente"
+        verbose_name_plural = "Emails en attente"
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='auth_outemail_queue_idx'),
+        ]
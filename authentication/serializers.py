@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.utils import timezone
 from .models import EmailVerification
 import re
 
@@ -68,15 +69,8 @@ class UserLoginSerializer(serializers.Serializer):
         password = attrs.get('password')
         
         if email and password:
-            # Trouve l'utilisateur par email
-            try:
-                user = User.objects.get(email=email)
-                username = user.username
-            except User.DoesNotExist:
-                raise serializers.ValidationError("Email ou mot de passe incorrect.")
-            
-            # Authentifie avec le username
-            user = authenticate(username=username, password=password)
+            # Une seule requête via EmailBackend (email indexé + statut de vérification)
+            user = authenticate(self.context.get('request'), email=email, password=password)
             
             if not user:
                 raise serializers.ValidationError("Email ou mot de passe incorrect.")
@@ -93,6 +87,7 @@ class EmailVerificationSerializer(serializers.Serializer):
     """Serializer pour la vérification d'email"""
     token = serializers.UUIDField(required=False)
     code = serializers.CharField(max_length=6, required=False)
+    email = serializers.EmailField(required=False)
 
     def validate(self, attrs):
         """Valide le token ou le code de vérification"""
@@ -111,12 +106,23 @@ class EmailVerificationSerializer(serializers.Serializer):
             except EmailVerification.DoesNotExist:
                 raise serializers.ValidationError("Token de vérification invalide.")
 
-        # Vérification par code (saisie manuelle)
+        # Vérification par code (saisie manuelle), limitée à l'email s'il est fourni
         elif code:
-            try:
-                verification = EmailVerification.objects.get(verification_code=code)
-            except EmailVerification.DoesNotExist:
-                raise serializers.ValidationError("Code de vérification invalide.")
+            queryset = EmailVerification.objects.select_related('user').filter(verification_code=code)
+            email = attrs.get('email')
+            if email:
+                queryset = queryset.filter(email=email)
+
+            matches = list(queryset.filter(is_verified=False, code_expires_at__gt=timezone.now())[:2])
+            if len(matches) > 1:
+                raise serializers.ValidationError(
+                    "Plusieurs comptes correspondent à ce code. Veuillez préciser votre email."
+                )
+            if not matches:
+                if email and queryset.filter(is_verified=True).exists():
+                    raise serializers.ValidationError("Cet email a déjà été vérifié.")
+                raise serializers.ValidationError("Code de vérification invalide ou expiré.")
+            verification = matches[0]
 
         if verification and verification.is_verified:
             raise serializers.ValidationError("Cet email a déjà été vérifié.")
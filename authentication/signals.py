@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import user_cache
+from .models import EmailVerification
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Retire l'utilisateur modifié ou supprimé du cache d'authentification JWT"""
+    # Même clé pour l'identifiant entier et sa forme texte (claim du JWT)
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def sync_verification_email(sender, instance, created, update_fields=None, **kwargs):
+    """Recopie le nouvel email de l'utilisateur sur sa vérification (recherche par code et email)"""
+    if created or (update_fields is not None and 'email' not in update_fields):
+        return
+    EmailVerification.objects.filter(user=instance).exclude(email=instance.email).update(email=instance.email)
@@ -1,3 +1,259 @@
-from django.test import TestCase
+import smtplib
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import ObjectCache, user_cache
+from .backends import EmailBackend as EmailAuthBackend
+from .emails import build_verification_email, render_verification_email_uncached, verification_html
+from .mail_queue import drain_queue, enqueue_email
+from .models import EmailVerification, OutgoingEmail
+
+
+class FailingSendBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise OSError('Destinataire refusé')
+
+
+class FlakyBackend(EmailBackend):
+    """Accepte le premier email puis perd la connexion"""
+
+    def send_messages(self, messages):
+        if mail.outbox:
+            raise smtplib.SMTPServerDisconnected('Connexion perdue')
+        return super().send_messages(messages)
+
+
+class FailingConnectionBackend(EmailBackend):
+    def open(self):
+        raise OSError('Serveur SMTP injoignable')
+
+
+@override_settings(EMAIL_QUEUE_AUTODRAIN=False, EMAIL_QUEUE_RETRY_DELAY=60, EMAIL_QUEUE_MAX_ATTEMPTS=3)
+class MailQueueTest(TestCase):
+    """Vérifie l'envoi groupé de la file d'emails et la replanification des échecs"""
+
+    def setUp(self):
+        self.email = enqueue_email('Sujet', 'Corps', ['owner@example.com'], html_body='<p>Corps</p>')
+
+    def test_drain_sends_pending_emails(self):
+        self.assertEqual(drain_queue(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['owner@example.com'])
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), ('sent', 1))
+        self.assertIsNotNone(self.email.sent_at)
+
+    @override_settings(EMAIL_BACKEND='authentication.tests.FailingSendBackend')
+    def test_failing_send_is_rescheduled_with_backoff(self):
+        before = timezone.now()
+        self.assertEqual(drain_queue(), (0, 1))
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), ('pending', 1))
+        self.assertEqual(self.email.last_error, 'Destinataire refusé')
+        self.assertGreaterEqual(self.email.next_attempt_at, before + timezone.timedelta(seconds=60))
+
+        # Pas encore dû : la file est vide
+        self.assertEqual(drain_queue(), (0, 0))
+
+        OutgoingEmail.objects.filter(pk=self.email.pk).update(next_attempt_at=timezone.now())
+        before = timezone.now()
+        drain_queue()
+        self.email.refresh_from_db()
+        self.assertEqual(self.email.attempts, 2)
+        self.assertGreaterEqual(self.email.next_attempt_at, before + timezone.timedelta(seconds=120))
+
+        OutgoingEmail.objects.filter(pk=self.email.pk).update(next_attempt_at=timezone.now())
+        drain_queue()
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), ('failed', 3))
+
+    @override_settings(EMAIL_BACKEND='authentication.tests.FailingConnectionBackend')
+    def test_connection_failure_respects_max_attempts(self):
+        OutgoingEmail.objects.filter(pk=self.email.pk).update(attempts=2)
+        self.assertEqual(drain_queue(), (0, 1))
+        self.email.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), ('failed', 3))
+        self.assertEqual(self.email.last_error, 'Serveur SMTP injoignable')
+
+
+    @override_settings(EMAIL_BACKEND='authentication.tests.FlakyBackend')
+    def test_only_unsent_emails_are_counted_as_failed(self):
+        second = enqueue_email('Sujet', 'Corps', ['other@example.com'])
+        self.assertEqual(drain_queue(), (1, 1))
+        self.email.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((self.email.status, self.email.attempts), ('sent', 1))
+        self.assertEqual((second.status, second.attempts), ('pending', 1))
+
+    @override_settings(EMAIL_BACKEND='authentication.tests.FailingConnectionBackend')
+    def test_programming_errors_are_not_swallowed(self):
+        with mock.patch.object(FailingConnectionBackend, 'open', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                drain_queue()
+
+
+class CachedUserTest(TestCase):
+    """Vérifie que le cache des utilisateurs JWT est partagé entre workers"""
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.url = reverse('devices:user_devices_summary')
+
+    def test_deactivation_is_seen_by_every_worker(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        # Un autre worker lit le même cache partagé
+        other_worker = ObjectCache('auth:user', 'AUTH_USER_CACHE_TTL')
+        self.assertEqual(other_worker.get(str(self.user.pk)).pk, self.user.pk)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(other_worker.get(str(self.user.pk)))
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class EmailBackendTest(TestCase):
+    """Vérifie l'authentification par email en une requête"""
+
+    def setUp(self):
+        self.backend = EmailAuthBackend()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+
+    def test_login_by_email_in_one_query(self):
+        with self.assertNumQueries(1):
+            user = self.backend.authenticate(None, email='owner@example.com', password='password')
+            self.assertEqual(user, self.user)
+            # Le statut de vérification (absent ici) est chargé avec l'utilisateur
+            self.assertFalse(hasattr(user, 'email_verification'))
+        self.assertIsNone(self.backend.authenticate(None, email='owner@example.com', password='wrong'))
+
+    def test_duplicate_email_uses_lowest_pk(self):
+        User.objects.create_user('other', 'owner@example.com', 'other-password')
+        self.assertIsNone(self.backend.authenticate(None, email='owner@example.com', password='other-password'))
+        self.assertEqual(self.backend.authenticate(None, email='owner@example.com', password='password'), self.user)
+
+    def test_unknown_email_still_hashes_password(self):
+        with mock.patch.object(User, 'set_password') as set_password:
+            self.assertIsNone(self.backend.authenticate(None, email='nobody@example.com', password='password'))
+        set_password.assert_called_once_with('password')
+
+    def test_inactive_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.authenticate(None, email='owner@example.com', password='password'))
+
+    def test_bench_login_leaves_no_user_behind(self):
+        output = StringIO()
+        for _ in range(2):
+            call_command('bench_login', logins=3, fast_hasher=True, stdout=output)
+        self.assertEqual(output.getvalue().count('Requêtes SQL par connexion : 1'), 2)
+        self.assertEqual(User.objects.count(), 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class VerificationCodeTest(TestCase):
+    """Vérifie la recherche des codes de vérification par (code, email)"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('authentication:verify_email')
+        self.owner = self.create_verification('owner', '123456')
+
+    def create_verification(self, username, code, **kwargs):
+        user = User.objects.create_user(username, f'{username}@example.com', 'password')
+        return EmailVerification.objects.create(user=user, verification_code=code, **kwargs)
+
+    def verify(self, **data):
+        return self.client.post(self.url, data, format='json')
+
+    def test_code_lookup_is_scoped_by_email(self):
+        self.assertEqual(self.verify(code='123456', email='other@example.com').status_code, 400)
+        response = self.verify(code='123456', email='owner@example.com')
+        self.assertEqual(response.status_code, 200)
+        self.owner.refresh_from_db()
+        self.assertTrue(self.owner.is_verified)
+
+    def test_expired_or_used_code_is_rejected(self):
+        EmailVerification.objects.filter(pk=self.owner.pk).update(code_expires_at=timezone.now())
+        self.assertEqual(self.verify(code='123456').status_code, 400)
+
+        EmailVerification.objects.filter(pk=self.owner.pk).update(
+            code_expires_at=timezone.now() + timezone.timedelta(hours=1), is_verified=True
+        )
+        response = self.verify(code='123456', email='owner@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('déjà été vérifié', str(response.data))
+
+    def test_colliding_pending_codes_require_email(self):
+        other = self.create_verification('other', '123456')
+        response = self.verify(code='123456')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Plusieurs comptes', str(response.data))
+
+        self.assertEqual(self.verify(code='123456', email='other@example.com').status_code, 200)
+        other.refresh_from_db()
+        self.owner.refresh_from_db()
+        self.assertEqual((other.is_verified, self.owner.is_verified), (True, False))
+
+    def test_email_change_is_copied_to_verification(self):
+        user = self.owner.user
+        user.email = 'new@example.com'
+        user.save()
+        self.owner.refresh_from_db()
+        self.assertEqual(self.owner.email, 'new@example.com')
+        self.assertEqual(self.verify(code='123456', email='owner@example.com').status_code, 400)
+        self.assertEqual(self.verify(code='123456', email='new@example.com').status_code, 200)
+
+    def test_purge_clears_only_stale_codes(self):
+        expired = self.create_verification('expired', '222222', code_expires_at=timezone.now())
+        verified = self.create_verification('verified', '333333', is_verified=True)
+
+        output = StringIO()
+        call_command('purge_verification_codes', dry_run=True, stdout=output)
+        self.assertIn('2 code(s) à purger', output.getvalue())
+
+        call_command('purge_verification_codes', batch_size=1, stdout=output)
+        self.assertIn('2 code(s) purgé(s)', output.getvalue())
+        codes = dict(EmailVerification.objects.values_list('pk', 'verification_code'))
+        self.assertEqual(codes, {self.owner.pk: '123456', expired.pk: '', verified.pk: ''})
+
+
+class CompiledEmailTemplateTest(TestCase):
+    """Vérifie que le gabarit précompilé produit exactement le rendu de render_to_string"""
+
+    def setUp(self):
+        verification_html.clear()
+        self.user = User(username='owner', email='owner@example.com')
+        self.verification = EmailVerification(user=self.user, verification_code='123456')
+
+    def assert_same_rendering(self):
+        self.assertEqual(
+            build_verification_email(self.user, self.verification),
+            render_verification_email_uncached(self.user, self.verification)
+        )
+
+    def test_plain_values(self):
+        self.user.first_name = 'Awa'
+        self.assert_same_rendering()
+
+    def test_values_needing_html_escaping(self):
+        self.user.first_name = '<script>alert("x")</script> & O\'Neil'
+        self.verification.verification_code = '<b>&'
+        with override_settings(FRONTEND_URL='https://example.com/?a=1&b="2"'):
+            self.assert_same_rendering()
+        html = build_verification_email(self.user, self.verification)[2]
+        self.assertNotIn('<script>', html)
+        self.assertIn('&lt;script&gt;', html)
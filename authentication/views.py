@@ -4,10 +4,6 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from .serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
@@ -15,6 +11,8 @@ from .serializers import (
     UserProfileSerializer
 )
 from .models import EmailVerification
+from .mail_queue import enqueue_email
+from .emails import build_verification_email
 
 class RegisterView(generics.CreateAPIView):
     """Vue pour l'inscription d'un nouvel utilisateur"""
@@ -37,52 +35,27 @@ class RegisterView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
 
     def send_verification_email(self, user):
-        """Envoie l'email de vérification"""
+        """Met l'email de vérification dans la file d'envoi"""
         try:
             verification = user.email_verification
-            verification_url = f"{getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')}/verify-email/{verification.verification_token}"
 
-            subject = 'Vérifiez votre adresse email - Antivol'
+            # Gabarits pré-compilés : seuls les champs de l'utilisateur sont rendus
+            subject, plain_message, html_message = build_verification_email(user, verification)
 
-            # Template HTML
-            html_message = render_to_string('authentication/verification_email.html', {
-                'user': user,
-                'verification_url': verification_url,
-                'verification_code': verification.verification_code,
-            })
-
-            # Version texte simple
-            plain_message = f"""
-Bonjour {user.first_name},
-
-Merci de vous être inscrit sur Antivol. Pour activer votre compte, vous avez deux options :
-
-1. Cliquer sur ce lien : {verification_url}
-
-2. Ou saisir ce code dans l'application : {verification.verification_code}
-
-Si vous n'avez pas créé ce compte, vous pouvez ignorer cet email.
-
-Cordialement,
-L'équipe Antivol
-            """
-
-            send_mail(
+            enqueue_email(
                 subject,
                 plain_message,
-                settings.DEFAULT_FROM_EMAIL,
                 [user.email],
-                html_message=html_message,
-                fail_silently=False,
+                html_body=html_message,
             )
         except Exception as e:
-            print(f"Erreur lors de l'envoi de l'email: {e}")
+            print(f"Erreur lors de la mise en file de l'email: {e}")
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login_view(request):
     """Vue pour la connexion d'un utilisateur"""
-    serializer = UserLoginSerializer(data=request.data)
+    serializer = UserLoginSerializer(data=request.data, context={'request': request})
     serializer.is_valid(raise_exception=True)
 
     user = serializer.validated_data['user']
@@ -91,7 +64,7 @@ def login_view(request):
     refresh = RefreshToken.for_user(user)
     access_token = refresh.access_token
 
-    # Vérifie si l'email est vérifié
+    # Vérifie si l'email est vérifié (déjà chargé par EmailBackend)
     email_verified = False
     try:
         email_verified = user.email_verification.is_verified
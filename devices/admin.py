@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
-from .models import Phone, UnlockAttempt, IntrusionPhoto
+from .models import Phone, UnlockAttempt, IntrusionPhoto, PhotoUploadSession, PhoneDailyActivity, PhoneTombstone
+from .authentication import revoke_device_tokens
+from .renditions import rendition_url
 
 class UnlockAttemptInline(admin.TabularInline):
     """Inline pour afficher les tentatives de déverrouillage"""
@@ -26,7 +28,7 @@ class IntrusionPhotoInline(admin.TabularInline):
         if obj.photo:
             return format_html(
                 '<img src="{}" style="max-width: 100px; max-height: 100px;" />',
-                obj.photo.url
+                rendition_url(obj, 'thumbnail') or obj.photo.url
             )
         return "Pas de photo"
     photo_preview.short_description = 'Aperçu'
@@ -67,6 +69,14 @@ class PhoneAdmin(admin.ModelAdmin):
     )
 
     inlines = [UnlockAttemptInline]
+    actions = ['revoke_device_tokens']
+
+    def revoke_device_tokens(self, request, queryset):
+        """Invalide les jetons d'appareil des téléphones sélectionnés"""
+        for phone in queryset:
+            revoke_device_tokens(phone)
+        self.message_user(request, f"Jetons révoqués pour {queryset.count()} téléphone(s)")
+    revoke_device_tokens.short_description = "Révoquer les jetons d'appareil"
 
     def is_online_display(self, obj):
         """Affiche le statut en ligne avec une couleur"""
@@ -95,14 +105,17 @@ class UnlockAttemptAdmin(admin.ModelAdmin):
         'phone', 'attempt_type', 'result', 'timestamp',
         'is_suspicious', 'has_location', 'photos_count'
     )
-    list_filter = ('result', 'attempt_type', 'timestamp', 'phone__user')
+    list_filter = ('result', 'flagged_suspicious', 'attempt_type', 'timestamp', 'phone__user')
     search_fields = ('phone__name', 'phone__user__username', 'ip_address')
-    readonly_fields = ('timestamp', 'is_suspicious')
+    readonly_fields = ('timestamp', 'is_suspicious', 'recent_failures')
 
     fieldsets = (
         ('Informations de base', {
             'fields': ('phone', 'attempt_type', 'result', 'timestamp')
         }),
+        ('Suspicion', {
+            'fields': ('is_suspicious', 'recent_failures'),
+        }),
         ('Localisation', {
             'fields': ('latitude', 'longitude', 'location_accuracy'),
             'classes': ('collapse',)
@@ -139,16 +152,22 @@ class IntrusionPhotoAdmin(admin.ModelAdmin):
         'unlock_attempt', 'camera_type', 'timestamp',
         'file_size_display', 'photo_preview'
     )
-    list_filter = ('camera_type', 'timestamp', 'unlock_attempt__phone__user')
+    list_filter = ('camera_type', 'timestamp', 'captured_at', 'unlock_attempt__phone__user')
     search_fields = ('unlock_attempt__phone__name', 'unlock_attempt__phone__user__username')
-    readonly_fields = ('timestamp', 'file_size', 'photo_preview_large')
+    readonly_fields = (
+        'timestamp', 'file_size', 'photo_preview_large', 'captured_at',
+        'gps_latitude', 'gps_longitude', 'orientation'
+    )
 
     fieldsets = (
         ('Informations de base', {
             'fields': ('unlock_attempt', 'photo', 'camera_type')
         }),
         ('Métadonnées', {
-            'fields': ('timestamp', 'file_size', 'exif_data'),
+            'fields': (
+                'timestamp', 'file_size', 'captured_at', 'gps_latitude',
+                'gps_longitude', 'orientation', 'exif_data'
+            ),
             'classes': ('collapse',)
         }),
         ('Aperçu', {
@@ -160,7 +179,7 @@ class IntrusionPhotoAdmin(admin.ModelAdmin):
         if obj.photo:
             return format_html(
                 '<img src="{}" style="max-width: 50px; max-height: 50px;" />',
-                obj.photo.url
+                rendition_url(obj, 'thumbnail') or obj.photo.url
             )
         return "Pas de photo"
     photo_preview.short_description = 'Aperçu'
@@ -168,8 +187,9 @@ class IntrusionPhotoAdmin(admin.ModelAdmin):
     def photo_preview_large(self, obj):
         if obj.photo:
             return format_html(
-                '<img src="{}" style="max-width: 300px; max-height: 300px;" />',
-                obj.photo.url
+                '<a href="{}"><img src="{}" style="max-width: 300px; max-height: 300px;" /></a>',
+                obj.photo.url,
+                rendition_url(obj, 'medium') or obj.photo.url
             )
         return "Pas de photo"
     photo_preview_large.short_description = 'Photo'
@@ -190,3 +210,53 @@ class IntrusionPhotoAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related(
             'unlock_attempt', 'unlock_attempt__phone', 'unlock_attempt__phone__user'
         )
+
+@admin.register(PhotoUploadSession)
+class PhotoUploadSessionAdmin(admin.ModelAdmin):
+    """Admin pour les envois de photos par morceaux"""
+    list_display = ('id', 'unlock_attempt', 'status', 'progress_display', 'created_at', 'updated_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('id', 'unlock_attempt__phone__name', 'unlock_attempt__phone__user__username')
+    readonly_fields = ('id', 'received_size', 'photo', 'created_at', 'updated_at')
+    raw_id_fields = ('unlock_attempt',)
+
+    def progress_display(self, obj):
+        """Affiche la progression de l'envoi"""
+        return f"{obj.received_size * 100 // obj.total_size if obj.total_size else 0} %"
+    progress_display.short_description = 'Progression'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('unlock_attempt', 'unlock_attempt__phone')
+
+@admin.register(PhoneDailyActivity)
+class PhoneDailyActivityAdmin(admin.ModelAdmin):
+    """Admin (lecture seule) de l'agrégat quotidien d'activité"""
+    list_display = ('phone', 'day', 'total_attempts', 'result_failed', 'suspicious_attempts', 'photos_count')
+    list_filter = ('day',)
+    search_fields = ('phone__name', 'phone__user__username')
+    date_hierarchy = 'day'
+    # Phone.__str__ lit le nom de l'utilisateur
+    list_select_related = ('phone__user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(PhoneTombstone)
+class PhoneTombstoneAdmin(admin.ModelAdmin):
+    """Admin (lecture seule) des téléphones supprimés, conservés pour la synchronisation"""
+    list_display = ('device_id', 'phone_id', 'user', 'deleted_at')
+    list_filter = ('deleted_at',)
+    search_fields = ('device_id', 'user__username')
+    date_hierarchy = 'deleted_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
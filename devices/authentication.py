@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db.models import F
+from rest_framework import authentication, exceptions, permissions
+
+from authentication.authentication import CachedJWTAuthentication, ObjectCache, user_cache
+
+from .models import Phone
+
+DEVICE_TOKEN_SALT = 'devices.device-token'
+DEVICE_TOKEN_KEYWORD = 'Device'
+
+# Appareils résolus depuis un jeton d'appareil, dans le cache partagé : une
+# révocation ou une modification (devices.signals) vaut pour tous les workers
+phone_cache = ObjectCache('devices:token-phone', 'DEVICES_TOKEN_CACHE_TTL')
+
+
+def issue_device_token(phone):
+    """
+    Jeton signé propre à un appareil : porte la clé du téléphone, de son
+    propriétaire et la version courante des jetons du téléphone.
+    """
+    return signing.dumps(
+        {'phone': phone.pk, 'user': phone.user_id, 'v': phone.token_version},
+        salt=DEVICE_TOKEN_SALT,
+        compress=True
+    )
+
+
+def revoke_device_tokens(phone):
+    """
+    Invalide tous les jetons émis pour ce téléphone et retourne un nouveau
+    jeton. L'entrée du cache partagé est supprimée : aucun worker ne garde
+    l'ancienne version.
+    """
+    Phone.objects.filter(pk=phone.pk).update(token_version=F('token_version') + 1)
+    phone.refresh_from_db(fields=['token_version'])
+    phone_cache.invalidate(phone.pk)
+    return issue_device_token(phone)
+
+
+def get_authenticated_phone(request):
+    """Retourne le téléphone authentifié par un jeton d'appareil (None sinon)"""
+    auth = getattr(request, 'auth', None)
+    return auth if isinstance(auth, Phone) else None
+
+
+class DeviceTokenAuthentication(authentication.BaseAuthentication):
+    """
+    Authentification des requêtes émises par un téléphone :
+        Authorization: Device <jeton>
+
+    L'utilisateur et le téléphone sont résolus depuis le cache partagé ;
+    le téléphone est exposé via `request.auth` (voir get_authenticated_phone),
+    ce qui évite aux vues de rechercher l'appareil par device_id.
+
+    Elle n'est pas dans DEFAULT_AUTHENTICATION_CLASSES : seules les vues qui
+    reçoivent les données d'un téléphone (heartbeat, tentatives, photos) la
+    déclarent via DEVICE_AUTHENTICATION_CLASSES.
+    """
+
+    def authenticate(self, request):
+        header = authentication.get_authorization_header(request).split()
+        if not header or header[0].lower() != DEVICE_TOKEN_KEYWORD.lower().encode():
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed("En-tête d'authentification d'appareil invalide.")
+        try:
+            token = header[1].decode()
+        except UnicodeDecodeError:
+            raise exceptions.AuthenticationFailed("Jeton d'appareil invalide ou expiré.")
+        return self.authenticate_token(token)
+
+    def authenticate_token(self, token):
+        """Résout (utilisateur, téléphone) depuis un jeton d'appareil (aussi utilisé par les WebSockets)"""
+        try:
+            payload = signing.loads(
+                token,
+                salt=DEVICE_TOKEN_SALT,
+                max_age=getattr(settings, 'DEVICES_TOKEN_MAX_AGE', None)
+            )
+            phone_id, user_id = int(payload['phone']), int(payload['user'])
+            version = int(payload.get('v', 0))
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise exceptions.AuthenticationFailed("Jeton d'appareil invalide ou expiré.")
+
+        user = self.get_user(user_id)
+        phone = self.get_phone(phone_id, user_id)
+        if phone.token_version != version:
+            raise exceptions.AuthenticationFailed("Jeton d'appareil révoqué.")
+        phone.user = user
+        return user, phone
+
+    def get_user(self, user_id):
+        user = user_cache.get(user_id)
+        if user is None:
+            user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                raise exceptions.AuthenticationFailed("Utilisateur introuvable.")
+            user_cache.set(user_id, user)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("L'utilisateur est inactif.")
+        return user
+
+    def get_phone(self, phone_id, user_id):
+        phone = phone_cache.get(phone_id)
+        if phone is None:
+            phone = Phone.objects.filter(pk=phone_id, user_id=user_id).first()
+            if phone is None:
+                raise exceptions.AuthenticationFailed("Appareil introuvable ou révoqué.")
+            phone_cache.set(phone_id, phone)
+        elif phone.user_id != user_id:
+            raise exceptions.AuthenticationFailed("Appareil introuvable ou révoqué.")
+        return phone
+
+    def authenticate_header(self, request):
+        return DEVICE_TOKEN_KEYWORD
+
+
+# Vues accessibles avec un jeton d'appareil (en plus du JWT du propriétaire)
+DEVICE_AUTHENTICATION_CLASSES = [CachedJWTAuthentication, DeviceTokenAuthentication]
+
+
+class DeviceTokenWriteOnly(permissions.BasePermission):
+    """Un jeton d'appareil envoie des données mais ne lit pas l'historique du propriétaire"""
+    message = "Ce jeton d'appareil ne permet pas cette opération."
+
+    def has_permission(self, request, view):
+        return request.method not in permissions.SAFE_METHODS or get_authenticated_phone(request) is None
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db import transaction
+
+from media_app.tasks import run_in_background
+from my_socket.layers import build_notification, group_send_many, owner_group
+
+
+def push_events_enabled():
+    return getattr(settings, 'DEVICES_PUSH_EVENTS', True)
+
+
+def attempt_event(attempt):
+    """Notification compacte pour une nouvelle tentative de déverrouillage"""
+    return owner_group(attempt.phone.user_id), build_notification(
+        'unlock_attempt_created',
+        data={
+            'id': attempt.pk,
+            'phone_id': attempt.phone_id,
+            'device_id': attempt.phone.device_id,
+            'attempt_type': attempt.attempt_type,
+            'result': attempt.result,
+            'is_suspicious': attempt.is_suspicious,
+            'timestamp': attempt.timestamp.isoformat(),
+        },
+        message=f"Tentative de déverrouillage ({attempt.get_result_display()}) sur {attempt.phone.name}",
+        my_type='intrusion',
+    )
+
+
+def photo_event(photo):
+    """Notification compacte pour une nouvelle photo d'intrusion"""
+    phone = photo.unlock_attempt.phone
+    return owner_group(phone.user_id), build_notification(
+        'intrusion_photo_created',
+        data={
+            'id': photo.pk,
+            'unlock_attempt_id': photo.unlock_attempt_id,
+            'phone_id': phone.pk,
+            'camera_type': photo.camera_type,
+            'photo': photo.photo.url if photo.photo else None,
+            'timestamp': photo.timestamp.isoformat(),
+        },
+        message=f"Photo d'intrusion prise sur {phone.name}",
+        my_type='intrusion',
+    )
+
+
+def dispatch(events):
+    """
+    Envoie les notifications aux propriétaires après le commit de la
+    transaction, dans un thread d'arrière-plan (hors du chemin de la requête).
+    """
+    if not events or not push_events_enabled():
+        return
+    transaction.on_commit(lambda: run_in_background(group_send_many, events))
+
+
+def dispatch_attempts(attempts):
+    dispatch([attempt_event(attempt) for attempt in attempts])
+
+
+def dispatch_photos(photos):
+    dispatch([photo_event(photo) for photo in photos])
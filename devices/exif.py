@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from PIL import ExifTags, Image
+
+from media_app.tasks import run_in_background
+
+# Champs descriptifs conservés dans exif_data ; le reste des métadonnées est écarté
+KEPT_TAGS = {
+    ExifTags.Base.Make: 'make',
+    ExifTags.Base.Model: 'model',
+}
+COORDINATE_PRECISION = Decimal('0.00000001')
+
+
+def exif_enabled():
+    return getattr(settings, 'DEVICES_PHOTO_EXIF', True)
+
+
+def parse_exif_datetime(value, offset=None):
+    """Convertit une date EXIF ('YYYY:MM:DD HH:MM:SS') en datetime aware"""
+    try:
+        captured = datetime.strptime(str(value).strip('\x00 ')[:19], '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+    if offset:
+        try:
+            sign = -1 if offset.startswith('-') else 1
+            hours, minutes = offset.lstrip('+-').split(':')
+            delta = timedelta(hours=int(hours), minutes=int(minutes))
+            return captured.replace(tzinfo=dt_timezone(sign * delta))
+        except ValueError:
+            pass
+    # Sans décalage, l'heure EXIF est l'heure locale de l'appareil
+    return timezone.make_aware(captured)
+
+
+def gps_to_decimal(values, ref):
+    """Convertit des coordonnées GPS EXIF (degrés, minutes, secondes) en degrés décimaux"""
+    try:
+        degrees, minutes, seconds = (Decimal(str(float(value))) for value in values)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    decimal = degrees + minutes / 60 + seconds / 3600
+    if ref in ('S', 'W'):
+        decimal = -decimal
+    return decimal.quantize(COORDINATE_PRECISION, rounding=ROUND_HALF_UP)
+
+
+def read_exif(source):
+    """Extrait date de prise de vue, position GPS et orientation d'une image"""
+    with Image.open(source) as image:
+        exif = image.getexif()
+    exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+    gps_ifd = exif.get_ifd(ExifTags.IFD.GPSInfo)
+
+    captured_at = None
+    if exif_ifd.get(ExifTags.Base.DateTimeOriginal):
+        captured_at = parse_exif_datetime(
+            exif_ifd[ExifTags.Base.DateTimeOriginal], exif_ifd.get(ExifTags.Base.OffsetTimeOriginal)
+        )
+    elif exif.get(ExifTags.Base.DateTime):
+        captured_at = parse_exif_datetime(exif[ExifTags.Base.DateTime], exif_ifd.get(ExifTags.Base.OffsetTime))
+
+    latitude = longitude = None
+    if ExifTags.GPS.GPSLatitude in gps_ifd and ExifTags.GPS.GPSLongitude in gps_ifd:
+        latitude = gps_to_decimal(gps_ifd[ExifTags.GPS.GPSLatitude], gps_ifd.get(ExifTags.GPS.GPSLatitudeRef))
+        longitude = gps_to_decimal(gps_ifd[ExifTags.GPS.GPSLongitude], gps_ifd.get(ExifTags.GPS.GPSLongitudeRef))
+        if latitude is None or longitude is None or abs(latitude) > 90 or abs(longitude) > 180:
+            latitude = longitude = None
+
+    orientation = exif.get(ExifTags.Base.Orientation)
+    if orientation not in range(1, 9):
+        orientation = None
+
+    kept = {
+        key: str(exif[tag]).strip('\x00 ')
+        for tag, key in KEPT_TAGS.items() if exif.get(tag)
+    }
+    return {
+        'captured_at': captured_at,
+        'gps_latitude': latitude,
+        'gps_longitude': longitude,
+        'orientation': orientation,
+        'exif_data': kept or None,
+    }
+
+
+def extract_exif(photo_id):
+    """
+    Lit les métadonnées EXIF d'une photo et les range dans les colonnes
+    typées. Les données EXIF envoyées par le client sont remplacées : seuls
+    la marque et le modèle de l'appareil sont conservés.
+    """
+    IntrusionPhoto = apps.get_model('devices', 'IntrusionPhoto')
+    photo = IntrusionPhoto.objects.filter(pk=photo_id).only('pk', 'photo').first()
+    if photo is None or not photo.photo:
+        return False
+
+    try:
+        with photo.photo.open('rb') as source:
+            fields = read_exif(source)
+    except (OSError, SyntaxError):
+        fields = {'exif_data': None}
+
+    IntrusionPhoto.objects.filter(pk=photo_id).update(exif_extracted=True, **fields)
+    return True
+
+
+def schedule_exif_extraction(photo_id):
+    """Planifie l'extraction EXIF après le commit, hors de la requête"""
+    if exif_enabled():
+        transaction.on_commit(lambda: run_in_background(extract_exif, photo_id))
@@ -0,0 +1,143 @@
+import atexit
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, DateTimeField, Value, When
+
+
+def heartbeat_buffering_enabled():
+    """Indique si les heartbeats passent par le tampon en mémoire"""
+    return getattr(settings, 'DEVICES_HEARTBEAT_MODE', 'direct') == 'buffered'
+
+
+class LastSeenBuffer:
+    """
+    Tampon en mémoire des derniers heartbeats reçus par ce processus.
+
+    Les heartbeats sont accumulés par téléphone puis écrits périodiquement en
+    base avec un seul UPDATE groupé. Les lectures (`Phone.is_online`,
+    `Phone.current_last_seen`) consultent le tampon pour rester à jour.
+    """
+
+    # Nombre maximal de téléphones mis à jour par requête UPDATE
+    batch_size = 500
+    # Nombre maximal d'associations (utilisateur, device_id) mémorisées
+    max_resolved = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._resolved = {}
+        self._last_flush = time.monotonic()
+        self._flusher = None
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'DEVICES_HEARTBEAT_FLUSH_INTERVAL', 30)
+
+    def resolve(self, user_id, device_id):
+        """Retourne la clé primaire du téléphone de l'utilisateur (mise en cache)"""
+        key = (user_id, device_id)
+        phone_id = self._resolved.get(key)
+        if phone_id is None:
+            Phone = apps.get_model('devices', 'Phone')
+            phone_id = Phone.objects.filter(
+                device_id=device_id, user_id=user_id
+            ).values_list('pk', flat=True).first()
+            if phone_id is not None:
+                with self._lock:
+                    if len(self._resolved) >= self.max_resolved:
+                        self._resolved.clear()
+                    self._resolved[key] = phone_id
+        return phone_id
+
+    def forget(self, phone_id):
+        """Oublie un téléphone supprimé"""
+        with self._lock:
+            self._pending.pop(phone_id, None)
+            self._resolved = {
+                key: value for key, value in self._resolved.items() if value != phone_id
+            }
+
+    def record(self, phone_id, seen_at):
+        """Enregistre un heartbeat et déclenche l'écriture si l'intervalle est écoulé"""
+        with self._lock:
+            previous = self._pending.get(phone_id)
+            if previous is None or seen_at > previous:
+                self._pending[phone_id] = seen_at
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        self._ensure_flusher()
+        if due:
+            self.flush()
+
+    def get(self, phone_id):
+        """Retourne le dernier heartbeat en attente d'écriture pour ce téléphone"""
+        return self._pending.get(phone_id)
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Écrit les heartbeats en attente avec un UPDATE groupé par lot"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        Phone = apps.get_model('devices', 'Phone')
+        items = list(pending.items())
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            try:
+                Phone.objects.filter(pk__in=[phone_id for phone_id, _ in batch]).update(
+                    last_seen=Case(
+                        *[When(pk=phone_id, then=Value(seen_at)) for phone_id, seen_at in batch],
+                        output_field=DateTimeField()
+                    )
+                )
+            except Exception:
+                # Écriture impossible (verrou, connexion perdue) : remettre les
+                # heartbeats non écrits en attente pour la prochaine tentative
+                self._restore(items[start:])
+                raise
+        return len(items)
+
+    def _restore(self, items):
+        """Remet des heartbeats en attente, sans écraser un heartbeat plus récent"""
+        with self._lock:
+            for phone_id, seen_at in items:
+                previous = self._pending.get(phone_id)
+                if previous is None or seen_at > previous:
+                    self._pending[phone_id] = seen_at
+
+    def _ensure_flusher(self):
+        """Démarre le thread d'écriture périodique au premier heartbeat"""
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name='heartbeat-flusher', daemon=True
+            )
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erreur lors de l'écriture des heartbeats: {e}")
+            finally:
+                connection.close()
+
+
+heartbeat_buffer = LastSeenBuffer()
+
+# Écrire les derniers heartbeats à l'arrêt du processus
+atexit.register(heartbeat_buffer.flush)
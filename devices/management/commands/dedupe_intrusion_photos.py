@@ -0,0 +1,71 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from devices.models import IntrusionPhoto
+from devices.storage import content_addressed_name, content_hash, photo_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Migre les photos d'intrusion existantes vers le stockage adressé par "
+        "contenu : les fichiers identiques ne sont conservés qu'une fois"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Calculer sans modifier')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        # Empreinte -> nom déjà présent dans le stockage (ou qui le sera)
+        stored = {}
+        migrated = duplicates = missing = 0
+        reclaimed = 0
+
+        last_pk = 0
+        while True:
+            rows = list(
+                IntrusionPhoto.objects.filter(pk__gt=last_pk).exclude(photo='')
+                .order_by('pk').values_list('pk', 'photo')[:options['batch_size']]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+
+            # Plusieurs lignes peuvent déjà partager un même ancien fichier
+            for name in dict.fromkeys(name for _, name in rows):
+                if not photo_storage.exists(name):
+                    missing += 1
+                    continue
+                with photo_storage.open(name, 'rb') as source:
+                    digest = content_hash(File(source))
+                target = content_addressed_name(name, digest)
+                if name == target:
+                    stored.setdefault(digest, target)
+                    continue
+
+                size = photo_storage.size(name)
+                if digest in stored or photo_storage.exists(target):
+                    duplicates += 1
+                    reclaimed += size
+                else:
+                    migrated += 1
+                stored.setdefault(digest, target)
+                if dry_run:
+                    continue
+
+                if not photo_storage.exists(target):
+                    os.makedirs(os.path.dirname(photo_storage.path(target)), exist_ok=True)
+                    os.replace(photo_storage.path(name), photo_storage.path(target))
+                IntrusionPhoto.objects.filter(photo=name).update(photo=target)
+                # Plus aucune ligne ne référence l'ancien nom : le doublon est supprimé
+                photo_storage.delete(name)
+
+        prefix = "[simulation] " if dry_run else ""
+        self.stdout.write(
+            f"{prefix}{migrated} fichier(s) renommé(s), {duplicates} doublon(s) supprimé(s), "
+            f"{missing} fichier(s) introuvable(s), {reclaimed} octet(s) libéré(s) "
+            f"({reclaimed / (1024 * 1024):.1f} MB)"
+        )
@@ -0,0 +1,139 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from devices.models import (
+    Phone, PhoneDailyActivity, PhoneTombstone, UnlockAttempt, IntrusionPhoto, SUSPICIOUS_WINDOW
+)
+from devices.rollups import rebuild_daily_activity
+
+# Motifs d'un parcours complet de table selon le moteur
+FULL_SCAN_PATTERNS = {
+    # SQLite : « SCAN table » sans index (SEARCH et SCAN ... USING INDEX sont acceptés)
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING (?:COVERING )?INDEX\b)(?!CONSTANT ROW)(\w+)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+    'mysql': re.compile(r"\btype\W+ALL\b"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Insère un jeu de données de test (annulé à la fin), exécute EXPLAIN sur "
+        "les requêtes fréquentes de devices.views et échoue si l'une d'elles "
+        "parcourt une table entière"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--phones', type=int, default=3, help='Téléphones par utilisateur')
+        parser.add_argument('--attempts', type=int, default=50, help='Tentatives par téléphone')
+        parser.add_argument('--verbose-plans', action='store_true', help='Afficher les plans complets')
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"Moteur non pris en charge : {connection.vendor}")
+
+        failures = []
+        with transaction.atomic():
+            user, phone = self.seed(options)
+            if connection.vendor == 'postgresql':
+                # Sur un petit jeu de données PostgreSQL préfère un Seq Scan : on vérifie
+                # seulement qu'un index est utilisable
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset in self.hot_queries(user, phone):
+                plan = queryset.explain()
+                scans = sorted(set(pattern.findall(plan)))
+                status = self.style.ERROR('SCAN COMPLET') if scans else self.style.SUCCESS('OK')
+                detail = f" ({', '.join(scans)})" if scans and scans != [''] else ''
+                self.stdout.write(f"{status:<12} {name}{detail}")
+                if options['verbose_plans'] or scans:
+                    self.stdout.write(f"    {plan}".replace('\n', '\n    '))
+                if scans:
+                    failures.append(name)
+
+            # Ne rien conserver du jeu de données
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"{len(failures)} requête(s) sans index : {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("Toutes les requêtes fréquentes utilisent un index"))
+
+    def seed(self, options):
+        now = timezone.now()
+        users = User.objects.bulk_create([
+            User(username=f'explain-{i}', email=f'explain-{i}@example.com')
+            for i in range(options['users'])
+        ])
+        phones = Phone.objects.bulk_create([
+            Phone(
+                user=user, device_id=f'explain-{user.pk}-{j}', name=f'Phone {j}',
+                imei=f'35{user.pk:06d}{j:04d}', serial_number=f'SN{user.pk}{j}'
+            )
+            for user in users for j in range(options['phones'])
+        ])
+        PhoneTombstone.objects.bulk_create([
+            PhoneTombstone(user=user, phone_id=-user.pk, device_id=f'explain-deleted-{user.pk}')
+            for user in users
+        ])
+        attempts = UnlockAttempt.objects.bulk_create([
+            UnlockAttempt(
+                phone=phone, result='failed' if k % 3 else 'success',
+                recent_failures=0, flagged_suspicious=False
+            )
+            for phone in phones for k in range(options['attempts'])
+        ])
+        for offset, attempt in enumerate(attempts):
+            attempt.timestamp = now - timezone.timedelta(minutes=offset)
+        UnlockAttempt.objects.bulk_update(attempts, ['timestamp'], batch_size=500)
+        IntrusionPhoto.objects.bulk_create([
+            IntrusionPhoto(unlock_attempt=attempt, photo=f'intrusion_photos/explain/{attempt.pk}.jpg', file_size=1)
+            for attempt in attempts[::5]
+        ])
+        rebuild_daily_activity([phone.pk for phone in phones])
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        return users[0], phones[0]
+
+    def hot_queries(self, user, phone):
+        """Requêtes exécutées par devices.views, construites comme dans les vues"""
+        now = timezone.now()
+        window_start = now - timezone.timedelta(days=7)
+        attempts = UnlockAttempt.objects.filter(phone__user=user)
+        photos = IntrusionPhoto.objects.filter(unlock_attempt__phone__user=user)
+        cursor = Q(timestamp__lt=now) | Q(timestamp=now, id__lt=10 ** 9)
+
+        return [
+            ('phones: liste', Phone.objects.filter(user=user).select_related('user').with_attempt_counts()),
+            ('phones: heartbeat', Phone.objects.filter(device_id=phone.device_id, user=user)),
+            ('phones: détection par IMEI', Phone.objects.filter(user=user, imei=phone.imei)),
+            ('phones: détection par numéro de série', Phone.objects.filter(user=user, serial_number=phone.serial_number)),
+            ('phones: changements depuis', Phone.objects.filter(user=user, updated_at__gte=window_start)),
+            ('phones: suppressions depuis', PhoneTombstone.objects.filter(user=user, deleted_at__gte=window_start)),
+            ('phones: activité récente', Phone.objects.filter(user=user, last_seen__gte=now - timezone.timedelta(days=1))),
+            ('tentatives: première page', attempts.select_related('phone').order_by('-timestamp', '-id')[:51]),
+            ('tentatives: page suivante', attempts.filter(cursor).order_by('-timestamp', '-id')[:51]),
+            ('tentatives: page d\'un téléphone', attempts.filter(cursor, phone_id=phone.pk).order_by('-timestamp', '-id')[:51]),
+            ('tentatives: suspectes', attempts.filter(flagged_suspicious=True).order_by('-timestamp', '-id')[:51]),
+            ('tentatives: score de suspicion', UnlockAttempt.objects.filter(
+                phone_id__in=[phone.pk], result='failed',
+                timestamp__gte=now - SUSPICIOUS_WINDOW, timestamp__lte=now
+            ).values('phone_id').annotate(count=Count('id'))),
+            ('stats: totaux (agrégat)', PhoneDailyActivity.objects.filter(phone=phone).values('phone').annotate(
+                total=Sum('total_attempts'), failed=Sum('result_failed')
+            )),
+            ('stats: par jour (agrégat)', PhoneDailyActivity.objects.filter(phone=phone, day__gte=window_start.date())),
+            ('résumé: totaux (agrégat)', PhoneDailyActivity.objects.filter(phone__user=user).values('phone__user').annotate(
+                total=Sum('total_attempts'), photos=Sum('photos_count')
+            )),
+            ('photos: première page', photos.select_related('unlock_attempt__phone').order_by('-timestamp', '-id')[:51]),
+            ('photos: page d\'un téléphone', photos.filter(cursor, unlock_attempt__phone_id=phone.pk).order_by('-timestamp', '-id')[:51]),
+            ('photos: zone GPS', photos.filter(gps_latitude__range=(3, 5), gps_longitude__range=(9, 10))),
+        ]
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from devices.exif import extract_exif
+from devices.models import IntrusionPhoto
+
+
+class Command(BaseCommand):
+    help = "Extrait les métadonnées EXIF (date, GPS, orientation) des photos d'intrusion non traitées"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Retraiter aussi les photos déjà traitées')
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        photos = IntrusionPhoto.objects.exclude(photo='')
+        if not options['all']:
+            photos = photos.filter(exif_extracted=False)
+
+        extracted = failed = 0
+        last_pk = 0
+        while True:
+            ids = list(
+                photos.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            for photo_id in ids:
+                try:
+                    if extract_exif(photo_id):
+                        extracted += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"Photo {photo_id} : {e}")
+            last_pk = ids[-1]
+        self.stdout.write(f"{extracted} photo(s) traitée(s), {failed} échec(s)")
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from devices.models import IntrusionPhoto
+from devices.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = "Génère la miniature et la version moyenne des photos d'intrusion qui n'en ont pas encore"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Régénérer aussi les photos déjà traitées')
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        photos = IntrusionPhoto.objects.exclude(photo='')
+        if not options['all']:
+            photos = photos.filter(renditions_ready=False)
+
+        generated = failed = 0
+        last_pk = 0
+        while True:
+            ids = list(
+                photos.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            for photo_id in ids:
+                try:
+                    if generate_renditions(photo_id):
+                        generated += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"Photo {photo_id} : {e}")
+            last_pk = ids[-1]
+        self.stdout.write(f"{generated} photo(s) traitée(s), {failed} échec(s)")
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from devices.models import PhoneTombstone
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les traces de téléphones supprimés plus anciennes que "
+        "DEVICES_SYNC_TOMBSTONE_TTL (les clients plus anciens refont une "
+        "synchronisation complète)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Compter sans supprimer')
+
+    def handle(self, *args, **options):
+        ttl = getattr(settings, 'DEVICES_SYNC_TOMBSTONE_TTL', 30 * 24 * 3600)
+        stale = PhoneTombstone.objects.filter(
+            deleted_at__lt=timezone.now() - timezone.timedelta(seconds=ttl)
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"{stale.count()} trace(s) à purger")
+            return
+
+        purged = 0
+        while True:
+            ids = list(stale.order_by('deleted_at').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            purged += PhoneTombstone.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(f"{purged} trace(s) purgée(s)")
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from devices.models import PhotoUploadSession
+from devices.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les envois de photos par morceaux abandonnés (non finalisés "
+        "depuis DEVICES_UPLOAD_SESSION_TTL) et leurs fichiers temporaires"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Compter sans supprimer')
+
+    def handle(self, *args, **options):
+        ttl = getattr(settings, 'DEVICES_UPLOAD_SESSION_TTL', 24 * 3600)
+        stale = PhotoUploadSession.objects.filter(
+            status='pending',
+            updated_at__lt=timezone.now() - timezone.timedelta(seconds=ttl)
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"{stale.count()} envoi(s) à purger")
+            return
+
+        purged = 0
+        reclaimed = 0
+        while True:
+            sessions = list(stale.order_by('updated_at')[:options['batch_size']])
+            if not sessions:
+                break
+            for session in sessions:
+                discard_upload(session)
+                reclaimed += session.received_size
+            PhotoUploadSession.objects.filter(pk__in=[session.pk for session in sessions]).delete()
+            purged += len(sessions)
+        self.stdout.write(f"{purged} envoi(s) purgé(s), {reclaimed} octet(s) libéré(s)")
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from devices.models import Phone
+from devices.rollups import rebuild_daily_activity
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit l'agrégat quotidien (PhoneDailyActivity) depuis les "
+        "tentatives et photos brutes, par lots de téléphones"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--phone', type=int, action='append', dest='phones', help='Limiter à ce téléphone (répétable)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Téléphones par lot')
+
+    def handle(self, *args, **options):
+        phones = Phone.objects.order_by('pk').values_list('pk', flat=True)
+        if options['phones']:
+            phones = phones.filter(pk__in=options['phones'])
+
+        rebuilt_phones = rows = 0
+        last_pk = 0
+        while True:
+            ids = list(phones.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not ids:
+                break
+            rows += rebuild_daily_activity(ids)
+            rebuilt_phones += len(ids)
+            last_pk = ids[-1]
+        self.stdout.write(f"{rebuilt_phones} téléphone(s) reconstruit(s), {rows} ligne(s) quotidienne(s)")
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.5 on 2026-10-17 14:33
+
+from collections import deque
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_suspicion_scores(apps, schema_editor):
+    """Calcule le score des tentatives existantes par balayage chronologique"""
+    Phone = apps.get_model('devices', 'Phone')
+    UnlockAttempt = apps.get_model('devices', 'UnlockAttempt')
+    window = timedelta(minutes=10)
+
+    for phone in Phone.objects.only('id', 'unlock_attempts_threshold').iterator():
+        failures = deque()
+        batch = []
+        attempts = UnlockAttempt.objects.filter(phone_id=phone.id).order_by('timestamp', 'id')
+        for attempt in attempts.only('id', 'result', 'timestamp').iterator():
+            while failures and failures[0] < attempt.timestamp - window:
+                failures.popleft()
+            is_failed = attempt.result == 'failed'
+            attempt.recent_failures = len(failures) + (1 if is_failed else 0)
+            attempt.flagged_suspicious = is_failed and attempt.recent_failures >= phone.unlock_attempts_threshold
+            if is_failed:
+                failures.append(attempt.timestamp)
+            batch.append(attempt)
+            if len(batch) >= 500:
+                UnlockAttempt.objects.bulk_update(batch, ['recent_failures', 'flagged_suspicious'])
+                batch = []
+        if batch:
+            UnlockAttempt.objects.bulk_update(batch, ['recent_failures', 'flagged_suspicious'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0002_alter_phone_device_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unlockattempt',
+            name='flagged_suspicious',
+            field=models.BooleanField(db_index=True, default=False, help_text="Tentative marquée comme suspecte à l'insertion"),
+        ),
+        migrations.AddField(
+            model_name='unlockattempt',
+            name='recent_failures',
+            field=models.PositiveIntegerField(blank=True, help_text='Échecs du téléphone dans les 10 minutes précédant la tentative', null=True),
+        ),
+        migrations.RunPython(backfill_suspicion_scores, migrations.RunPython.noop),
+    ]
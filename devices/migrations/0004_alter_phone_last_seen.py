@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-17 14:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0003_unlockattempt_suspicion_score'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='phone',
+            name='last_seen',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text="Dernière activité de l'appareil"),
+        ),
+    ]
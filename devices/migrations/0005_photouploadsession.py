@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-17 14:45
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0004_alter_phone_last_seen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoUploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('camera_type', models.CharField(choices=[('front', 'Frontale'), ('back', 'Arrière')], default='front', max_length=10)),
+                ('exif_data', models.JSONField(blank=True, null=True)),
+                ('total_size', models.PositiveIntegerField(help_text='Taille annoncée du fichier en octets')),
+                ('received_size', models.PositiveIntegerField(default=0, help_text='Octets reçus')),
+                ('status', models.CharField(choices=[('pending', 'En cours'), ('completed', 'Terminé')], default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('photo', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='devices.intrusionphoto')),
+                ('unlock_attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='devices.unlockattempt')),
+            ],
+            options={
+                'verbose_name': 'Envoi de photo par morceaux',
+                'verbose_name_plural': 'Envois de photos par morceaux',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-17 14:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0005_photouploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='intrusionphoto',
+            name='renditions_ready',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
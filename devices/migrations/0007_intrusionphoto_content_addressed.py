@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-17 14:48
+
+import devices.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0006_intrusionphoto_renditions_ready'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='intrusionphoto',
+            name='photo',
+            field=models.ImageField(db_index=True, help_text="Photo prise lors de la tentative d'intrusion", storage=devices.storage.get_photo_storage, upload_to='intrusion_photos/%Y/%m/%d/'),
+        ),
+    ]
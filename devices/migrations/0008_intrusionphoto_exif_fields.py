@@ -0,0 +1,42 @@
+# Generated by Django 5.1.5 on 2026-10-17 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0007_intrusionphoto_content_addressed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='intrusionphoto',
+            name='captured_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Date de prise de vue (EXIF)', null=True),
+        ),
+        migrations.AddField(
+            model_name='intrusionphoto',
+            name='exif_extracted',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='intrusionphoto',
+            name='gps_latitude',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='intrusionphoto',
+            name='gps_longitude',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True),
+        ),
+        migrations.AddField(
+            model_name='intrusionphoto',
+            name='orientation',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Orientation EXIF (1-8)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='intrusionphoto',
+            index=models.Index(fields=['gps_latitude', 'gps_longitude'], name='devices_photo_gps_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-17 14:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0008_intrusionphoto_exif_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='intrusionphoto',
+            index=models.Index(fields=['unlock_attempt', 'timestamp', 'id'], name='devices_photo_attempt_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phone',
+            index=models.Index(fields=['user', 'imei'], name='devices_phone_user_imei_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phone',
+            index=models.Index(fields=['user', 'serial_number'], name='devices_phone_user_serial_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phone',
+            index=models.Index(fields=['user', 'last_seen'], name='devices_phone_user_seen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unlockattempt',
+            index=models.Index(fields=['phone', 'result', 'timestamp'], name='devices_attempt_phone_res_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unlockattempt',
+            index=models.Index(fields=['phone', 'timestamp', 'id'], name='devices_attempt_phone_ts_idx'),
+        ),
+    ]
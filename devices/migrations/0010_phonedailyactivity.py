@@ -0,0 +1,92 @@
+# Generated by Django 5.1.5 on 2026-10-17 14:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_activity(apps, schema_editor):
+    """Remplit l'agrégat depuis les tentatives et photos existantes, par lots de téléphones"""
+    Phone = apps.get_model('devices', 'Phone')
+    PhoneDailyActivity = apps.get_model('devices', 'PhoneDailyActivity')
+    UnlockAttempt = apps.get_model('devices', 'UnlockAttempt')
+    IntrusionPhoto = apps.get_model('devices', 'IntrusionPhoto')
+
+    counts = {
+        f'{prefix}{value}': Count('id', filter=Q(**{field: value}))
+        for prefix, field in (('result_', 'result'), ('type_', 'attempt_type'))
+        for value, _ in UnlockAttempt._meta.get_field(field).choices
+    }
+    phone_ids = list(Phone.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(phone_ids), 500):
+        batch = phone_ids[start:start + 500]
+        rows = {}
+
+        attempts = (
+            UnlockAttempt.objects.filter(phone_id__in=batch)
+            .annotate(day=TruncDate('timestamp'))
+            .values('phone_id', 'day')
+            .annotate(
+                total_attempts=Count('id'),
+                suspicious_attempts=Count('id', filter=Q(flagged_suspicious=True)),
+                **counts
+            )
+            .order_by()
+        )
+        for values in attempts:
+            key = (values.pop('phone_id'), values.pop('day'))
+            rows[key] = PhoneDailyActivity(phone_id=key[0], day=key[1], **values)
+
+        photos = (
+            IntrusionPhoto.objects.filter(unlock_attempt__phone_id__in=batch)
+            .annotate(day=TruncDate('timestamp'))
+            .values('unlock_attempt__phone_id', 'day')
+            .annotate(photos_count=Count('id'), photos_bytes=Sum('file_size'))
+            .order_by()
+        )
+        for values in photos:
+            key = (values['unlock_attempt__phone_id'], values['day'])
+            row = rows.setdefault(key, PhoneDailyActivity(phone_id=key[0], day=key[1]))
+            row.photos_count = values['photos_count']
+            row.photos_bytes = values['photos_bytes'] or 0
+
+        PhoneDailyActivity.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0009_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhoneDailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total_attempts', models.PositiveIntegerField(default=0)),
+                ('suspicious_attempts', models.PositiveIntegerField(default=0)),
+                ('result_success', models.PositiveIntegerField(default=0)),
+                ('result_failed', models.PositiveIntegerField(default=0)),
+                ('result_blocked', models.PositiveIntegerField(default=0)),
+                ('type_pin', models.PositiveIntegerField(default=0)),
+                ('type_pattern', models.PositiveIntegerField(default=0)),
+                ('type_password', models.PositiveIntegerField(default=0)),
+                ('type_fingerprint', models.PositiveIntegerField(default=0)),
+                ('type_face', models.PositiveIntegerField(default=0)),
+                ('type_other', models.PositiveIntegerField(default=0)),
+                ('photos_count', models.PositiveIntegerField(default=0)),
+                ('photos_bytes', models.PositiveBigIntegerField(default=0)),
+                ('phone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to='devices.phone')),
+            ],
+            options={
+                'verbose_name': 'Activité quotidienne',
+                'verbose_name_plural': 'Activités quotidiennes',
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('phone', 'day'), name='devices_daily_phone_day_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_activity, migrations.RunPython.noop),
+    ]
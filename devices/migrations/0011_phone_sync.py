@@ -0,0 +1,48 @@
+# Generated by Django 5.1.5 on 2026-10-17 14:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0010_phonedailyactivity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhoneTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_id', models.BigIntegerField()),
+                ('device_id', models.CharField(max_length=255)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Téléphone supprimé',
+                'verbose_name_plural': 'Téléphones supprimés',
+                'ordering': ['-deleted_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='phone',
+            index=models.Index(fields=['user', 'updated_at'], name='devices_phone_user_upd_idx'),
+        ),
+        migrations.AddField(
+            model_name='phonetombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='phone_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='phonetombstone',
+            index=models.Index(fields=['user', 'deleted_at'], name='devices_tomb_user_del_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phonetombstone',
+            index=models.Index(fields=['deleted_at'], name='devices_tomb_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-17 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0011_phone_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phone',
+            name='token_version',
+            field=models.PositiveIntegerField(default=0, help_text="Version des jetons d'appareil (incrémentée pour les révoquer)"),
+        ),
+    ]
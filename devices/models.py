@@ -1,8 +1,89 @@
-from django.db import models
+import os
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, Q
+from django.db.models.query import ModelIterable
 from django.contrib.auth.models import User
 from django.utils import timezone
 
-class Phone(models.Model):
+from .heartbeat import heartbeat_buffer
+from .presence import presence_registry
+from .storage import get_photo_storage
+
+# Fenêtre glissante utilisée pour détecter les tentatives suspectes
+SUSPICIOUS_WINDOW = timezone.timedelta(minutes=10)
+
+class LoadedValuesMixin:
+    """
+    Conserve les valeurs lues en base (ou du dernier enregistrement) pour que
+    les signaux post_save comparent l'état précédent d'une ligne modifiée.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def current_values(self):
+        return {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+    def loaded_value(self, attname):
+        """Valeur précédente d'un champ (None si la ligne n'a pas été lue depuis la base)"""
+        return getattr(self, '_loaded_values', {}).get(attname)
+
+    def changed_fields(self):
+        """Champs modifiés depuis la lecture (vide si la ligne n'a pas été lue depuis la base)"""
+        loaded = getattr(self, '_loaded_values', {})
+        return {attname for attname, value in loaded.items() if getattr(self, attname) != value}
+
+    def previous_version(self):
+        """
+        Copie non enregistrée de la ligne avant modification (les champs non
+        chargés reprennent la valeur courante), ou None si elle est inconnue.
+        """
+        if not hasattr(self, '_loaded_values'):
+            return None
+        return type(self)(**{**self.current_values(), **self._loaded_values})
+
+    def remember_loaded_values(self):
+        self._loaded_values = self.current_values()
+
+
+class PresenceIterable(ModelIterable):
+    """Itérable qui lit la présence de tous les téléphones en une seule lecture du cache"""
+
+    def __iter__(self):
+        phones = list(super().__iter__())
+        presence_registry.annotate(phones)
+        yield from phones
+
+
+class PhoneQuerySet(models.QuerySet):
+
+    def with_presence(self):
+        """Pré-calcule `is_online` depuis le registre de présence"""
+        clone = self._chain()
+        clone._iterable_class = PresenceIterable
+        return clone
+
+    def with_attempt_counts(self):
+        """Annote le nombre total et récent (24h) de tentatives de chaque téléphone"""
+        yesterday = timezone.now() - timezone.timedelta(days=1)
+        return self.annotate(
+            unlock_attempts_count=Count('unlock_attempts'),
+            recent_attempts_count=Count(
+                'unlock_attempts',
+                filter=Q(unlock_attempts__timestamp__gte=yesterday)
+            ),
+        )
+
+
+class Phone(LoadedValuesMixin, models.Model):
     """Modèle représentant un appareil mobile de l'utilisateur"""
 
     # Choix pour le système d'exploitation
@@ -40,7 +121,11 @@ class Phone(models.Model):
     # Statut et sécurité
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     is_primary = models.BooleanField(default=False, help_text="Appareil principal de l'utilisateur")
-    last_seen = models.DateTimeField(auto_now=True, help_text="Dernière activité de l'appareil")
+    last_seen = models.DateTimeField(default=timezone.now, help_text="Dernière activité de l'appareil")
+    token_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Version des jetons d'appareil (incrémentée pour les révoquer)"
+    )
 
     # Paramètres de sécurité
     unlock_attempts_threshold = models.PositiveIntegerField(
@@ -60,11 +145,22 @@ class Phone(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PhoneQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Téléphone"
         verbose_name_plural = "Téléphones"
         ordering = ['-is_primary', '-last_seen']
         unique_together = ['user', 'device_id']
+        indexes = [
+            # Détection de l'appareil (views.device_detection_view)
+            models.Index(fields=['user', 'imei'], name='devices_phone_user_imei_idx'),
+            models.Index(fields=['user', 'serial_number'], name='devices_phone_user_serial_idx'),
+            # Activité récente des appareils d'un utilisateur
+            models.Index(fields=['user', 'last_seen'], name='devices_phone_user_seen_idx'),
+            # Synchronisation différentielle (devices.sync)
+            models.Index(fields=['user', 'updated_at'], name='devices_phone_user_upd_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.user.get_full_name() or self.user.username})"
@@ -72,15 +168,27 @@ class Phone(models.Model):
     def save(self, *args, **kwargs):
         # S'assurer qu'un seul appareil est marqué comme principal par utilisateur
         if self.is_primary:
-            Phone.objects.filter(user=self.user, is_primary=True).exclude(pk=self.pk).update(is_primary=False)
+            # updated_at n'est pas mis à jour par .update() : le renseigner pour la synchronisation
+            Phone.objects.filter(user=self.user, is_primary=True).exclude(pk=self.pk).update(
+                is_primary=False, updated_at=timezone.now()
+            )
         super().save(*args, **kwargs)
+        self.remember_loaded_values()
+
+    @property
+    def current_last_seen(self):
+        """Dernière activité, y compris les heartbeats pas encore écrits en base"""
+        buffered = heartbeat_buffer.get(self.pk)
+        if buffered is not None and (self.last_seen is None or buffered > self.last_seen):
+            return buffered
+        return self.last_seen
 
     @property
     def is_online(self):
-        """Vérifie si l'appareil est considéré comme en ligne (activité récente)"""
-        if not self.last_seen:
-            return False
-        return (timezone.now() - self.last_seen).total_seconds() < 300  # 5 minutes
+        """Vérifie si l'appareil est en ligne (WebSocket connecté ou heartbeat récent)"""
+        if not hasattr(self, '_is_online'):
+            self._is_online = presence_registry.is_online(self.user_id, self.pk)
+        return self._is_online
 
     @property
     def display_name(self):
@@ -90,7 +198,74 @@ class Phone(models.Model):
         return self.name
 
 
-class UnlockAttempt(models.Model):
+def score_suspicion_batch(attempts):
+    """
+    Calcule le score de suspicion d'un lot de nouvelles tentatives (non encore
+    enregistrées) avec une seule requête agrégée sur les échecs récents.
+    """
+    recent_failures = dict(
+        UnlockAttempt.objects.filter(
+            phone_id__in={attempt.phone_id for attempt in attempts},
+            result='failed',
+            timestamp__gte=timezone.now() - SUSPICIOUS_WINDOW
+        ).values('phone_id').annotate(total=Count('id')).order_by().values_list('phone_id', 'total')
+    )
+    for attempt in attempts:
+        is_failed = attempt.result == 'failed'
+        if is_failed:
+            recent_failures[attempt.phone_id] = recent_failures.get(attempt.phone_id, 0) + 1
+        attempt.recent_failures = recent_failures.get(attempt.phone_id, 0)
+        attempt.flagged_suspicious = (
+            is_failed and attempt.recent_failures >= attempt.phone.unlock_attempts_threshold
+        )
+    return attempts
+
+
+def classify_suspicious(attempts):
+    """
+    Recalcule le score de suspicion de tentatives déjà enregistrées en une
+    seule requête : les échecs de chaque téléphone sur la période couverte
+    sont triés par (horodatage, id), puis chaque tentative compte ceux de la
+    fenêtre glissante qui la précède (balayage par bisection).
+
+    Donne le même résultat que le calcul à l'insertion, mais pour n'importe
+    quel lot (seuil modifié, insertions concurrentes, lignes importées sans
+    score). Retourne les tentatives dont le score a changé.
+    """
+    if not attempts:
+        return []
+    rows = UnlockAttempt.objects.filter(
+        phone_id__in={attempt.phone_id for attempt in attempts},
+        result='failed',
+        timestamp__gte=min(attempt.timestamp for attempt in attempts) - SUSPICIOUS_WINDOW,
+        timestamp__lte=max(attempt.timestamp for attempt in attempts),
+    ).order_by('phone_id', 'timestamp', 'id').values_list(
+        'phone_id', 'timestamp', 'id', 'phone__unlock_attempts_threshold'
+    )
+
+    failures = defaultdict(list)
+    thresholds = {}
+    for phone_id, timestamp, pk, threshold in rows:
+        failures[phone_id].append((timestamp, pk))
+        thresholds[phone_id] = threshold
+
+    changed = []
+    for attempt in attempts:
+        keys = failures.get(attempt.phone_id, [])
+        recent_failures = (
+            bisect_right(keys, (attempt.timestamp, attempt.pk))
+            - bisect_left(keys, (attempt.timestamp - SUSPICIOUS_WINDOW,))
+        )
+        # Une tentative échouée figure parmi les échecs : le seuil de son téléphone est connu
+        flagged = attempt.result == 'failed' and recent_failures >= thresholds[attempt.phone_id]
+        if (attempt.recent_failures, attempt.flagged_suspicious) != (recent_failures, flagged):
+            attempt.recent_failures = recent_failures
+            attempt.flagged_suspicious = flagged
+            changed.append(attempt)
+    return changed
+
+
+class UnlockAttempt(LoadedValuesMixin, models.Model):
     """Modèle pour enregistrer les tentatives de déverrouillage"""
 
     ATTEMPT_TYPES = [
@@ -122,29 +297,50 @@ class UnlockAttempt(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
 
+    # Score de suspicion calculé une seule fois à l'insertion (save() et ingestion
+    # par lot) ; NULL seulement tant que la tentative n'est pas enregistrée
+    recent_failures = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Échecs du téléphone dans les 10 minutes précédant la tentative"
+    )
+    flagged_suspicious = models.BooleanField(
+        default=False,
+        db_index=True,
+        help_text="Tentative marquée comme suspecte à l'insertion"
+    )
+
     class Meta:
         verbose_name = "Tentative de déverrouillage"
         verbose_name_plural = "Tentatives de déverrouillage"
         ordering = ['-timestamp']
+        indexes = [
+            # Score de suspicion et statistiques : échecs d'un téléphone sur une fenêtre
+            models.Index(fields=['phone', 'result', 'timestamp'], name='devices_attempt_phone_res_idx'),
+            # Historique d'un téléphone paginé par (timestamp, id)
+            models.Index(fields=['phone', 'timestamp', 'id'], name='devices_attempt_phone_ts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.phone.name} - {self.get_result_display()} ({self.timestamp.strftime('%d/%m/%Y %H:%M')})"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.recent_failures is None:
+            self.score_suspicion()
+        super().save(*args, **kwargs)
+        self.remember_loaded_values()
+
+    def score_suspicion(self):
+        """Calcule le nombre d'échecs récents du téléphone et le drapeau suspect"""
+        score_suspicion_batch([self])
+
     @property
     def is_suspicious(self):
-        """Détermine si cette tentative est suspecte"""
-        if self.result == 'failed':
-            # Compter les tentatives échouées récentes
-            recent_failures = UnlockAttempt.objects.filter(
-                phone=self.phone,
-                result='failed',
-                timestamp__gte=timezone.now() - timezone.timedelta(minutes=10)
-            ).count()
-            return recent_failures >= self.phone.unlock_attempts_threshold
-        return False
-
-
-class IntrusionPhoto(models.Model):
+        """Détermine si cette tentative est suspecte (score calculé à l'insertion)"""
+        return self.flagged_suspicious
+
+
+class IntrusionPhoto(LoadedValuesMixin, models.Model):
     """Modèle pour stocker les photos prises lors de tentatives d'intrusion"""
 
     unlock_attempt = models.ForeignKey(
@@ -152,8 +348,12 @@ class IntrusionPhoto(models.Model):
         on_delete=models.CASCADE,
         related_name='photos'
     )
+    # Fichiers nommés par empreinte et partagés entre photos identiques ;
+    # l'index sert au comptage des références (devices.storage)
     photo = models.ImageField(
         upload_to='intrusion_photos/%Y/%m/%d/',
+        storage=get_photo_storage,
+        db_index=True,
         help_text="Photo prise lors de la tentative d'intrusion"
     )
     camera_type = models.CharField(
@@ -167,15 +367,160 @@ class IntrusionPhoto(models.Model):
     # Métadonnées EXIF (optionnel)
     exif_data = models.JSONField(blank=True, null=True, help_text="Données EXIF de la photo")
 
+    # Champs EXIF extraits côté serveur (devices.exif), indexés pour le filtrage
+    captured_at = models.DateTimeField(null=True, blank=True, db_index=True, help_text="Date de prise de vue (EXIF)")
+    gps_latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
+    gps_longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    orientation = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Orientation EXIF (1-8)")
+    exif_extracted = models.BooleanField(default=False, editable=False)
+
+    # Miniature et version moyenne générées en arrière-plan (devices.renditions)
+    renditions_ready = models.BooleanField(default=False, editable=False)
+
     class Meta:
         verbose_name = "Photo d'intrusion"
         verbose_name_plural = "Photos d'intrusion"
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['gps_latitude', 'gps_longitude'], name='devices_photo_gps_idx'),
+            # Photos d'une tentative / d'un téléphone paginées par (timestamp, id)
+            models.Index(fields=['unlock_attempt', 'timestamp', 'id'], name='devices_photo_attempt_ts_idx'),
+        ]
 
     def __str__(self):
         return f"Photo {self.camera_type} - {self.unlock_attempt.phone.name} ({self.timestamp.strftime('%d/%m/%Y %H:%M')})"
 
     def save(self, *args, **kwargs):
-        if self.photo:
+        # La taille est déjà connue pour les envois par morceaux : ne pas relire le fichier
+        if self.photo and (not self.file_size or not self.photo._committed):
             self.file_size = self.photo.size
+        content = self.photo._file if self.photo and not self.photo._committed else None
         super().save(*args, **kwargs)
+        self.remember_loaded_values()
+        storage = self.photo.storage
+        if content is not None and hasattr(storage, 'ensure_stored'):
+            # Fichier partagé réutilisé : le revérifier une fois la ligne visible
+            name = self.photo.name
+            transaction.on_commit(lambda: storage.ensure_stored(name, content))
+
+
+class PhotoUploadSession(models.Model):
+    """
+    Envoi par morceaux (reprenable) d'une photo d'intrusion.
+    Les morceaux sont ajoutés à un fichier temporaire, puis la finalisation
+    crée la ligne IntrusionPhoto de façon atomique.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'En cours'),
+        ('completed', 'Terminé'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    unlock_attempt = models.ForeignKey(
+        UnlockAttempt,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    camera_type = models.CharField(
+        max_length=10,
+        choices=[('front', 'Frontale'), ('back', 'Arrière')],
+        default='front'
+    )
+    exif_data = models.JSONField(blank=True, null=True)
+    total_size = models.PositiveIntegerField(help_text="Taille annoncée du fichier en octets")
+    received_size = models.PositiveIntegerField(default=0, help_text="Octets reçus")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    photo = models.OneToOneField(
+        IntrusionPhoto,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload_session'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Envoi de photo par morceaux"
+        verbose_name_plural = "Envois de photos par morceaux"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Envoi {self.pk} ({self.received_size}/{self.total_size} octets)"
+
+    @property
+    def temp_path(self):
+        """Fichier temporaire qui reçoit les morceaux"""
+        # Hors de MEDIA_ROOT : un envoi partiel n'est pas téléchargeable
+        return os.path.join(settings.DEVICES_UPLOAD_TEMP_DIR, f'{self.pk}.part')
+
+    @property
+    def is_complete(self):
+        return self.received_size >= self.total_size
+
+
+class PhoneDailyActivity(models.Model):
+    """
+    Agrégat quotidien de l'activité d'un téléphone (devices.rollups).
+    Mis à jour à chaque insertion ou suppression de tentative / photo, il
+    permet aux statistiques de lire quelques lignes au lieu des événements bruts.
+    """
+
+    phone = models.ForeignKey(Phone, on_delete=models.CASCADE, related_name='daily_activity')
+    day = models.DateField()
+
+    total_attempts = models.PositiveIntegerField(default=0)
+    suspicious_attempts = models.PositiveIntegerField(default=0)
+
+    # Tentatives par résultat
+    result_success = models.PositiveIntegerField(default=0)
+    result_failed = models.PositiveIntegerField(default=0)
+    result_blocked = models.PositiveIntegerField(default=0)
+
+    # Tentatives par type
+    type_pin = models.PositiveIntegerField(default=0)
+    type_pattern = models.PositiveIntegerField(default=0)
+    type_password = models.PositiveIntegerField(default=0)
+    type_fingerprint = models.PositiveIntegerField(default=0)
+    type_face = models.PositiveIntegerField(default=0)
+    type_other = models.PositiveIntegerField(default=0)
+
+    photos_count = models.PositiveIntegerField(default=0)
+    photos_bytes = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Activité quotidienne"
+        verbose_name_plural = "Activités quotidiennes"
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['phone', 'day'], name='devices_daily_phone_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.phone_id} - {self.day} ({self.total_attempts} tentatives)"
+
+
+class PhoneTombstone(models.Model):
+    """
+    Trace d'un téléphone supprimé, pour que la synchronisation différentielle
+    (devices.sync) signale les suppressions. Purgée après
+    DEVICES_SYNC_TOMBSTONE_TTL (voir purge_phone_tombstones).
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='phone_tombstones')
+    phone_id = models.BigIntegerField()
+    device_id = models.CharField(max_length=255)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Téléphone supprimé"
+        verbose_name_plural = "Téléphones supprimés"
+        ordering = ['-deleted_at']
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='devices_tomb_user_del_idx'),
+            models.Index(fields=['deleted_at'], name='devices_tomb_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} (supprimé le {self.deleted_at})"
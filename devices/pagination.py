@@ -0,0 +1,113 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par curseur sur (timestamp, id), du plus récent au plus ancien.
+
+    Chaque page est obtenue par une condition
+    « (timestamp, id) < (t, i) » suivie d'un LIMIT : le coût ne dépend pas de
+    la taille de l'historique, aucun COUNT(*) n'est exécuté et les curseurs
+    restent valides quand de nouvelles lignes sont insérées.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Curseur invalide'
+
+    def get_page_size(self, request):
+        default = getattr(settings, 'DEVICES_PAGE_SIZE', 50)
+        maximum = getattr(settings, 'DEVICES_MAX_PAGE_SIZE', 200)
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, default))
+        except (TypeError, ValueError):
+            page_size = default
+        return max(1, min(page_size, maximum))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            timestamp = parse_datetime(payload['t'])
+            pk = int(payload['i'])
+            reverse = bool(payload.get('r', False))
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk, reverse
+
+    def encode_cursor(self, obj, reverse=False):
+        payload = {'t': obj.timestamp.isoformat(), 'i': obj.pk}
+        if reverse:
+            payload['r'] = True
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        reverse = False
+        if cursor is None:
+            queryset = queryset.order_by('-timestamp', '-id')
+        else:
+            timestamp, pk, reverse = cursor
+            if reverse:
+                # Page précédente : lignes plus récentes que le curseur, lues dans l'ordre croissant
+                queryset = queryset.filter(
+                    Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk)
+                ).order_by('timestamp', 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk)
+                ).order_by('-timestamp', '-id')
+
+        # Une ligne de plus pour savoir s'il existe une page suivante, sans COUNT
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_url = self.previous_url = None
+        if results:
+            # En marche arrière, la ligne du curseur garantit une page suivante
+            if has_more or reverse:
+                self.next_url = self.encode_cursor(results[-1])
+            # En marche avant, la ligne du curseur garantit une page précédente
+            if cursor is not None and (has_more or not reverse):
+                self.previous_url = self.encode_cursor(results[0], reverse=True)
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.next_url),
+            ('previous', self.previous_url),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,115 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class PresenceRegistry:
+    """
+    Registre de présence des téléphones, partagé via le cache Django.
+
+    Chaque téléphone possède sa propre entrée (devices:presence:<user>:<phone>)
+    qui expire d'elle-même après son TTL : deux téléphones d'un même
+    utilisateur ne se disputent jamais une entrée. La présence d'une liste de
+    téléphones se lit en un seul get_many. Les entrées sont alimentées par les
+    heartbeats HTTP ; les connexions WebSocket (NotificationConsumer) tiennent
+    à part un compteur de sockets ouverts (…:<phone>:sockets), si bien que la
+    fermeture d'un socket ne masque ni les autres sockets du téléphone ni un
+    heartbeat HTTP récent.
+    """
+
+    key_prefix = 'devices:presence'
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'DEVICES_PRESENCE_CACHE', 'default')]
+
+    def _key(self, user_id, phone_id):
+        return f'{self.key_prefix}:{user_id}:{phone_id}'
+
+    def _sockets_key(self, user_id, phone_id):
+        return f'{self._key(user_id, phone_id)}:sockets'
+
+    def _online_keys(self, pairs):
+        """Clés (présence ou sockets) des couples (utilisateur, téléphone) en ligne, en un get_many"""
+        keys = []
+        for user_id, phone_id in pairs:
+            keys += [self._key(user_id, phone_id), self._sockets_key(user_id, phone_id)]
+        now = time.time()
+        online = set()
+        for key, value in self.cache.get_many(keys).items():
+            if key.endswith(':sockets'):
+                if value > 0:
+                    online.add(key[:-len(':sockets')])
+            elif value > now:
+                online.add(key)
+        return online
+
+    def touch(self, user_id, phone_id, ttl=None):
+        """Marque un téléphone comme en ligne pendant `ttl` secondes"""
+        if ttl is None:
+            ttl = getattr(settings, 'DEVICES_PRESENCE_TTL', 300)
+        key = self._key(user_id, phone_id)
+        expires = time.time() + ttl
+        # Ne pas raccourcir une présence plus longue (heartbeat HTTP puis ping WebSocket)
+        if (self.cache.get(key) or 0) < expires:
+            self.cache.set(key, expires, timeout=ttl)
+
+    def socket_opened(self, user_id, phone_id, ttl=None):
+        """
+        Compte un socket ouvert du téléphone. Le compteur expire après `ttl`
+        secondes sans ping (worker arrêté sans déconnexion propre).
+        """
+        if ttl is None:
+            ttl = getattr(settings, 'DEVICES_SOCKET_PRESENCE_TTL', 120)
+        key = self._sockets_key(user_id, phone_id)
+        if not self.cache.add(key, 1, timeout=ttl):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                # Expiré entre add() et incr()
+                self.cache.set(key, 1, timeout=ttl)
+            self.cache.touch(key, ttl)
+
+    def socket_alive(self, user_id, phone_id, ttl=None):
+        """Prolonge le compteur de sockets après un ping"""
+        if ttl is None:
+            ttl = getattr(settings, 'DEVICES_SOCKET_PRESENCE_TTL', 120)
+        key = self._sockets_key(user_id, phone_id)
+        if not self.cache.touch(key, ttl):
+            self.cache.add(key, 1, timeout=ttl)
+
+    def socket_closed(self, user_id, phone_id):
+        """Décompte un socket fermé ; la présence HTTP éventuelle expire d'elle-même"""
+        key = self._sockets_key(user_id, phone_id)
+        try:
+            if self.cache.decr(key) <= 0:
+                self.cache.delete(key)
+        except ValueError:
+            pass
+
+    def remove(self, user_id, phone_id):
+        """Marque un téléphone comme hors ligne (téléphone supprimé)"""
+        self.cache.delete_many([self._key(user_id, phone_id), self._sockets_key(user_id, phone_id)])
+
+    def online_phone_ids(self, user_id, phone_ids):
+        """Sous-ensemble des téléphones donnés actuellement en ligne"""
+        keys = {self._key(user_id, phone_id): phone_id for phone_id in phone_ids}
+        return {keys[key] for key in self._online_keys((user_id, phone_id) for phone_id in phone_ids)}
+
+    def online_count(self, user_id, phone_ids):
+        return len(self.online_phone_ids(user_id, phone_ids))
+
+    def is_online(self, user_id, phone_id):
+        return bool(self._online_keys([(user_id, phone_id)]))
+
+    def annotate(self, phones):
+        """Pré-calcule `is_online` d'une liste de téléphones (une seule lecture du cache)"""
+        keys = {self._key(phone.user_id, phone.pk): phone for phone in phones}
+        online = self._online_keys((phone.user_id, phone.pk) for phone in phones)
+        for key, phone in keys.items():
+            phone._is_online = key in online
+        return phones
+
+
+presence_registry = PresenceRegistry()
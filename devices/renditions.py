@@ -0,0 +1,73 @@
+import io
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from media_app.tasks import run_in_background
+
+# Déclinaisons générées pour chaque photo : nom -> boîte englobante (pixels)
+RENDITIONS = {
+    'medium': (800, 800),
+    'thumbnail': (150, 150),
+}
+RENDITION_QUALITY = 80
+
+
+def renditions_enabled():
+    return getattr(settings, 'DEVICES_PHOTO_RENDITIONS', True)
+
+
+def rendition_name(photo_id, rendition):
+    """Chemin (dans MEDIA_ROOT) d'une déclinaison, indexé par la photo"""
+    return f'thumbnails/{rendition}/{photo_id}.jpg'
+
+
+def rendition_url(photo, rendition):
+    """URL d'une déclinaison déjà générée (None tant qu'elle ne l'est pas)"""
+    if not photo.renditions_ready:
+        return None
+    return default_storage.url(rendition_name(photo.pk, rendition))
+
+
+def generate_renditions(photo_id):
+    """
+    Génère les déclinaisons d'une photo puis la marque comme prête.
+    Le JPEG est décodé directement à une résolution réduite (draft) et la
+    miniature est dérivée de la version moyenne plutôt que de l'original.
+    """
+    IntrusionPhoto = apps.get_model('devices', 'IntrusionPhoto')
+    photo = IntrusionPhoto.objects.filter(pk=photo_id).only('pk', 'photo').first()
+    if photo is None or not photo.photo:
+        return False
+
+    largest = max(RENDITIONS.values())
+    with photo.photo.open('rb') as source:
+        with Image.open(source) as original:
+            original.draft('RGB', largest)
+            image = ImageOps.exif_transpose(original).convert('RGB')
+
+    for rendition, size in sorted(RENDITIONS.items(), key=lambda item: item[1], reverse=True):
+        image.thumbnail(size)
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=RENDITION_QUALITY, optimize=True)
+        name = rendition_name(photo_id, rendition)
+        default_storage.delete(name)
+        default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    IntrusionPhoto.objects.filter(pk=photo_id).update(renditions_ready=True)
+    return True
+
+
+def schedule_renditions(photo_id):
+    """Planifie la génération des déclinaisons après le commit, hors de la requête"""
+    if renditions_enabled():
+        transaction.on_commit(lambda: run_in_background(generate_renditions, photo_id))
+
+
+def delete_renditions(photo_id):
+    for rendition in RENDITIONS:
+        default_storage.delete(rendition_name(photo_id, rendition))
@@ -0,0 +1,161 @@
+from collections import Counter, defaultdict
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .models import IntrusionPhoto, PhoneDailyActivity, UnlockAttempt
+
+RESULT_FIELDS = {result: f'result_{result}' for result, _ in UnlockAttempt.RESULT_CHOICES}
+TYPE_FIELDS = {attempt_type: f'type_{attempt_type}' for attempt_type, _ in UnlockAttempt.ATTEMPT_TYPES}
+COUNTER_FIELDS = [
+    'total_attempts', 'suspicious_attempts',
+    *RESULT_FIELDS.values(), *TYPE_FIELDS.values(),
+    'photos_count', 'photos_bytes',
+]
+
+
+def activity_day(timestamp):
+    """Jour (heure locale) auquel un événement est rattaché, comme TruncDate"""
+    return timezone.localdate(timestamp)
+
+
+def attempt_deltas(attempts, sign=1):
+    """Variations des compteurs quotidiens pour un lot de tentatives"""
+    deltas = defaultdict(Counter)
+    for attempt in attempts:
+        values = deltas[(attempt.phone_id, activity_day(attempt.timestamp))]
+        values['total_attempts'] += sign
+        if attempt.flagged_suspicious:
+            values['suspicious_attempts'] += sign
+        if attempt.result in RESULT_FIELDS:
+            values[RESULT_FIELDS[attempt.result]] += sign
+        if attempt.attempt_type in TYPE_FIELDS:
+            values[TYPE_FIELDS[attempt.attempt_type]] += sign
+    return deltas
+
+
+def photo_deltas(photos, sign=1):
+    """Variations des compteurs quotidiens pour un lot de photos"""
+    deltas = defaultdict(Counter)
+    for photo in photos:
+        try:
+            phone_id = photo.unlock_attempt.phone_id
+        except ObjectDoesNotExist:
+            # Tentative déjà supprimée : l'agrégat du téléphone l'est aussi
+            continue
+        values = deltas[(phone_id, activity_day(photo.timestamp))]
+        values['photos_count'] += sign
+        values['photos_bytes'] += sign * (photo.file_size or 0)
+    return deltas
+
+
+def merge_deltas(*deltas):
+    """Additionne plusieurs jeux de variations (en gardant les valeurs négatives)"""
+    merged = defaultdict(Counter)
+    for delta in deltas:
+        for key, values in delta.items():
+            merged[key].update(values)
+    return merged
+
+
+def apply_deltas(deltas):
+    """
+    Applique les variations avec un UPDATE ... SET col = col + n par jour et
+    par téléphone ; la ligne du jour est créée à la première insertion.
+    Les décréments sont bornés à zéro : un agrégat qui aurait dérivé des
+    tables brutes (voir rebuild_daily_activity) ne fait pas échouer la
+    transaction. Appelée dans la transaction de l'écriture quand il y en a une.
+    """
+    for (phone_id, day), values in deltas.items():
+        values = {field: delta for field, delta in values.items() if delta}
+        if not values:
+            continue
+        rows = PhoneDailyActivity.objects.filter(phone_id=phone_id, day=day)
+        increments = {
+            field: Greatest(F(field) + delta, 0) if delta < 0 else F(field) + delta
+            for field, delta in values.items()
+        }
+        if rows.update(**increments):
+            continue
+        values = {field: delta for field, delta in values.items() if delta > 0}
+        if not values:
+            # Une suppression ne crée jamais de ligne
+            continue
+        try:
+            with transaction.atomic():
+                PhoneDailyActivity.objects.create(phone_id=phone_id, day=day, **values)
+        except IntegrityError:
+            # Ligne créée entre-temps par une requête concurrente
+            rows.update(**increments)
+
+
+def record_attempts(attempts, sign=1):
+    apply_deltas(attempt_deltas(attempts, sign))
+
+
+def record_photos(photos, sign=1):
+    apply_deltas(photo_deltas(photos, sign))
+
+
+def record_attempt_change(previous, attempt):
+    """Remplace l'ancienne version d'une tentative modifiée par la nouvelle"""
+    apply_deltas(merge_deltas(attempt_deltas([previous], -1), attempt_deltas([attempt])))
+
+
+def record_photo_change(previous, photo):
+    """Remplace l'ancienne version d'une photo modifiée par la nouvelle"""
+    apply_deltas(merge_deltas(photo_deltas([previous], -1), photo_deltas([photo])))
+
+
+def rebuild_daily_activity(phone_ids):
+    """Recalcule entièrement l'agrégat des téléphones donnés depuis les tables brutes"""
+    rows = {}
+
+    def row(phone_id, day):
+        if (phone_id, day) not in rows:
+            rows[(phone_id, day)] = PhoneDailyActivity(phone_id=phone_id, day=day)
+        return rows[(phone_id, day)]
+
+    attempt_counts = {
+        f'{prefix}{value}': Count('id', filter=Q(**{lookup: value}))
+        for prefix, lookup, choices in (
+            ('result_', 'result', RESULT_FIELDS),
+            ('type_', 'attempt_type', TYPE_FIELDS),
+        )
+        for value in choices
+    }
+    attempts = (
+        UnlockAttempt.objects.filter(phone_id__in=phone_ids)
+        .annotate(day=TruncDate('timestamp'))
+        .values('phone_id', 'day')
+        .annotate(
+            total_attempts=Count('id'),
+            suspicious_attempts=Count('id', filter=Q(flagged_suspicious=True)),
+            **attempt_counts
+        )
+        .order_by()
+    )
+    for values in attempts:
+        activity = row(values.pop('phone_id'), values.pop('day'))
+        for field, count in values.items():
+            setattr(activity, field, count)
+
+    photos = (
+        IntrusionPhoto.objects.filter(unlock_attempt__phone_id__in=phone_ids)
+        .annotate(day=TruncDate('timestamp'))
+        .values('unlock_attempt__phone_id', 'day')
+        .annotate(photos_count=Count('id'), photos_bytes=Sum('file_size'))
+        .order_by()
+    )
+    for values in photos:
+        activity = row(values['unlock_attempt__phone_id'], values['day'])
+        activity.photos_count = values['photos_count']
+        activity.photos_bytes = values['photos_bytes'] or 0
+
+    with transaction.atomic():
+        PhoneDailyActivity.objects.filter(phone_id__in=phone_ids).delete()
+        PhoneDailyActivity.objects.bulk_create(rows.values(), batch_size=500)
+    return len(rows)
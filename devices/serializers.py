@@ -1,12 +1,18 @@
+from decimal import Decimal
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import Phone, UnlockAttempt, IntrusionPhoto
+from .models import Phone, PhoneTombstone, UnlockAttempt, IntrusionPhoto, PhotoUploadSession
+from .authentication import get_authenticated_phone, issue_device_token
+from .renditions import rendition_url
 
 class PhoneSerializer(serializers.ModelSerializer):
     """Serializer pour les téléphones"""
     user = serializers.StringRelatedField(read_only=True)
     display_name = serializers.ReadOnlyField()
     is_online = serializers.ReadOnlyField()
+    last_seen = serializers.DateTimeField(source='current_last_seen', read_only=True)
     unlock_attempts_count = serializers.SerializerMethodField()
     recent_attempts_count = serializers.SerializerMethodField()
     
@@ -24,16 +30,30 @@ class PhoneSerializer(serializers.ModelSerializer):
     
     def get_unlock_attempts_count(self, obj):
         """Retourne le nombre total de tentatives de déverrouillage"""
+        # Utilise l'annotation de Phone.objects.with_attempt_counts() si présente
+        if hasattr(obj, 'unlock_attempts_count'):
+            return obj.unlock_attempts_count
         return obj.unlock_attempts.count()
     
     def get_recent_attempts_count(self, obj):
         """Retourne le nombre de tentatives récentes (24h)"""
+        if hasattr(obj, 'recent_attempts_count'):
+            return obj.recent_attempts_count
         from django.utils import timezone
         yesterday = timezone.now() - timezone.timedelta(days=1)
         return obj.unlock_attempts.filter(timestamp__gte=yesterday).count()
 
+class PhoneTombstoneSerializer(serializers.ModelSerializer):
+    """Serializer pour les téléphones supprimés (synchronisation différentielle)"""
+    id = serializers.IntegerField(source='phone_id', read_only=True)
+
+    class Meta:
+        model = PhoneTombstone
+        fields = ['id', 'device_id', 'deleted_at']
+
 class PhoneRegistrationSerializer(serializers.ModelSerializer):
     """Serializer pour l'enregistrement d'un nouveau téléphone"""
+    device_token = serializers.SerializerMethodField()
 
     class Meta:
         model = Phone
@@ -41,9 +61,13 @@ class PhoneRegistrationSerializer(serializers.ModelSerializer):
             'id', 'device_id', 'name', 'brand', 'model', 'os_type', 'os_version',
             'app_version', 'imei', 'serial_number', 'is_primary',
             'unlock_attempts_threshold', 'photo_capture_enabled',
-            'location_tracking_enabled', 'created_at'
+            'location_tracking_enabled', 'created_at', 'device_token'
         ]
         read_only_fields = ['id', 'created_at']
+
+    def get_device_token(self, obj):
+        """Jeton d'appareil à utiliser pour les requêtes émises par ce téléphone"""
+        return issue_device_token(obj)
     
     def create(self, validated_data):
         """Crée un nouveau téléphone pour l'utilisateur connecté"""
@@ -68,11 +92,15 @@ class UnlockAttemptSerializer(serializers.ModelSerializer):
     
     def get_photos_count(self, obj):
         """Retourne le nombre de photos associées"""
+        # Utilise l'annotation de la vue de liste si présente
+        if hasattr(obj, 'photos_count'):
+            return obj.photos_count
         return obj.photos.count()
 
 class UnlockAttemptCreateSerializer(serializers.ModelSerializer):
     """Serializer pour créer une tentative de déverrouillage"""
-    phone_device_id = serializers.CharField(write_only=True, max_length=255)
+    # Facultatif avec un jeton d'appareil : le téléphone authentifié est utilisé
+    phone_device_id = serializers.CharField(write_only=True, max_length=255, required=False)
     is_suspicious = serializers.ReadOnlyField()
 
     class Meta:
@@ -84,39 +112,78 @@ class UnlockAttemptCreateSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'is_suspicious', 'timestamp']
     
+    def get_authenticated_phone(self):
+        request = self.context.get('request')
+        return get_authenticated_phone(request) if request is not None else None
+
     def validate_phone_device_id(self, value):
-        """Valide que le device_id appartient à l'utilisateur connecté"""
-        user = self.context['request'].user
-        print(user)
-        print(value)
+        """Valide que le device_id appartient à l'utilisateur connecté et renvoie le téléphone"""
+        # Un jeton d'appareil n'autorise que son propre téléphone
+        authenticated_phone = self.get_authenticated_phone()
+        if authenticated_phone is not None:
+            if value != authenticated_phone.device_id:
+                raise serializers.ValidationError("Appareil non trouvé ou non autorisé.")
+            return authenticated_phone
 
-        try:
-            phone = Phone.objects.get(device_id=value, user=user)
-            return value
-        except Phone.DoesNotExist:
+        # Les téléphones peuvent être pré-chargés dans le contexte (ingestion par lot)
+        phones = self.context.get('phones')
+        if phones is not None:
+            phone = phones.get(value)
+        else:
+            user = self.context['request'].user
+            phone = Phone.objects.filter(device_id=value, user=user).first()
+
+        if phone is None:
             raise serializers.ValidationError("Appareil non trouvé ou non autorisé.")
-    
+        return phone
+
+    def validate(self, attrs):
+        if 'phone_device_id' not in attrs:
+            phone = self.get_authenticated_phone()
+            if phone is None:
+                raise serializers.ValidationError({'phone_device_id': "Ce champ est obligatoire."})
+            attrs['phone_device_id'] = phone
+        return attrs
+
     def create(self, validated_data):
         """Crée une nouvelle tentative de déverrouillage"""
-        device_id = validated_data.pop('phone_device_id')
-        user = self.context['request'].user
-        phone = Phone.objects.get(device_id=device_id, user=user)
-        validated_data['phone'] = phone
+        validated_data['phone'] = validated_data.pop('phone_device_id')
         return super().create(validated_data)
 
 class IntrusionPhotoSerializer(serializers.ModelSerializer):
     """Serializer pour les photos d'intrusion"""
     unlock_attempt_info = serializers.SerializerMethodField()
     file_size_display = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    medium_url = serializers.SerializerMethodField()
     
     class Meta:
         model = IntrusionPhoto
         fields = [
             'id', 'unlock_attempt', 'unlock_attempt_info', 'photo',
+            'thumbnail_url', 'medium_url',
             'camera_type', 'file_size', 'file_size_display',
-            'timestamp', 'exif_data'
+            'timestamp', 'captured_at', 'gps_latitude', 'gps_longitude',
+            'orientation', 'exif_data'
+        ]
+        read_only_fields = [
+            'file_size', 'timestamp', 'captured_at', 'gps_latitude',
+            'gps_longitude', 'orientation', 'exif_data'
         ]
-        read_only_fields = ['file_size', 'timestamp']
+
+    def get_rendition_url(self, obj, rendition):
+        """URL d'une déclinaison (null tant qu'elle n'est pas générée)"""
+        url = rendition_url(obj, rendition)
+        request = self.context.get('request')
+        if url and request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_thumbnail_url(self, obj):
+        return self.get_rendition_url(obj, 'thumbnail')
+
+    def get_medium_url(self, obj):
+        return self.get_rendition_url(obj, 'medium')
     
     def get_unlock_attempt_info(self, obj):
         """Retourne des informations sur la tentative de déverrouillage"""
@@ -139,7 +206,25 @@ class IntrusionPhotoSerializer(serializers.ModelSerializer):
                 return f"{obj.file_size / (1024 * 1024):.1f} MB"
         return "N/A"
 
-class IntrusionPhotoUploadSerializer(serializers.ModelSerializer):
+class UnlockAttemptOwnershipMixin:
+    """Résout `unlock_attempt_id` en tentative appartenant à l'appelant"""
+
+    def validate_unlock_attempt_id(self, value):
+        """Valide que la tentative appartient à l'utilisateur connecté et la renvoie"""
+        request = self.context['request']
+        phone = get_authenticated_phone(request)
+        try:
+            if phone is not None:
+                # Jeton d'appareil : la tentative doit provenir de ce téléphone
+                attempt = UnlockAttempt.objects.get(id=value, phone_id=phone.pk)
+                attempt.phone = phone
+            else:
+                attempt = UnlockAttempt.objects.select_related('phone').get(id=value, phone__user=request.user)
+            return attempt
+        except UnlockAttempt.DoesNotExist:
+            raise serializers.ValidationError("Tentative de déverrouillage non trouvée ou non autorisée.")
+
+class IntrusionPhotoUploadSerializer(UnlockAttemptOwnershipMixin, serializers.ModelSerializer):
     """Serializer pour uploader des photos d'intrusion"""
     unlock_attempt_id = serializers.IntegerField(write_only=True)
     
@@ -147,23 +232,59 @@ class IntrusionPhotoUploadSerializer(serializers.ModelSerializer):
         model = IntrusionPhoto
         fields = ['unlock_attempt_id', 'photo', 'camera_type', 'exif_data']
     
-    def validate_unlock_attempt_id(self, value):
-        """Valide que la tentative appartient à l'utilisateur connecté"""
-        user = self.context['request'].user
-        try:
-            attempt = UnlockAttempt.objects.get(id=value, phone__user=user)
-            return value
-        except UnlockAttempt.DoesNotExist:
-            raise serializers.ValidationError("Tentative de déverrouillage non trouvée ou non autorisée.")
-    
     def create(self, validated_data):
         """Crée une nouvelle photo d'intrusion"""
-        attempt_id = validated_data.pop('unlock_attempt_id')
-        user = self.context['request'].user
-        unlock_attempt = UnlockAttempt.objects.get(id=attempt_id, phone__user=user)
-        validated_data['unlock_attempt'] = unlock_attempt
+        validated_data['unlock_attempt'] = validated_data.pop('unlock_attempt_id')
+        return super().create(validated_data)
+
+class PhotoUploadSessionSerializer(UnlockAttemptOwnershipMixin, serializers.ModelSerializer):
+    """Serializer pour démarrer et suivre un envoi de photo par morceaux"""
+    unlock_attempt_id = serializers.IntegerField(write_only=True)
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    photo_id = serializers.PrimaryKeyRelatedField(source='photo', read_only=True)
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PhotoUploadSession
+        fields = [
+            'upload_id', 'unlock_attempt_id', 'camera_type', 'exif_data',
+            'total_size', 'received_size', 'status', 'photo_id',
+            'chunk_size', 'created_at'
+        ]
+        read_only_fields = ['received_size', 'status', 'created_at']
+
+    def get_chunk_size(self, obj):
+        """Taille de morceau conseillée au client"""
+        return getattr(settings, 'DEVICES_UPLOAD_CHUNK_SIZE', 512 * 1024)
+
+    def validate_total_size(self, value):
+        max_size = getattr(settings, 'DEVICES_UPLOAD_MAX_SIZE', 20 * 1024 * 1024)
+        if not 0 < value <= max_size:
+            raise serializers.ValidationError(f"La taille doit être comprise entre 1 et {max_size} octets.")
+        return value
+
+    def create(self, validated_data):
+        """Démarre un nouvel envoi"""
+        validated_data['unlock_attempt'] = validated_data.pop('unlock_attempt_id')
         return super().create(validated_data)
 
+class PhotoFilterSerializer(serializers.Serializer):
+    """Paramètres de filtrage des photos par date de prise de vue et zone GPS"""
+    captured_after = serializers.DateTimeField(required=False)
+    captured_before = serializers.DateTimeField(required=False)
+    min_lat = serializers.DecimalField(max_digits=10, decimal_places=8, min_value=Decimal('-90'), max_value=Decimal('90'), required=False)
+    max_lat = serializers.DecimalField(max_digits=10, decimal_places=8, min_value=Decimal('-90'), max_value=Decimal('90'), required=False)
+    min_lng = serializers.DecimalField(max_digits=11, decimal_places=8, min_value=Decimal('-180'), max_value=Decimal('180'), required=False)
+    max_lng = serializers.DecimalField(max_digits=11, decimal_places=8, min_value=Decimal('-180'), max_value=Decimal('180'), required=False)
+
+    def validate(self, attrs):
+        bbox = [name for name in ('min_lat', 'max_lat', 'min_lng', 'max_lng') if name in attrs]
+        if bbox and len(bbox) != 4:
+            raise serializers.ValidationError("La zone GPS requiert min_lat, max_lat, min_lng et max_lng.")
+        if bbox and (attrs['min_lat'] > attrs['max_lat'] or attrs['min_lng'] > attrs['max_lng']):
+            raise serializers.ValidationError("La zone GPS doit avoir min_lat <= max_lat et min_lng <= max_lng.")
+        return attrs
+
 class PhoneStatsSerializer(serializers.Serializer):
     """Serializer pour les statistiques d'un téléphone"""
     total_attempts = serializers.IntegerField()
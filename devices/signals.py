@@ -0,0 +1,185 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import phone_cache
+from .events import dispatch_attempts, dispatch_photos
+from .exif import schedule_exif_extraction
+from .heartbeat import heartbeat_buffer
+from .models import Phone, PhoneTombstone, UnlockAttempt, IntrusionPhoto
+from .presence import presence_registry
+from .renditions import delete_renditions, schedule_renditions
+from .rollups import record_attempt_change, record_attempts, record_photo_change, record_photos
+from .summary import summary_cache
+from .suspicion import rescore_suspicion
+
+
+# Champs dont dépend l'agrégat quotidien (les autres modifications ne le touchent pas)
+ATTEMPT_ROLLUP_FIELDS = {'phone_id', 'timestamp', 'result', 'attempt_type', 'flagged_suspicious'}
+PHOTO_ROLLUP_FIELDS = {'unlock_attempt_id', 'timestamp', 'file_size'}
+
+
+def cascaded_from_owner(origin):
+    """
+    Indique si la suppression vient d'un téléphone ou d'un utilisateur : leurs
+    agrégats disparaissent en cascade, inutile de les mettre à jour ligne à ligne.
+    """
+    return isinstance(origin, (Phone, User)) or getattr(origin, 'model', None) in (Phone, User)
+
+
+def owner_id(instance, path):
+    """Propriétaire d'une tentative ou d'une photo (None si la chaîne est déjà supprimée)"""
+    try:
+        for attribute in path:
+            instance = getattr(instance, attribute)
+    except ObjectDoesNotExist:
+        return None
+    return instance.user_id
+
+
+@receiver(post_delete, sender=Phone)
+def forget_deleted_phone(sender, instance, **kwargs):
+    """Retire un téléphone supprimé du tampon des heartbeats et du registre de présence"""
+    heartbeat_buffer.forget(instance.pk)
+    presence_registry.remove(instance.user_id, instance.pk)
+    phone_cache.invalidate(instance.pk)
+    summary_cache.invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=Phone)
+def record_phone_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Conserve la trace d'un téléphone supprimé pour la synchronisation
+    différentielle, sauf quand c'est son propriétaire qui est supprimé.
+    """
+    if isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    PhoneTombstone.objects.create(user_id=instance.user_id, phone_id=instance.pk, device_id=instance.device_id)
+
+
+@receiver(post_save, sender=Phone)
+def invalidate_cached_phone(sender, instance, update_fields=None, **kwargs):
+    """Retire un téléphone modifié du cache des jetons d'appareil (sauf simple heartbeat)"""
+    if update_fields is not None and set(update_fields) <= {'last_seen'}:
+        return
+    phone_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Phone)
+def invalidate_phone_summary(sender, instance, update_fields=None, **kwargs):
+    """
+    Invalide le résumé du propriétaire. Un simple heartbeat ne l'invalide pas :
+    la dernière activité est complétée à la lecture par le tampon des heartbeats.
+    """
+    if update_fields is not None and set(update_fields) <= {'last_seen'}:
+        return
+    summary_cache.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Phone)
+def rescore_on_threshold_change(sender, instance, created, **kwargs):
+    """Recalcule les tentatives suspectes d'un téléphone dont le seuil a changé"""
+    previous = instance.loaded_value('unlock_attempts_threshold')
+    if not created and previous is not None and previous != instance.unlock_attempts_threshold:
+        rescore_suspicion([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_summary(sender, instance, **kwargs):
+    """Le résumé contient le nom d'utilisateur de chaque appareil"""
+    summary_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=UnlockAttempt)
+@receiver(post_delete, sender=UnlockAttempt)
+def invalidate_attempt_summary(sender, instance, origin=None, **kwargs):
+    """
+    Invalide le résumé du propriétaire quand une tentative est ajoutée,
+    modifiée ou supprimée (une seule fois par forget_deleted_phone lors d'une
+    cascade)
+    """
+    if not cascaded_from_owner(origin):
+        summary_cache.invalidate(owner_id(instance, ['phone']))
+
+
+@receiver(post_save, sender=IntrusionPhoto)
+@receiver(post_delete, sender=IntrusionPhoto)
+def invalidate_photo_summary(sender, instance, origin=None, **kwargs):
+    """Invalide le résumé du propriétaire quand une photo est ajoutée, modifiée ou supprimée"""
+    if not cascaded_from_owner(origin):
+        summary_cache.invalidate(owner_id(instance, ['unlock_attempt', 'phone']))
+
+
+@receiver(post_save, sender=UnlockAttempt)
+def push_unlock_attempt(sender, instance, created, **kwargs):
+    """Notifie le propriétaire d'une nouvelle tentative de déverrouillage"""
+    if created:
+        dispatch_attempts([instance])
+
+
+@receiver(post_save, sender=UnlockAttempt)
+def rollup_unlock_attempt(sender, instance, created, **kwargs):
+    """Reporte une tentative ajoutée ou modifiée sur l'agrégat quotidien du téléphone"""
+    if created:
+        record_attempts([instance])
+    elif instance.changed_fields() & ATTEMPT_ROLLUP_FIELDS:
+        record_attempt_change(instance.previous_version(), instance)
+
+
+@receiver(post_delete, sender=UnlockAttempt)
+def rollup_deleted_unlock_attempt(sender, instance, origin=None, **kwargs):
+    """Retire une tentative supprimée de l'agrégat quotidien"""
+    if not cascaded_from_owner(origin):
+        record_attempts([instance], sign=-1)
+
+
+@receiver(post_save, sender=IntrusionPhoto)
+def push_intrusion_photo(sender, instance, created, **kwargs):
+    """Notifie le propriétaire d'une nouvelle photo d'intrusion"""
+    if created:
+        dispatch_photos([instance])
+
+
+@receiver(post_save, sender=IntrusionPhoto)
+def rollup_intrusion_photo(sender, instance, created, **kwargs):
+    """Reporte une photo ajoutée ou modifiée sur l'agrégat quotidien du téléphone"""
+    if created:
+        record_photos([instance])
+    elif instance.changed_fields() & PHOTO_ROLLUP_FIELDS:
+        record_photo_change(instance.previous_version(), instance)
+
+
+@receiver(post_delete, sender=IntrusionPhoto)
+def rollup_deleted_intrusion_photo(sender, instance, origin=None, **kwargs):
+    """Retire une photo supprimée de l'agrégat quotidien"""
+    if not cascaded_from_owner(origin):
+        record_photos([instance], sign=-1)
+
+
+@receiver(post_save, sender=IntrusionPhoto)
+def generate_photo_renditions(sender, instance, created, **kwargs):
+    """Génère la miniature et la version moyenne d'une nouvelle photo"""
+    if created and instance.photo:
+        schedule_renditions(instance.pk)
+
+
+@receiver(post_save, sender=IntrusionPhoto)
+def extract_photo_exif(sender, instance, created, **kwargs):
+    """Extrait les métadonnées EXIF d'une nouvelle photo"""
+    if created and instance.photo:
+        schedule_exif_extraction(instance.pk)
+
+
+@receiver(post_delete, sender=IntrusionPhoto)
+def delete_photo_files(sender, instance, **kwargs):
+    """
+    Supprime les déclinaisons et le fichier d'une photo supprimée, après le
+    commit. Le fichier est conservé s'il est partagé avec une autre photo.
+    """
+    if instance.photo:
+        transaction.on_commit(lambda: instance.photo.delete(save=False))
+    # La clé primaire est remise à None à la fin de la suppression
+    photo_id = instance.pk
+    transaction.on_commit(lambda: delete_renditions(photo_id))
@@ -0,0 +1,62 @@
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import PhoneDailyActivity
+from .rollups import RESULT_FIELDS, TYPE_FIELDS
+
+DEFAULT_STATS_DAYS = 7
+MAX_STATS_DAYS = 365
+
+
+def compute_phone_stats(phone, days=DEFAULT_STATS_DAYS):
+    """
+    Calcule les statistiques d'un téléphone depuis l'agrégat quotidien
+    (PhoneDailyActivity) : deux requêtes sur au plus une ligne par jour,
+    quel que soit le nombre de tentatives et de photos brutes.
+    """
+    activity = PhoneDailyActivity.objects.filter(phone=phone)
+
+    # 1. Totaux sur tout l'historique, y compris par type de tentative
+    totals = activity.aggregate(
+        total_attempts=Sum('total_attempts'),
+        suspicious_attempts=Sum('suspicious_attempts'),
+        photos_count=Sum('photos_count'),
+        **{field: Sum(field) for field in RESULT_FIELDS.values()},
+        **{field: Sum(field) for field in TYPE_FIELDS.values()}
+    )
+    totals = {field: value or 0 for field, value in totals.items()}
+
+    # Type de tentative le plus courant
+    type_counts = {attempt_type: totals[field] for attempt_type, field in TYPE_FIELDS.items()}
+    most_common_type = max(type_counts, key=type_counts.get) if any(type_counts.values()) else None
+
+    # 2. Statistiques quotidiennes (fenêtre configurable)
+    today = timezone.localdate()
+    dates = [today - timezone.timedelta(days=i) for i in range(days)]
+    daily = {
+        row['day']: row
+        for row in activity.filter(day__gte=dates[-1]).values(
+            'day', 'total_attempts', 'result_failed', 'photos_count'
+        )
+    }
+
+    daily_stats = []
+    for date in dates:
+        day = daily.get(date, {})
+        daily_stats.append({
+            'date': date.isoformat(),
+            'total_attempts': day.get('total_attempts', 0),
+            'failed_attempts': day.get('result_failed', 0),
+            'photos_count': day.get('photos_count', 0)
+        })
+
+    return {
+        'total_attempts': totals['total_attempts'],
+        'failed_attempts': totals['result_failed'],
+        'successful_attempts': totals['result_success'],
+        'suspicious_attempts': totals['suspicious_attempts'],
+        'photos_count': totals['photos_count'],
+        'last_activity': phone.current_last_seen,
+        'most_common_attempt_type': most_common_type or 'N/A',
+        'daily_stats': daily_stats
+    }
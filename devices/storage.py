@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import fcntl
+except ImportError:
+    # Hôtes sans fcntl (Windows) : verrou limité au processus, suffisant en développement
+    fcntl = None
+
+_process_locks = {}
+_process_locks_guard = threading.Lock()
+
+
+def process_lock(path):
+    with _process_locks_guard:
+        return _process_locks.setdefault(path, threading.Lock())
+
+
+def content_hash(content):
+    """Empreinte SHA-256 d'un fichier, lue par blocs"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_addressed_name(name, digest):
+    """
+    Nom dérivé du contenu : <dossier racine>/<aa>/<bb>/<sha256><extension>.
+    Le dossier racine vient de upload_to (ex. intrusion_photos).
+    """
+    root = name.replace('\\', '/').split('/', 1)[0] if '/' in name else ''
+    extension = os.path.splitext(name)[1].lower()
+    return '/'.join(part for part in (root, digest[:2], digest[2:4], f'{digest}{extension}') if part)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stockage des photos d'intrusion nommé par empreinte du contenu.
+
+    Deux photos identiques (envoi rejoué, rafale) partagent le même fichier.
+    Le nombre de références est obtenu par une requête sur la colonne
+    (indexée) IntrusionPhoto.photo : un fichier n'est supprimé que lorsque
+    plus aucune photo ne le référence.
+    """
+
+    @contextmanager
+    def content_lock(self, name):
+        """
+        Verrou (entre processus d'un même hôte) propre à une empreinte : la
+        vérification des références et la suppression d'un fichier ne
+        s'entrelacent pas avec sa réutilisation par un nouvel envoi.
+        """
+        digest = os.path.splitext(os.path.basename(name))[0]
+        # Hors de MEDIA_ROOT, servi publiquement
+        lock_dir = settings.DEVICES_STORAGE_LOCK_DIR
+        os.makedirs(lock_dir, exist_ok=True)
+        path = os.path.join(lock_dir, f'{digest[:2] or "_"}.lock')
+        if fcntl is None:
+            with process_lock(path):
+                yield
+            return
+        with open(path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _save(self, name, content):
+        target = content_addressed_name(name, content_hash(content))
+        # Vérification et écriture sous le même verrou : deux envois du même
+        # contenu n'écrivent qu'un fichier (pas de copie renommée)
+        with self.content_lock(target):
+            if self.exists(target):
+                # Contenu déjà stocké : rien à écrire (voir ensure_stored après le commit)
+                return target
+            return super()._save(target, content)
+
+    def ensure_stored(self, name, content):
+        """
+        À appeler après le commit de la ligne qui référence `name` : si une
+        suppression concurrente a retiré le fichier partagé avant de voir
+        cette ligne, il est réécrit depuis `content`.
+        """
+        with self.content_lock(name):
+            if self.exists(name):
+                return False
+            if content.closed:
+                content.open('rb')
+            content.seek(0)
+            super()._save(name, content)
+        return True
+
+    def is_referenced(self, name):
+        IntrusionPhoto = apps.get_model('devices', 'IntrusionPhoto')
+        return IntrusionPhoto.objects.filter(photo=name).exists()
+
+    def delete(self, name):
+        if not name:
+            return super().delete(name)
+        with self.content_lock(name):
+            if self.is_referenced(name):
+                return
+            super().delete(name)
+
+
+photo_storage = ContentAddressedStorage()
+
+
+def get_photo_storage():
+    return photo_storage
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class SummaryCache:
+    """
+    Cache du résumé des appareils (écran d'accueil de l'application), par
+    utilisateur, partagé via le cache Django.
+
+    Seule la partie coûteuse est mise en cache : les téléphones annotés et les
+    totaux de l'agrégat quotidien. La présence est superposée à la lecture.
+    L'entrée d'un utilisateur est invalidée dès qu'un de ses téléphones, une de
+    ses tentatives ou une de ses photos change (signaux, et explicitement pour
+    les insertions groupées). La durée de vie borne seulement ce qui dépend de
+    l'heure : fenêtre de 24h des tentatives récentes et heartbeats déjà écrits.
+    """
+
+    key_prefix = 'devices:summary'
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'DEVICES_SUMMARY_CACHE', 'default')]
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'DEVICES_SUMMARY_CACHE_TTL', 60)
+
+    def _key(self, user_id):
+        return f'{self.key_prefix}:{user_id}'
+
+    def _count(self, name):
+        key = f'{self.key_prefix}:stats:{name}'
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # Premier comptage (ou compteur évincé du cache)
+            if not self.cache.add(key, 1, timeout=None):
+                self.cache.incr(key)
+
+    def get(self, user_id):
+        """Retourne le résumé en cache d'un utilisateur, ou None"""
+        if self.ttl <= 0:
+            return None
+        payload = self.cache.get(self._key(user_id))
+        self._count('hits' if payload is not None else 'misses')
+        return payload
+
+    def set(self, user_id, payload):
+        if self.ttl <= 0:
+            return
+        self.cache.set(self._key(user_id), payload, timeout=self.ttl)
+
+    def invalidate(self, *user_ids):
+        """
+        Supprime le résumé des utilisateurs donnés, immédiatement puis après le
+        commit, pour qu'une lecture concurrente pendant la transaction ne laisse
+        pas en cache l'état précédent (au pire jusqu'à expiration).
+        """
+        keys = [self._key(user_id) for user_id in set(user_ids) if user_id is not None]
+        if not keys:
+            return
+        self.cache.delete_many(keys)
+        transaction.on_commit(lambda: self.cache.delete_many(keys))
+
+    def stats(self):
+        """Compteurs de succès et d'échecs du cache, pour la supervision"""
+        counters = self.cache.get_many([f'{self.key_prefix}:stats:hits', f'{self.key_prefix}:stats:misses'])
+        hits = counters.get(f'{self.key_prefix}:stats:hits', 0)
+        misses = counters.get(f'{self.key_prefix}:stats:misses', 0)
+        total = hits + misses
+        return {
+            'enabled': self.ttl > 0,
+            'ttl': self.ttl,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+
+    def reset_stats(self):
+        self.cache.delete_many([f'{self.key_prefix}:stats:hits', f'{self.key_prefix}:stats:misses'])
+
+
+summary_cache = SummaryCache()
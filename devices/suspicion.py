@@ -0,0 +1,44 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .models import Phone, UnlockAttempt, classify_suspicious
+from .rollups import activity_day, apply_deltas
+from .summary import summary_cache
+
+
+def rescore_suspicion(phone_ids, batch_size=1000):
+    """
+    Recalcule par lots le score de suspicion des tentatives des téléphones
+    donnés (classify_suspicious) et reporte les drapeaux modifiés sur
+    l'agrégat quotidien. Retourne le nombre de tentatives modifiées.
+    """
+    attempts = UnlockAttempt.objects.filter(phone_id__in=phone_ids).order_by('pk').only(
+        'id', 'phone_id', 'timestamp', 'result', 'recent_failures', 'flagged_suspicious'
+    )
+    updated = 0
+    last_pk = 0
+    while True:
+        batch = list(attempts.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        flagged_before = {attempt.pk: attempt.flagged_suspicious for attempt in batch}
+        changed = classify_suspicious(batch)
+        if not changed:
+            continue
+
+        deltas = defaultdict(Counter)
+        for attempt in changed:
+            if attempt.flagged_suspicious != flagged_before[attempt.pk]:
+                deltas[(attempt.phone_id, activity_day(attempt.timestamp))]['suspicious_attempts'] += (
+                    1 if attempt.flagged_suspicious else -1
+                )
+        with transaction.atomic():
+            UnlockAttempt.objects.bulk_update(changed, ['recent_failures', 'flagged_suspicious'])
+            apply_deltas(deltas)
+        updated += len(changed)
+
+    if updated:
+        summary_cache.invalidate(*Phone.objects.filter(pk__in=phone_ids).values_list('user_id', flat=True))
+    return updated
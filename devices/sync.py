@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Phone, PhoneTombstone
+
+SYNC_TOKEN_SALT = 'devices.sync-token'
+
+
+class SyncTokenError(Exception):
+    """Jeton de synchronisation illisible ou émis pour un autre utilisateur"""
+
+
+def sync_overlap():
+    """
+    Recouvrement entre deux synchronisations : une transaction commitée juste
+    après la lecture reste visible à la suivante (les changements peuvent donc
+    être renvoyés deux fois et doivent être appliqués de façon idempotente).
+    """
+    return timezone.timedelta(seconds=getattr(settings, 'DEVICES_SYNC_OVERLAP', 5))
+
+
+def issue_sync_token(user, cursor):
+    return signing.dumps({'u': user.pk, 't': cursor.isoformat()}, salt=SYNC_TOKEN_SALT)
+
+
+def read_sync_token(token, user):
+    """Retourne la date de la dernière synchronisation portée par le jeton"""
+    try:
+        payload = signing.loads(token, salt=SYNC_TOKEN_SALT)
+        cursor = parse_datetime(payload['t'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise SyncTokenError('Jeton de synchronisation invalide')
+    if cursor is None or payload.get('u') != user.pk:
+        raise SyncTokenError('Jeton de synchronisation invalide')
+    return cursor
+
+
+def phone_changes(user, token=None):
+    """
+    Téléphones d'un utilisateur modifiés (updated_at) ou supprimés (tombstones)
+    depuis le jeton donné, et le jeton de la prochaine synchronisation.
+
+    Sans jeton, ou si le jeton est plus ancien que la rétention des
+    tombstones, la liste complète est renvoyée avec `full=True` : le client
+    remplace alors sa copie locale au lieu de la compléter.
+    """
+    now = timezone.now()
+    cursor = read_sync_token(token, user) if token else None
+    retention = timezone.timedelta(seconds=getattr(settings, 'DEVICES_SYNC_TOMBSTONE_TTL', 30 * 24 * 3600))
+    full = cursor is None or cursor < now - retention
+
+    phones = Phone.objects.filter(user=user)
+    deleted = PhoneTombstone.objects.none()
+    if not full:
+        phones = phones.filter(updated_at__gte=cursor)
+        deleted = PhoneTombstone.objects.filter(user=user, deleted_at__gte=cursor).order_by('deleted_at')
+
+    return {
+        'full': full,
+        'phones': phones,
+        'deleted': deleted,
+        'sync_token': issue_sync_token(user, now - sync_overlap()),
+    }
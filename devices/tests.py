@@ -1,3 +1,1035 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from PIL import ExifTags, Image
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from authentication.authentication import ObjectCache, user_cache
+
+from .authentication import issue_device_token, phone_cache
+from .heartbeat import LastSeenBuffer, heartbeat_buffer
+from .models import IntrusionPhoto, Phone, PhoneDailyActivity, PhoneTombstone, PhotoUploadSession, UnlockAttempt
+from .exif import extract_exif
+from .renditions import generate_renditions
+from .presence import presence_registry
+from .rollups import COUNTER_FIELDS
+from .summary import summary_cache
+from .uploads import UploadError, append_chunk
+
+
+class PhoneListQueriesTest(TestCase):
+    """Vérifie que la liste des téléphones ne déclenche pas de requêtes N+1"""
+
+    def setUp(self):
+        summary_cache.cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_phones(self, count):
+        for i in range(count):
+            phone = Phone.objects.create(user=self.user, device_id=f'device-{i}', name=f'Phone {i}')
+            for result in ('failed', 'success'):
+                UnlockAttempt.objects.create(phone=phone, result=result)
+
+    def test_phone_list_query_count_is_constant(self):
+        self.create_phones(10)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('devices:phone_list_create'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 10)
+        for phone in response.data:
+            self.assertEqual(phone['unlock_attempts_count'], 2)
+            self.assertEqual(phone['recent_attempts_count'], 2)
+            self.assertEqual(phone['user'], 'owner')
+
+    def test_summary_query_count_is_constant(self):
+        self.create_phones(2)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('devices:user_devices_summary'))
+
+        Phone.objects.create(user=self.user, device_id='device-extra', name='Extra')
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('devices:user_devices_summary'))
+        self.assertEqual(response.data['total_devices'], 3)
+        self.assertEqual(response.data['total_unlock_attempts'], 4)
+
+
+@override_settings(DEVICES_HEARTBEAT_MODE='buffered')
+class HeartbeatQueriesTest(TestCase):
+    """Vérifie qu'un heartbeat authentifié par JWT n'interroge pas la base une fois les caches chauds"""
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        Phone.objects.create(user=self.user, device_id='device-1', name='Phone')
+        token = RefreshToken.for_user(self.user).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def tearDown(self):
+        heartbeat_buffer.flush()
+
+    def test_buffered_heartbeat_runs_without_queries(self):
+        url = reverse('devices:phone_heartbeat')
+        response = self.client.post(url, {'device_id': 'device-1'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'device_id': 'device-1'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        url = reverse('devices:phone_heartbeat')
+        self.client.post(url, {'device_id': 'device-1'}, format='json')
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post(url, {'device_id': 'device-1'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(DEVICES_HEARTBEAT_FLUSH_INTERVAL=3600)
+class LastSeenBufferTest(TestCase):
+    """Vérifie qu'une écriture échouée ne perd pas les heartbeats en attente"""
+
+    def test_failed_flush_keeps_pending_heartbeats(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        first, second = [
+            Phone.objects.create(user=user, device_id=f'device-{i}', name=f'Phone {i}') for i in range(2)
+        ]
+        buffer = LastSeenBuffer()
+        earlier = timezone.now() - timezone.timedelta(minutes=5)
+        later = earlier + timezone.timedelta(minutes=1)
+        buffer.record(first.pk, earlier)
+        buffer.record(second.pk, earlier)
+
+        def locked_database(*args, **kwargs):
+            # Heartbeat plus récent reçu pendant l'écriture
+            buffer.record(first.pk, later)
+            raise OperationalError('database is locked')
+
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=locked_database):
+            with self.assertRaises(OperationalError):
+                buffer.flush()
+        self.assertEqual((buffer.get(first.pk), buffer.get(second.pk)), (later, earlier))
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(buffer.pending_count(), 0)
+        self.assertEqual(
+            dict(Phone.objects.values_list('pk', 'last_seen')), {first.pk: later, second.pk: earlier}
+        )
+
+
+class PresenceRegistryTest(TestCase):
+    """Vérifie que la présence de chaque téléphone est indépendante de celle des autres"""
+
+    def setUp(self):
+        presence_registry.cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.phones = [
+            Phone.objects.create(user=self.user, device_id=f'device-{i}', name=f'Phone {i}') for i in range(2)
+        ]
+
+    def test_phones_of_one_user_do_not_overwrite_each_other(self):
+        first, second = self.phones
+        presence_registry.touch(self.user.pk, first.pk)
+        presence_registry.touch(self.user.pk, second.pk, ttl=60)
+        presence_registry.remove(self.user.pk, second.pk)
+        self.assertEqual(presence_registry.online_phone_ids(self.user.pk, [first.pk, second.pk]), {first.pk})
+
+    def test_closing_one_socket_keeps_other_presence(self):
+        phone = self.phones[0]
+        presence_registry.socket_opened(self.user.pk, phone.pk)
+        presence_registry.socket_opened(self.user.pk, phone.pk)
+        presence_registry.socket_closed(self.user.pk, phone.pk)
+        self.assertTrue(presence_registry.is_online(self.user.pk, phone.pk))
+        presence_registry.socket_closed(self.user.pk, phone.pk)
+        self.assertFalse(presence_registry.is_online(self.user.pk, phone.pk))
+
+        # Un heartbeat HTTP récent survit à la fermeture du dernier socket
+        presence_registry.touch(self.user.pk, phone.pk)
+        presence_registry.socket_opened(self.user.pk, phone.pk)
+        presence_registry.socket_closed(self.user.pk, phone.pk)
+        presence_registry.socket_closed(self.user.pk, phone.pk)
+        self.assertTrue(presence_registry.is_online(self.user.pk, phone.pk))
+
+    def test_phone_list_annotates_presence(self):
+        presence_registry.touch(self.user.pk, self.phones[1].pk)
+        phones = list(Phone.objects.filter(user=self.user).with_presence().order_by('device_id'))
+        self.assertEqual([phone.is_online for phone in phones], [False, True])
+
+
+class DeviceTokenTest(TestCase):
+    """Vérifie que le jeton d'appareil évite la recherche du téléphone"""
+
+    def setUp(self):
+        user_cache.clear()
+        phone_cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.phone = Phone.objects.create(user=self.user, device_id='device-1', name='Phone')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Device {issue_device_token(self.phone)}')
+
+    def test_unlock_attempt_uses_authenticated_phone(self):
+        url = reverse('devices:unlock_attempt_list_create')
+        self.client.post(url, {'attempt_type': 'pin', 'result': 'failed'}, format='json')
+
+        # Caches chauds : score de suspicion, insertion et agrégat quotidien, sans recherche d'appareil
+        with self.assertNumQueries(3):
+            response = self.client.post(url, {'attempt_type': 'pin', 'result': 'failed'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.phone.unlock_attempts.count(), 2)
+
+    def test_token_is_scoped_to_its_device(self):
+        Phone.objects.create(user=self.user, device_id='device-2', name='Other')
+        response = self.client.post(
+            reverse('devices:unlock_attempt_list_create'),
+            {'phone_device_id': 'device-2', 'attempt_type': 'pin', 'result': 'failed'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_deleted_phone_revokes_token(self):
+        self.phone.delete()
+        response = self.client.post(reverse('devices:phone_heartbeat'), {}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_is_not_an_account_credential(self):
+        other = Phone.objects.create(user=self.user, device_id='device-2', name='Other')
+        self.assertEqual(self.client.delete(reverse('devices:phone_detail', args=[other.pk])).status_code, 401)
+        self.assertEqual(self.client.get(reverse('devices:user_devices_summary')).status_code, 401)
+        # Les vues des téléphones acceptent le jeton en écriture seulement
+        self.assertEqual(self.client.get(reverse('devices:unlock_attempt_list_create')).status_code, 403)
+        self.assertTrue(Phone.objects.filter(pk=other.pk).exists())
+
+    def test_revoked_token_is_rejected(self):
+        self.assertEqual(self.client.post(reverse('devices:phone_heartbeat'), {}, format='json').status_code, 200)
+        # Un autre worker lit le même cache partagé
+        other_worker = ObjectCache(phone_cache.key_prefix, phone_cache.ttl_setting)
+        self.assertEqual(other_worker.get(self.phone.pk).token_version, 0)
+        owner = APIClient()
+        owner.force_authenticate(self.user)
+        response = owner.post(reverse('devices:phone_revoke_token', args=[self.phone.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(other_worker.get(self.phone.pk))
+
+        self.assertEqual(self.client.post(reverse('devices:phone_heartbeat'), {}, format='json').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Device {response.data['device_token']}")
+        self.assertEqual(self.client.post(reverse('devices:phone_heartbeat'), {}, format='json').status_code, 200)
+
+    def test_tampered_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Device invalid:token')
+        response = self.client.post(reverse('devices:phone_heartbeat'), {}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class ChunkedPhotoUploadTest(TestCase):
+    """Vérifie l'envoi reprenable d'une photo par morceaux"""
+
+    def setUp(self):
+        self.media_root, private_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, private_root, ignore_errors=True)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            DEVICES_UPLOAD_TEMP_DIR=os.path.join(private_root, 'uploads'),
+            DEVICES_STORAGE_LOCK_DIR=os.path.join(private_root, 'locks'),
+            DEVICES_PUSH_EVENTS=False, DEVICES_PHOTO_EXIF=False
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        phone = Phone.objects.create(user=self.user, device_id='device-1', name='Phone')
+        self.attempt = UnlockAttempt.objects.create(phone=phone, result='failed')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), 'red').save(buffer, format='JPEG')
+        self.image = buffer.getvalue()
+
+    def start_upload(self):
+        response = self.client.post(reverse('devices:photo_upload_init'), {
+            'unlock_attempt_id': self.attempt.pk,
+            'camera_type': 'front',
+            'total_size': len(self.image)
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['upload_id']
+
+    def put_chunk(self, upload_id, offset, data):
+        return self.client.generic(
+            'PUT', reverse('devices:photo_upload_detail', args=[upload_id]),
+            data, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_upload_in_chunks_and_finalize(self):
+        upload_id = self.start_upload()
+        half = len(self.image) // 2
+
+        self.assertEqual(self.put_chunk(upload_id, 0, self.image[:half]).data['received_size'], half)
+        # Un morceau rejoué à la mauvaise position est refusé avec la position attendue
+        response = self.put_chunk(upload_id, 0, self.image[:half])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['received_size'], half)
+
+        self.put_chunk(upload_id, half, self.image[half:])
+        finalize_url = reverse('devices:photo_upload_finalize', args=[upload_id])
+        response = self.client.post(finalize_url)
+        self.assertEqual(response.status_code, 201)
+
+        photo = IntrusionPhoto.objects.get()
+        self.assertEqual(photo.file_size, len(self.image))
+        with photo.photo.open('rb') as stored:
+            self.assertEqual(stored.read(), self.image)
+
+        # Finalisation idempotente
+        self.assertEqual(self.client.post(finalize_url).data['id'], photo.pk)
+        self.assertEqual(IntrusionPhoto.objects.count(), 1)
+
+    def test_finalized_photo_gets_renditions(self):
+        upload_id = self.start_upload()
+        self.put_chunk(upload_id, 0, self.image)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.client.post(reverse('devices:photo_upload_finalize', args=[upload_id]))
+        self.assertTrue(callbacks)
+
+        photo = IntrusionPhoto.objects.get()
+        self.assertTrue(generate_renditions(photo.pk))
+        response = self.client.get(reverse('devices:intrusion_photo_list_create'))
+        self.assertTrue(response.data['results'][0]['thumbnail_url'].endswith(f'thumbnails/thumbnail/{photo.pk}.jpg'))
+        with Image.open(os.path.join(self.media_root, 'thumbnails', 'medium', f'{photo.pk}.jpg')) as medium:
+            self.assertEqual(medium.size, (64, 64))
+
+    def test_renditions_are_deleted_only_after_commit(self):
+        upload_id = self.start_upload()
+        self.put_chunk(upload_id, 0, self.image)
+        with self.captureOnCommitCallbacks(execute=False):
+            self.client.post(reverse('devices:photo_upload_finalize', args=[upload_id]))
+        photo = IntrusionPhoto.objects.get()
+        generate_renditions(photo.pk)
+        thumbnail = os.path.join(self.media_root, 'thumbnails', 'thumbnail', f'{photo.pk}.jpg')
+
+        # Suppression annulée : les déclinaisons restent en place
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                photo.delete()
+                transaction.set_rollback(True)
+        self.assertTrue(os.path.exists(thumbnail))
+
+        photo = IntrusionPhoto.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.delete()
+        self.assertFalse(os.path.exists(thumbnail))
+
+    def test_chunk_is_streamed_outside_any_transaction(self):
+        upload_id = self.start_upload()
+        depth = len(connection.atomic_blocks)
+        seen = []
+
+        class Stream(io.BytesIO):
+            def read(inner, size=-1):
+                seen.append(len(connection.atomic_blocks))
+                return super().read(size)
+
+        session = append_chunk(upload_id, Stream(self.image), 0)
+        self.assertEqual(session.received_size, len(self.image))
+        self.assertEqual(set(seen), {depth})
+        # Aucun fichier de morceau ne reste sur le disque
+        self.assertEqual(os.listdir(os.path.dirname(session.temp_path)), [os.path.basename(session.temp_path)])
+
+    def test_interrupted_chunk_keeps_received_bytes(self):
+        upload_id = self.start_upload()
+
+        class BrokenStream(io.BytesIO):
+            def read(inner, size=-1):
+                if inner.tell():
+                    raise OSError('connexion coupée')
+                return super().read(100)
+
+        with self.assertRaises(UploadError):
+            append_chunk(upload_id, BrokenStream(self.image), 0)
+        received = PhotoUploadSession.objects.get(pk=upload_id).received_size
+        self.assertEqual(received, 100)
+        self.put_chunk(upload_id, received, self.image[received:])
+        response = self.client.post(reverse('devices:photo_upload_finalize', args=[upload_id]))
+        self.assertEqual(response.status_code, 201)
+
+    def test_incomplete_upload_cannot_be_finalized(self):
+        upload_id = self.start_upload()
+        self.put_chunk(upload_id, 0, self.image[:10])
+        response = self.client.post(reverse('devices:photo_upload_finalize', args=[upload_id]))
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(IntrusionPhoto.objects.exists())
+
+
+@override_settings(DEVICES_PUSH_EVENTS=False, DEVICES_PHOTO_RENDITIONS=False)
+class ContentAddressedStorageTest(TestCase):
+    """Vérifie que les photos identiques ne sont stockées qu'une fois"""
+
+    def setUp(self):
+        self.media_root, private_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, private_root, ignore_errors=True)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root, DEVICES_STORAGE_LOCK_DIR=os.path.join(private_root, 'locks'),
+            DEVICES_PHOTO_EXIF=False
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        phone = Phone.objects.create(user=user, device_id='device-1', name='Phone')
+        self.attempt = UnlockAttempt.objects.create(phone=phone, result='failed')
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (32, 32), 'blue').save(buffer, format='JPEG')
+        self.image = buffer.getvalue()
+
+    def create_photo(self):
+        return IntrusionPhoto.objects.create(
+            unlock_attempt=self.attempt, photo=ContentFile(self.image, name='capture.jpg')
+        )
+
+    def test_identical_photos_share_one_file(self):
+        first, second = self.create_photo(), self.create_photo()
+        self.assertEqual(first.photo.name, second.photo.name)
+        self.assertIn(hashlib.sha256(self.image).hexdigest(), first.photo.name)
+
+        path = first.photo.path
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_reused_file_deleted_concurrently_is_rewritten_after_commit(self):
+        first = self.create_photo()
+        path = first.photo.path
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.create_photo()
+            # Suppression concurrente qui n'a pas encore vu la seconde ligne
+            os.remove(path)
+        self.assertEqual(second.photo.name, first.photo.name)
+        with open(path, 'rb') as stored:
+            self.assertEqual(stored.read(), self.image)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+
+    def test_concurrent_identical_uploads_write_one_file(self):
+        storage = IntrusionPhoto._meta.get_field('photo').storage
+        barrier = threading.Barrier(4)
+        names = []
+
+        def upload():
+            barrier.wait()
+            names.append(storage.save('intrusion_photos/capture.jpg', ContentFile(self.image)))
+
+        threads = [threading.Thread(target=upload) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(names)), 1)
+        self.assertEqual(os.listdir(os.path.dirname(storage.path(names[0]))), [os.path.basename(names[0])])
+        # Aucun verrou ni fichier privé sous MEDIA_ROOT
+        self.assertEqual(os.listdir(self.media_root), ['intrusion_photos'])
+
+    def test_dedupe_command_reclaims_duplicates(self):
+        legacy = FileSystemStorage()
+        names = [legacy.save('intrusion_photos/2024/01/01/capture.jpg', ContentFile(self.image)) for _ in range(3)]
+        for name in names:
+            IntrusionPhoto.objects.create(unlock_attempt=self.attempt, photo=name, file_size=len(self.image))
+
+        output = io.StringIO()
+        call_command('dedupe_intrusion_photos', stdout=output)
+        self.assertIn(f"2 doublon(s) supprimé(s), 0 fichier(s) introuvable(s), {2 * len(self.image)} octet(s)", output.getvalue())
+
+        self.assertEqual(IntrusionPhoto.objects.values('photo').distinct().count(), 1)
+        for name in names:
+            self.assertFalse(legacy.exists(name))
+        self.assertTrue(IntrusionPhoto.objects.first().photo.storage.exists(IntrusionPhoto.objects.first().photo.name))
+
+
+class ExifExtractionTest(TestCase):
+    """Vérifie l'extraction EXIF côté serveur et les filtres associés"""
+
+    def setUp(self):
+        self.media_root, private_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, private_root, ignore_errors=True)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root, DEVICES_STORAGE_LOCK_DIR=os.path.join(private_root, 'locks'),
+            DEVICES_PUSH_EVENTS=False
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        phone = Phone.objects.create(user=self.user, device_id='device-1', name='Phone')
+        self.attempt = UnlockAttempt.objects.create(phone=phone, result='failed')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_image(self):
+        exif = Image.Exif()
+        exif[ExifTags.Base.Make] = 'Acme'
+        exif[ExifTags.Base.Orientation] = 6
+        exif.get_ifd(ExifTags.IFD.Exif)[ExifTags.Base.DateTimeOriginal] = '2024:05:01 10:30:00'
+        exif.get_ifd(ExifTags.IFD.Exif)[ExifTags.Base.OffsetTimeOriginal] = '+01:00'
+        gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+        gps[ExifTags.GPS.GPSLatitudeRef] = 'N'
+        gps[ExifTags.GPS.GPSLatitude] = (4.0, 3.0, 0.0)
+        gps[ExifTags.GPS.GPSLongitudeRef] = 'E'
+        gps[ExifTags.GPS.GPSLongitude] = (9.0, 42.0, 0.0)
+        buffer = io.BytesIO()
+        Image.new('RGB', (16, 16), 'green').save(buffer, format='JPEG', exif=exif)
+        return buffer.getvalue()
+
+    def test_exif_fields_are_extracted_and_filterable(self):
+        photo = IntrusionPhoto.objects.create(
+            unlock_attempt=self.attempt,
+            photo=ContentFile(self.make_image(), name='capture.jpg'),
+            exif_data={'client': 'non fiable'}
+        )
+        self.assertTrue(extract_exif(photo.pk))
+        photo.refresh_from_db()
+
+        self.assertEqual(photo.captured_at.isoformat(), '2024-05-01T09:30:00+00:00')
+        self.assertEqual(photo.gps_latitude, Decimal('4.05000000'))
+        self.assertEqual(photo.gps_longitude, Decimal('9.70000000'))
+        self.assertEqual(photo.orientation, 6)
+        self.assertEqual(photo.exif_data, {'make': 'Acme'})
+
+        url = reverse('devices:intrusion_photo_list_create')
+        inside = {'min_lat': 4, 'max_lat': 4.1, 'min_lng': 9.6, 'max_lng': 9.8}
+        self.assertEqual(len(self.client.get(url, inside).data['results']), 1)
+        self.assertEqual(len(self.client.get(url, {**inside, 'min_lat': 4.06}).data['results']), 0)
+        self.assertEqual(len(self.client.get(url, {'captured_after': '2024-06-01T00:00:00Z'}).data['results']), 0)
+        self.assertEqual(self.client.get(url, {'min_lat': 4}).status_code, 400)
+        self.assertEqual(self.client.get(url, {**inside, 'max_lng': 180.5}).status_code, 400)
+        # Zone inversée
+        self.assertEqual(self.client.get(url, {**inside, 'min_lat': 4.2}).status_code, 400)
+        self.assertEqual(self.client.get(url, {**inside, 'min_lng': 9.9}).status_code, 400)
+
+
+class KeysetPaginationTest(TestCase):
+    """Vérifie la pagination par curseur des tentatives de déverrouillage"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.phone = Phone.objects.create(user=self.user, device_id='device-1', name='Phone')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Horodatages identiques deux à deux : l'id départage les lignes
+        base = timezone.now()
+        attempts = [
+            UnlockAttempt(phone=self.phone, result='failed', recent_failures=0, flagged_suspicious=False)
+            for _ in range(7)
+        ]
+        UnlockAttempt.objects.bulk_create(attempts)
+        for index, attempt in enumerate(attempts):
+            UnlockAttempt.objects.filter(pk=attempt.pk).update(timestamp=base - timezone.timedelta(minutes=index // 2))
+        self.expected = list(
+            UnlockAttempt.objects.order_by('-timestamp', '-id').values_list('id', flat=True)
+        )
+
+    def test_pages_walk_forward_and_back_without_count(self):
+        url = reverse('devices:unlock_attempt_list_create')
+        seen = []
+        pages = []
+        while url:
+            # Une seule requête par page, sans COUNT(*) de la liste
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'page_size': 3} if not seen else None)
+            self.assertEqual(len(queries), 1)
+            self.assertNotIn('COUNT(*)', queries[0]['sql'].upper())
+            pages.append(response.data)
+            seen += [attempt['id'] for attempt in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, self.expected)
+        self.assertIsNone(pages[0]['previous'])
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual([a['id'] for a in response.data['results']], self.expected[3:6])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([a['id'] for a in response.data['results']], self.expected[:3])
+        self.assertIsNone(response.data['previous'])
+
+    def test_page_size_is_capped(self):
+        with self.settings(DEVICES_MAX_PAGE_SIZE=2):
+            response = self.client.get(reverse('devices:unlock_attempt_list_create'), {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('devices:unlock_attempt_list_create'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class HotQueryPlansTest(TestCase):
+    """Vérifie qu'aucune requête fréquente ne parcourt une table entière"""
+
+    def test_explain_hot_queries(self):
+        output = io.StringIO()
+        call_command('explain_hot_queries', stdout=output)
+        self.assertIn('Toutes les requêtes fréquentes utilisent un index', output.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='explain-').exists())
+
+
+@override_settings(DEVICES_PUSH_EVENTS=False)
+class SuspicionScoringTest(TestCase):
+    """Vérifie le score de suspicion calculé à l'insertion et le filtre suspicious_only"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.phone = Phone.objects.create(user=self.user, device_id='device-1', name='Phone', unlock_attempts_threshold=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('devices:unlock_attempt_list_create')
+
+    def test_attempts_are_scored_on_insert(self):
+        first = UnlockAttempt.objects.create(phone=self.phone, result='failed')
+        success = UnlockAttempt.objects.create(phone=self.phone, result='success')
+        response = self.client.post(self.url, {
+            'phone_device_id': 'device-1', 'result': 'failed', 'attempt_type': 'pin'
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.data['is_suspicious'])
+        self.assertEqual((first.recent_failures, first.flagged_suspicious), (1, False))
+        self.assertEqual((success.recent_failures, success.flagged_suspicious), (1, False))
+        third = UnlockAttempt.objects.get(pk=response.data['id'])
+        self.assertEqual((third.recent_failures, third.flagged_suspicious), (2, True))
+
+        # Les échecs hors de la fenêtre glissante ne comptent plus
+        UnlockAttempt.objects.update(timestamp=timezone.now() - timezone.timedelta(minutes=11))
+        self.assertFalse(UnlockAttempt.objects.create(phone=self.phone, result='failed').is_suspicious)
+
+    def test_suspicious_only_lists_flagged_attempts_without_extra_queries(self):
+        for result in ('failed', 'success', 'failed', 'failed'):
+            UnlockAttempt.objects.create(phone=self.phone, result=result)
+        flagged = list(
+            UnlockAttempt.objects.filter(flagged_suspicious=True).order_by('-timestamp', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(len(flagged), 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'suspicious_only': 'true'})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([attempt['id'] for attempt in response.data['results']], flagged)
+        self.assertTrue(all(attempt['is_suspicious'] for attempt in response.data['results']))
+
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 4)
+
+    def flags(self):
+        return list(UnlockAttempt.objects.order_by('id').values_list('recent_failures', 'flagged_suspicious'))
+
+    def test_threshold_change_rescores_stored_attempts(self):
+        for _ in range(3):
+            UnlockAttempt.objects.create(phone=self.phone, result='failed')
+        self.assertEqual([flagged for _, flagged in self.flags()], [False, True, True])
+
+        phone = Phone.objects.get(pk=self.phone.pk)
+        phone.unlock_attempts_threshold = 3
+        phone.save()
+        self.assertEqual(self.flags(), [(1, False), (2, False), (3, True)])
+        self.assertEqual(PhoneDailyActivity.objects.get(phone=self.phone).suspicious_attempts, 1)
+
+    def test_rescore_command_scores_rows_inserted_without_score(self):
+        UnlockAttempt.objects.bulk_create([
+            UnlockAttempt(phone=self.phone, result=result, recent_failures=0)
+            for result in ('failed', 'success', 'failed', 'failed')
+        ])
+        # Hors de la fenêtre de 10 minutes des suivantes
+        UnlockAttempt.objects.filter(pk=UnlockAttempt.objects.order_by('id').first().pk).update(
+            timestamp=timezone.now() - timezone.timedelta(minutes=11)
+        )
+
+        output = io.StringIO()
+        call_command('rescore_unlock_attempts', stdout=output)
+        self.assertIn('1 téléphone(s) analysé(s), 3 tentative(s) recalculée(s)', output.getvalue())
+        self.assertEqual(self.flags(), [(1, False), (0, False), (1, False), (2, True)])
+
+        call_command('rescore_unlock_attempts', stdout=output)
+        self.assertIn('0 tentative(s) recalculée(s)', output.getvalue())
+
+
+class BulkAttemptCreateTest(TestCase):
+    """Vérifie l'ingestion par lot des tentatives : résultats par élément, plafond et score"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.phone = Phone.objects.create(user=self.user, device_id='device-1', name='Phone', unlock_attempts_threshold=3)
+        self.other_phone = Phone.objects.create(user=self.user, device_id='device-2', name='Tablet')
+        stranger = User.objects.create_user('stranger', 'stranger@example.com', 'password')
+        Phone.objects.create(user=stranger, device_id='device-3', name='Other')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('devices:unlock_attempt_bulk_create')
+
+    def test_mixed_devices_return_per_item_results(self):
+        response = self.client.post(self.url, {'attempts': [
+            {'phone_device_id': 'device-1', 'result': 'failed', 'attempt_type': 'pin'},
+            'not-an-object',
+            {'phone_device_id': 'device-2', 'result': 'success', 'attempt_type': 'face'},
+            {'phone_device_id': 'device-3', 'result': 'failed', 'attempt_type': 'pin'},
+            {'phone_device_id': 'unknown', 'result': 'failed', 'attempt_type': 'pin'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 3))
+        results = response.data['results']
+        self.assertEqual([result['index'] for result in results], [0, 1, 2, 3, 4])
+        self.assertEqual(
+            [result['status'] for result in results], ['created', 'error', 'created', 'error', 'error']
+        )
+        self.assertIn('non_field_errors', results[1]['errors'])
+        self.assertIn('phone_device_id', results[3]['errors'])
+        self.assertIn('phone_device_id', results[4]['errors'])
+        self.assertEqual(
+            set(UnlockAttempt.objects.values_list('phone__device_id', flat=True)), {'device-1', 'device-2'}
+        )
+
+    def test_only_invalid_items_is_bad_request(self):
+        response = self.client.post(self.url, [{'phone_device_id': 'unknown', 'result': 'failed'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+        self.assertFalse(UnlockAttempt.objects.exists())
+
+    def test_returned_ids_match_stored_rows(self):
+        items = [
+            {'phone_device_id': device_id, 'result': result, 'attempt_type': 'pin'}
+            for device_id, result in (('device-1', 'failed'), ('device-2', 'success'), ('device-1', 'blocked'))
+        ]
+        for returns_rows in (True, False):
+            with self.subTest(can_return_rows_from_bulk_insert=returns_rows):
+                UnlockAttempt.objects.all().delete()
+                # Sans clés renvoyées par bulk_create (MySQL), les lignes sont insérées une à une
+                with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', returns_rows):
+                    response = self.client.post(self.url, items, format='json')
+                self.assertEqual(response.status_code, 201)
+                returned = [
+                    (result['attempt']['id'], result['attempt']['result']) for result in response.data['results']
+                ]
+                self.assertTrue(all(pk is not None for pk, _ in returned))
+                self.assertEqual(returned, list(UnlockAttempt.objects.order_by('id').values_list('id', 'result')))
+                self.assertEqual(PhoneDailyActivity.objects.get(phone=self.phone).total_attempts, 2)
+
+    @override_settings(DEVICES_BULK_MAX_ATTEMPTS=2)
+    def test_batch_size_is_capped(self):
+        attempt = {'phone_device_id': 'device-1', 'result': 'failed', 'attempt_type': 'pin'}
+        response = self.client.post(self.url, [attempt] * 3, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('2', response.data['error'])
+        self.assertFalse(UnlockAttempt.objects.exists())
+
+        self.assertEqual(self.client.post(self.url, [attempt] * 2, format='json').status_code, 201)
+
+    def test_batch_scoring_flags_items_past_the_threshold(self):
+        UnlockAttempt.objects.create(phone=self.phone, result='failed')
+        response = self.client.post(self.url, [
+            {'phone_device_id': 'device-1', 'result': 'failed', 'attempt_type': 'pin'},
+            {'phone_device_id': 'device-2', 'result': 'failed', 'attempt_type': 'pin'},
+            {'phone_device_id': 'device-1', 'result': 'success', 'attempt_type': 'pin'},
+            {'phone_device_id': 'device-1', 'result': 'failed', 'attempt_type': 'pin'},
+            {'phone_device_id': 'device-1', 'result': 'failed', 'attempt_type': 'pin'},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [result['attempt']['is_suspicious'] for result in response.data['results']],
+            [False, False, False, True, True]
+        )
+        stored = UnlockAttempt.objects.filter(phone=self.phone).order_by('id')
+        self.assertEqual([attempt.recent_failures for attempt in stored], [1, 2, 2, 3, 4])
+        self.assertEqual(UnlockAttempt.objects.filter(flagged_suspicious=True).count(), 2)
+
+
+class DailyActivityRollupTest(TestCase):
+    """Vérifie que l'agrégat quotidien suit les insertions et correspond aux données brutes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.phone = Phone.objects.create(user=self.user, device_id='device-1', name='Phone')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def snapshot(self):
+        return list(PhoneDailyActivity.objects.order_by('day').values(*COUNTER_FIELDS, 'day'))
+
+    def test_rollup_matches_rebuild(self):
+        UnlockAttempt.objects.create(phone=self.phone, result='failed', attempt_type='pattern')
+        attempt = UnlockAttempt.objects.create(phone=self.phone, result='success')
+        IntrusionPhoto.objects.create(unlock_attempt=attempt, photo='intrusion_photos/x.jpg', file_size=1234)
+        response = self.client.post(reverse('devices:unlock_attempt_bulk_create'), [
+            {'phone_device_id': 'device-1', 'result': 'failed', 'attempt_type': 'pin'},
+            {'phone_device_id': 'device-1', 'result': 'blocked', 'attempt_type': 'face'},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        UnlockAttempt.objects.filter(result='blocked').delete()
+
+        incremental = self.snapshot()
+        self.assertEqual(len(incremental), 1)
+        self.assertEqual(incremental[0]['total_attempts'], 3)
+        self.assertEqual(incremental[0]['result_failed'], 2)
+        self.assertEqual(incremental[0]['type_face'], 0)
+        self.assertEqual(incremental[0]['photos_bytes'], 1234)
+
+        call_command('rebuild_daily_activity', stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_updates_move_counters(self):
+        attempt = UnlockAttempt.objects.create(phone=self.phone, result='failed', attempt_type='pin')
+        photo = IntrusionPhoto.objects.create(unlock_attempt=attempt, photo='intrusion_photos/x.jpg', file_size=100)
+
+        attempt = UnlockAttempt.objects.get(pk=attempt.pk)
+        attempt.result = 'success'
+        attempt.attempt_type = 'face'
+        attempt.save()
+        photo = IntrusionPhoto.objects.get(pk=photo.pk)
+        photo.file_size = 40
+        photo.save()
+        # Modification sans effet sur l'agrégat : aucune écriture
+        with self.assertNumQueries(1):
+            photo.camera_type = 'back'
+            photo.save()
+
+        rollup = self.snapshot()[0]
+        self.assertEqual((rollup['result_failed'], rollup['result_success']), (0, 1))
+        self.assertEqual((rollup['type_pin'], rollup['type_face']), (0, 1))
+        self.assertEqual(rollup['photos_bytes'], 40)
+        call_command('rebuild_daily_activity', stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), [rollup])
+
+    def test_drifted_rollup_is_clamped_at_zero(self):
+        attempt = UnlockAttempt.objects.create(phone=self.phone, result='failed')
+        PhoneDailyActivity.objects.update(total_attempts=0, result_failed=0)
+        attempt.delete()
+        rollup = self.snapshot()[0]
+        self.assertEqual((rollup['total_attempts'], rollup['result_failed']), (0, 0))
+
+    def test_phone_cascade_skips_row_by_row_rollup(self):
+        attempts = [UnlockAttempt.objects.create(phone=self.phone, result='failed') for _ in range(5)]
+        IntrusionPhoto.objects.create(unlock_attempt=attempts[0], photo='intrusion_photos/x.jpg', file_size=1)
+        with CaptureQueriesContext(connection) as queries:
+            self.phone.delete()
+        self.assertFalse([q for q in queries.captured_queries if 'UPDATE "devices_phonedailyactivity"' in q['sql']])
+        self.assertFalse(PhoneDailyActivity.objects.exists())
+
+    def test_stats_read_the_rollup(self):
+        for result in ('failed', 'failed', 'success'):
+            UnlockAttempt.objects.create(phone=self.phone, result=result, attempt_type='password')
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('devices:phone_stats', args=[self.phone.pk]), {'days': 30})
+        self.assertEqual(response.data['total_attempts'], 3)
+        self.assertEqual(response.data['failed_attempts'], 2)
+        self.assertEqual(response.data['most_common_attempt_type'], 'password')
+        self.assertEqual(response.data['daily_stats'][0]['total_attempts'], 3)
+        self.assertEqual(len(response.data['daily_stats']), 30)
+
+
+class SummaryCacheTest(TestCase):
+    """Vérifie le cache du résumé : aucune requête en cache chaud, invalidation sur chaque écriture"""
+
+    def setUp(self):
+        summary_cache.cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.phone = Phone.objects.create(user=self.user, device_id='device-1', name='Phone')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('devices:user_devices_summary')
+
+    def summary(self, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_warm_summary_runs_without_queries(self):
+        self.summary(2)
+        data = self.summary(0)
+        self.assertEqual(data['total_devices'], 1)
+        self.assertEqual(summary_cache.stats()['hits'], 1)
+        self.assertEqual(summary_cache.stats()['misses'], 1)
+
+    def test_writes_invalidate_the_owner_summary(self):
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        other_phone = Phone.objects.create(user=other, device_id='device-2', name='Other')
+        self.summary(2)
+
+        # Les écritures d'un autre utilisateur ne touchent pas ce résumé
+        UnlockAttempt.objects.create(phone=other_phone, result='failed')
+        self.summary(0)
+
+        attempt = UnlockAttempt.objects.create(phone=self.phone, result='failed')
+        self.assertEqual(self.summary(2)['total_unlock_attempts'], 1)
+
+        IntrusionPhoto.objects.create(unlock_attempt=attempt, photo='intrusion_photos/x.jpg', file_size=1)
+        self.assertEqual(self.summary(2)['total_photos'], 1)
+
+        response = self.client.post(reverse('devices:unlock_attempt_bulk_create'), [
+            {'phone_device_id': 'device-1', 'result': 'failed'},
+            {'phone_device_id': 'device-1', 'result': 'success'},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.summary(2)['total_unlock_attempts'], 3)
+
+        self.phone.status = 'inactive'
+        self.phone.save()
+        self.assertEqual(self.summary(2)['active_devices'], 0)
+
+        # Les modifications invalident aussi le résumé
+        attempt.result = 'success'
+        attempt.save()
+        self.summary(2)
+        photo = attempt.photos.get()
+        photo.file_size = 2
+        photo.save()
+        self.summary(2)
+
+        attempt.delete()
+        data = self.summary(2)
+        self.assertEqual(data['total_unlock_attempts'], 2)
+        self.assertEqual(data['total_photos'], 0)
+
+        self.phone.delete()
+        self.assertEqual(self.summary(2)['total_devices'], 0)
+
+    def test_phone_cascade_costs_constant_queries(self):
+        def delete_queries(phone, attempts):
+            for attempt in UnlockAttempt.objects.bulk_create([
+                UnlockAttempt(phone=phone, result='failed', recent_failures=0) for _ in range(attempts)
+            ])[:3]:
+                IntrusionPhoto.objects.create(unlock_attempt=attempt, photo='intrusion_photos/x.jpg', file_size=1)
+            with CaptureQueriesContext(connection) as queries:
+                phone.delete()
+            return len(queries.captured_queries)
+
+        large = Phone.objects.create(user=self.user, device_id='device-2', name='Large')
+        self.assertEqual(delete_queries(self.phone, 5), delete_queries(large, 50))
+        self.summary(2)
+
+    def test_presence_is_read_outside_the_cache(self):
+        self.assertEqual(self.summary(2)['online_devices'], 0)
+        presence_registry.touch(self.user.pk, self.phone.pk)
+        data = self.summary(0)
+        self.assertEqual(data['online_devices'], 1)
+        self.assertTrue(data['devices'][0]['is_online'])
+
+    def test_stats_endpoint_is_admin_only(self):
+        url = reverse('devices:summary_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.summary(2)
+        self.summary(0)
+        admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['hits'], response.data['misses']), (1, 1))
+        self.assertEqual(response.data['hit_ratio'], 0.5)
+
+        response = self.client.delete(url)
+        self.assertEqual((response.data['hits'], response.data['misses']), (0, 0))
+
+
+@override_settings(DEVICES_SYNC_OVERLAP=0)
+class PhoneSyncTest(TestCase):
+    """Vérifie la synchronisation différentielle : seuls les changements depuis le jeton sont renvoyés"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.phones = [
+            Phone.objects.create(user=self.user, device_id=f'device-{i}', name=f'Phone {i}', is_primary=i == 0)
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('devices:phone_changes')
+
+    def sync(self, token=None):
+        response = self.client.get(self.url, {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_changes_since_token(self):
+        data = self.sync()
+        self.assertTrue(data['full'])
+        self.assertEqual(len(data['changed']), 3)
+
+        data = self.sync(data['sync_token'])
+        self.assertFalse(data['full'])
+        self.assertEqual((data['changed'], data['deleted']), ([], []))
+
+        # Le changement d'appareil principal met aussi à jour l'ancien principal
+        self.phones[1].is_primary = True
+        self.phones[1].save()
+        deleted_id = self.phones[2].pk
+        self.phones[2].delete()
+        with self.assertNumQueries(2):
+            data = self.sync(data['sync_token'])
+        self.assertEqual(sorted(phone['id'] for phone in data['changed']), [self.phones[0].pk, self.phones[1].pk])
+        self.assertEqual(data['deleted'][0]['id'], deleted_id)
+        self.assertEqual(data['deleted'][0]['device_id'], 'device-2')
+
+    def test_invalid_tokens_are_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'forged'}).status_code, 400)
+
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.client.force_authenticate(other)
+        token = self.sync()['sync_token']
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(self.url, {'since': token}).status_code, 400)
+
+    @override_settings(DEVICES_SYNC_TOMBSTONE_TTL=0)
+    def test_token_older_than_tombstones_forces_full_sync(self):
+        data = self.sync(self.sync()['sync_token'])
+        self.assertTrue(data['full'])
+        self.assertEqual(len(data['changed']), 3)
+
+    def test_detection_returns_only_changes(self):
+        token = self.sync()['sync_token']
+        deleted_id = self.phones[0].pk
+        self.phones[0].delete()
+        response = self.client.post(reverse('devices:device_detection'), {'since': token}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['action'], 'need_selection')
+        self.assertEqual(response.data['devices'], [])
+        self.assertEqual([phone['id'] for phone in response.data['deleted_devices']], [deleted_id])
+        self.assertIn('sync_token', response.data)
+
+    def test_deleting_the_owner_keeps_no_tombstones(self):
+        self.phones[0].delete()
+        self.assertEqual(PhoneTombstone.objects.count(), 1)
+        self.user.delete()
+        self.assertFalse(PhoneTombstone.objects.exists())
+
+    def test_purge_removes_expired_tombstones(self):
+        self.phones[0].delete()
+        PhoneTombstone.objects.update(deleted_at=timezone.now() - timezone.timedelta(days=60))
+        kept_id = self.phones[1].pk
+        self.phones[1].delete()
+        call_command('purge_phone_tombstones', stdout=io.StringIO())
+        self.assertEqual(list(PhoneTombstone.objects.values_list('phone_id', flat=True)), [kept_id])
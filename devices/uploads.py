@@ -0,0 +1,169 @@
+import glob
+import os
+import shutil
+import uuid
+
+from django.core.files import File
+from django.db import transaction
+from PIL import Image
+
+from .models import IntrusionPhoto, PhotoUploadSession
+
+# Taille des blocs lus depuis la requête : la mémoire utilisée reste bornée
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Erreur d'un envoi par morceaux, accompagnée du code HTTP à renvoyer"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class PartialUploadFile(File):
+    """
+    Fichier temporaire déjà sur disque : FileSystemStorage le déplace au
+    lieu de le recopier (même mécanisme que TemporaryUploadedFile).
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def check_chunk(session, offset):
+    if session.status != 'pending':
+        raise UploadError("Cet envoi est déjà finalisé.", 409)
+    if offset != session.received_size:
+        raise UploadError("Position du morceau incorrecte.", 409)
+
+
+def append_chunk(session_id, stream, offset, queryset=None):
+    """
+    Ajoute un morceau au fichier temporaire d'un envoi.
+
+    `offset` doit correspondre au nombre d'octets déjà reçus : un client qui
+    reprend après une coupure interroge l'envoi puis repart de cette position.
+    Le morceau est d'abord copié par blocs depuis `stream` dans un fichier
+    propre à la requête, hors transaction : un client lent ne bloque ni
+    connexion à la base ni verrou. Le verrou n'est pris que pour revérifier
+    la position et recopier le morceau en local. Si la connexion coupe au
+    milieu d'un morceau, la partie reçue est conservée.
+    """
+    queryset = queryset if queryset is not None else PhotoUploadSession.objects.all()
+    session = queryset.get(pk=session_id)
+    check_chunk(session, offset)
+
+    path = session.temp_path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    part_path = f'{path}.{uuid.uuid4().hex}.part'
+    received = 0
+    error = None
+    try:
+        with open(part_path, 'wb') as part:
+            try:
+                while stream is not None:
+                    block = stream.read(READ_BLOCK_SIZE)
+                    if not block:
+                        break
+                    if offset + received + len(block) > session.total_size:
+                        raise UploadError("Le morceau dépasse la taille annoncée.", 413)
+                    part.write(block)
+                    received += len(block)
+            except UploadError as e:
+                error = e
+            except OSError:
+                # Connexion coupée : la partie reçue reste acquise pour la reprise
+                error = UploadError("Morceau interrompu.", 400)
+
+        with transaction.atomic():
+            # Un seul morceau accepté par position, même avec des requêtes concurrentes
+            session = queryset.select_for_update().get(pk=session_id)
+            check_chunk(session, offset)
+            with open(path, 'ab') as destination, open(part_path, 'rb') as part:
+                # Ignore les octets d'un morceau interrompu non comptabilisé
+                destination.truncate(offset)
+                shutil.copyfileobj(part, destination, READ_BLOCK_SIZE)
+            # Enregistrer la progression même si le morceau est incomplet
+            session.received_size = offset + received
+            session.save(update_fields=['received_size', 'updated_at'])
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    if error is not None:
+        raise error
+    return session
+
+
+def finalize_upload(session_id, queryset=None):
+    """
+    Termine un envoi : vérifie l'image, la déplace dans le stockage des
+    photos et crée la ligne IntrusionPhoto dans la même transaction.
+    Rejouer la finalisation renvoie la photo déjà créée.
+    """
+    queryset = queryset if queryset is not None else PhotoUploadSession.objects.all()
+    with transaction.atomic():
+        session = queryset.select_for_update().select_related(
+            'unlock_attempt__phone', 'photo'
+        ).get(pk=session_id)
+        if session.status == 'completed' and session.photo is not None:
+            return session.photo
+        if not session.is_complete:
+            raise UploadError("L'envoi est incomplet.", 409)
+
+        path = session.temp_path
+        try:
+            with Image.open(path) as image:
+                image.verify()
+                extension = (image.format or 'jpeg').lower()
+        except (OSError, SyntaxError):
+            raise UploadError("Le fichier envoyé n'est pas une image valide.", 400)
+
+        photo = IntrusionPhoto(
+            unlock_attempt=session.unlock_attempt,
+            camera_type=session.camera_type,
+            exif_data=session.exif_data,
+            file_size=session.total_size,
+        )
+        storage = photo.photo.storage
+        upload_to = photo.photo.field.generate_filename(photo, f'{session.pk}.{extension}')
+        with open(path, 'rb') as source:
+            name = storage.save(upload_to, PartialUploadFile(source))
+        try:
+            photo.photo.name = name
+            photo.save()
+            session.photo = photo
+            session.status = 'completed'
+            session.save(update_fields=['photo', 'status', 'updated_at'])
+        except Exception:
+            storage.delete(name)
+            raise
+        transaction.on_commit(lambda: release_upload(storage, name, path))
+
+    return photo
+
+
+def release_upload(storage, name, path):
+    """
+    Après le commit de la finalisation : si le contenu était déjà stocké, le
+    fichier temporaire est encore là et sert à réécrire le fichier partagé
+    qu'une suppression concurrente aurait retiré, puis il est supprimé.
+    """
+    if not os.path.exists(path):
+        return
+    if hasattr(storage, 'ensure_stored'):
+        with open(path, 'rb') as source:
+            storage.ensure_stored(name, PartialUploadFile(source))
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def discard_upload(session):
+    """Supprime le fichier temporaire d'un envoi abandonné (et les morceaux en cours)"""
+    for path in [session.temp_path, *glob.glob(f'{glob.escape(session.temp_path)}.*.part')]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -7,16 +7,23 @@ urlpatterns = [
     # Gestion des téléphones
     path('phones/', views.PhoneListCreateView.as_view(), name='phone_list_create'),
     path('phones/<int:pk>/', views.PhoneDetailView.as_view(), name='phone_detail'),
+    path('phones/<int:pk>/revoke-token/', views.phone_revoke_token_view, name='phone_revoke_token'),
     path('phones/<int:phone_id>/stats/', views.phone_stats_view, name='phone_stats'),
+    path('phones/changes/', views.phone_changes_view, name='phone_changes'),
     path('phones/heartbeat/', views.phone_heartbeat_view, name='phone_heartbeat'),
     path('phones/detect/', views.device_detection_view, name='device_detection'),
 
     # Tentatives de déverrouillage
     path('unlock-attempts/', views.UnlockAttemptListCreateView.as_view(), name='unlock_attempt_list_create'),
+    path('unlock-attempts/bulk/', views.unlock_attempt_bulk_create_view, name='unlock_attempt_bulk_create'),
 
     # Photos d'intrusion
     path('intrusion-photos/', views.IntrusionPhotoListCreateView.as_view(), name='intrusion_photo_list_create'),
+    path('intrusion-photos/uploads/', views.photo_upload_init_view, name='photo_upload_init'),
+    path('intrusion-photos/uploads/<uuid:upload_id>/', views.photo_upload_detail_view, name='photo_upload_detail'),
+    path('intrusion-photos/uploads/<uuid:upload_id>/finalize/', views.photo_upload_finalize_view, name='photo_upload_finalize'),
 
     # Résumé utilisateur
     path('summary/', views.user_devices_summary_view, name='user_devices_summary'),
+    path('summary/cache-stats/', views.summary_cache_stats_view, name='summary_cache_stats'),
 ]
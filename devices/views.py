@@ -1,16 +1,34 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from django.conf import settings
+from django.db import connections, transaction
 from django.utils import timezone
-from django.db.models import Count, Q
-from .models import Phone, UnlockAttempt, IntrusionPhoto
+from django.db.models import Count, Q, Sum
+from .models import (
+    Phone, UnlockAttempt, IntrusionPhoto, PhotoUploadSession, PhoneDailyActivity,
+    score_suspicion_batch
+)
 from .serializers import (
     PhoneSerializer, PhoneRegistrationSerializer, UnlockAttemptSerializer,
     UnlockAttemptCreateSerializer, IntrusionPhotoSerializer,
-    IntrusionPhotoUploadSerializer, PhoneStatsSerializer,
-    UserDevicesSummarySerializer
+    IntrusionPhotoUploadSerializer, PhotoUploadSessionSerializer, PhotoFilterSerializer,
+    PhoneStatsSerializer, UserDevicesSummarySerializer, PhoneTombstoneSerializer
+)
+from .stats import compute_phone_stats, DEFAULT_STATS_DAYS, MAX_STATS_DAYS
+from .heartbeat import heartbeat_buffer, heartbeat_buffering_enabled
+from .presence import presence_registry
+from .summary import summary_cache
+from .sync import SyncTokenError, phone_changes
+from .events import dispatch_attempts
+from .rollups import record_attempts
+from .authentication import (
+    DEVICE_AUTHENTICATION_CLASSES, DeviceTokenWriteOnly, get_authenticated_phone,
+    issue_device_token, revoke_device_tokens
 )
+from .pagination import KeysetPagination
+from .uploads import UploadError, append_chunk, discard_upload, finalize_upload
 import json
 
 class PhoneListCreateView(generics.ListCreateAPIView):
@@ -23,7 +41,7 @@ class PhoneListCreateView(generics.ListCreateAPIView):
         return PhoneSerializer
 
     def get_queryset(self):
-        return Phone.objects.filter(user=self.request.user)
+        return Phone.objects.filter(user=self.request.user).select_related('user').with_attempt_counts().with_presence()
 
 class PhoneDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Vue pour récupérer, modifier ou supprimer un téléphone"""
@@ -31,11 +49,25 @@ class PhoneDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Phone.objects.filter(user=self.request.user)
+        return Phone.objects.filter(user=self.request.user).select_related('user').with_attempt_counts()
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def phone_revoke_token_view(request, pk):
+    """Révoque les jetons d'appareil d'un téléphone et en émet un nouveau"""
+    try:
+        phone = Phone.objects.get(pk=pk, user=request.user)
+    except Phone.DoesNotExist:
+        return Response({
+            'error': 'Téléphone non trouvé'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return Response({'device_token': revoke_device_tokens(phone)})
 
 class UnlockAttemptListCreateView(generics.ListCreateAPIView):
     """Vue pour lister et créer des tentatives de déverrouillage"""
-    permission_classes = [IsAuthenticated]
+    authentication_classes = DEVICE_AUTHENTICATION_CLASSES
+    permission_classes = [IsAuthenticated, DeviceTokenWriteOnly]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -56,14 +88,101 @@ class UnlockAttemptListCreateView(generics.ListCreateAPIView):
 
         suspicious_only = self.request.query_params.get('suspicious_only')
         if suspicious_only == 'true':
-            # Filtrer les tentatives suspectes
-            queryset = queryset.filter(result='failed')
+            # Filtrer les tentatives suspectes (drapeau indexé calculé à l'insertion)
+            queryset = queryset.filter(flagged_suspicious=True)
 
-        return queryset.select_related('phone')
+        return queryset.select_related('phone').annotate(photos_count=Count('photos'))
+
+@api_view(['POST'])
+@authentication_classes(DEVICE_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def unlock_attempt_bulk_create_view(request):
+    """
+    Vue pour enregistrer un lot de tentatives de déverrouillage en un seul appel.
+    Accepte une liste de tentatives (ou {"attempts": [...]}) pouvant concerner
+    plusieurs appareils et renvoie un résultat par élément.
+    """
+    items = request.data.get('attempts') if isinstance(request.data, dict) else request.data
+    max_items = getattr(settings, 'DEVICES_BULK_MAX_ATTEMPTS', 500)
+
+    if not isinstance(items, list) or not items:
+        return Response({
+            'error': 'Une liste non vide de tentatives est requise'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > max_items:
+        return Response({
+            'error': f'Un lot ne peut pas dépasser {max_items} tentatives'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Résoudre tous les appareils du lot en une seule requête
+    # (inutile avec un jeton d'appareil : le téléphone est déjà connu)
+    phones = {}
+    if get_authenticated_phone(request) is None:
+        device_ids = {
+            item.get('phone_device_id') for item in items
+            if isinstance(item, dict) and isinstance(item.get('phone_device_id'), str)
+        }
+        phones = {
+            phone.device_id: phone
+            for phone in Phone.objects.filter(user=request.user, device_id__in=device_ids)
+        }
+
+    results = [None] * len(items)
+    attempts = []
+    positions = []
+    for index, item in enumerate(items):
+        serializer = UnlockAttemptCreateSerializer(
+            data=item, context={'request': request, 'phones': phones}
+        )
+        if not serializer.is_valid():
+            results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+            continue
+        attempt_data = dict(serializer.validated_data)
+        attempt_data['phone'] = attempt_data.pop('phone_device_id')
+        attempts.append(UnlockAttempt(**attempt_data))
+        positions.append(index)
+
+    if attempts:
+        with transaction.atomic():
+            score_suspicion_batch(attempts)
+            if connections[UnlockAttempt.objects.db].features.can_return_rows_from_bulk_insert:
+                UnlockAttempt.objects.bulk_create(attempts)
+                # bulk_create n'émet pas post_save : agréger et notifier le lot explicitement
+                record_attempts(attempts)
+                summary_cache.invalidate(*{attempt.phone.user_id for attempt in attempts})
+                dispatch_attempts(attempts)
+            else:
+                # MySQL : bulk_create ne renseigne pas les clés primaires, indispensables
+                # à la réponse et aux notifications. Enregistrer ligne à ligne (déjà
+                # scorées) ; post_save agrège, invalide et notifie chaque tentative.
+                for attempt in attempts:
+                    attempt.save()
+
+    for index, attempt in zip(positions, attempts):
+        results[index] = {
+            'index': index,
+            'status': 'created',
+            'attempt': UnlockAttemptCreateSerializer(attempt).data
+        }
+
+    if not attempts:
+        response_status = status.HTTP_400_BAD_REQUEST
+    elif len(attempts) < len(items):
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_201_CREATED
+
+    return Response({
+        'created': len(attempts),
+        'failed': len(items) - len(attempts),
+        'results': results
+    }, status=response_status)
 
 class IntrusionPhotoListCreateView(generics.ListCreateAPIView):
     """Vue pour lister et uploader des photos d'intrusion"""
-    permission_classes = [IsAuthenticated]
+    authentication_classes = DEVICE_AUTHENTICATION_CLASSES
+    permission_classes = [IsAuthenticated, DeviceTokenWriteOnly]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -82,8 +201,105 @@ class IntrusionPhotoListCreateView(generics.ListCreateAPIView):
         if camera_type:
             queryset = queryset.filter(camera_type=camera_type)
 
+        # Filtres sur les champs EXIF indexés (date de prise de vue, zone GPS)
+        filters = PhotoFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+        if 'captured_after' in params:
+            queryset = queryset.filter(captured_at__gte=params['captured_after'])
+        if 'captured_before' in params:
+            queryset = queryset.filter(captured_at__lt=params['captured_before'])
+        if 'min_lat' in params:
+            queryset = queryset.filter(
+                gps_latitude__range=(params['min_lat'], params['max_lat']),
+                gps_longitude__range=(params['min_lng'], params['max_lng'])
+            )
+
         return queryset.select_related('unlock_attempt', 'unlock_attempt__phone')
 
+def upload_sessions_for(request):
+    """Envois par morceaux visibles par l'appelant (limités au téléphone avec un jeton d'appareil)"""
+    sessions = PhotoUploadSession.objects.filter(unlock_attempt__phone__user=request.user)
+    phone = get_authenticated_phone(request)
+    if phone is not None:
+        sessions = sessions.filter(unlock_attempt__phone_id=phone.pk)
+    return sessions
+
+@api_view(['POST'])
+@authentication_classes(DEVICE_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def photo_upload_init_view(request):
+    """Vue pour démarrer un envoi de photo d'intrusion par morceaux"""
+    serializer = PhotoUploadSessionSerializer(data=request.data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@authentication_classes(DEVICE_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def photo_upload_detail_view(request, upload_id):
+    """
+    GET : état de l'envoi (octets reçus, pour reprendre après une coupure)
+    PUT : ajoute un morceau ; le corps brut est lu en flux et l'en-tête
+          Upload-Offset doit valoir le nombre d'octets déjà reçus
+    DELETE : abandonne l'envoi
+    """
+    sessions = upload_sessions_for(request)
+
+    if request.method == 'PUT':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return Response({
+                'error': 'En-tête Upload-Offset requis'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            session = append_chunk(upload_id, request.stream, offset, queryset=sessions)
+        except PhotoUploadSession.DoesNotExist:
+            return Response({
+                'error': 'Envoi non trouvé'
+            }, status=status.HTTP_404_NOT_FOUND)
+        except UploadError as e:
+            session = sessions.filter(pk=upload_id).first()
+            return Response({
+                'error': e.message,
+                'received_size': session.received_size if session else None
+            }, status=e.status_code)
+        return Response(PhotoUploadSessionSerializer(session).data)
+
+    session = sessions.filter(pk=upload_id).first()
+    if session is None:
+        return Response({
+            'error': 'Envoi non trouvé'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'DELETE':
+        discard_upload(session)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    return Response(PhotoUploadSessionSerializer(session).data)
+
+@api_view(['POST'])
+@authentication_classes(DEVICE_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def photo_upload_finalize_view(request, upload_id):
+    """Vue pour finaliser un envoi par morceaux en photo d'intrusion"""
+    try:
+        photo = finalize_upload(upload_id, queryset=upload_sessions_for(request))
+    except PhotoUploadSession.DoesNotExist:
+        return Response({
+            'error': 'Envoi non trouvé'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except UploadError as e:
+        return Response({
+            'error': e.message
+        }, status=e.status_code)
+
+    serializer = IntrusionPhotoSerializer(photo, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def phone_stats_view(request, phone_id):
@@ -95,47 +311,17 @@ def phone_stats_view(request, phone_id):
             'error': 'Téléphone non trouvé'
         }, status=status.HTTP_404_NOT_FOUND)
 
-    # Calculer les statistiques
-    attempts = phone.unlock_attempts.all()
-    photos = IntrusionPhoto.objects.filter(unlock_attempt__phone=phone)
-
-    # Statistiques de base
-    total_attempts = attempts.count()
-    failed_attempts = attempts.filter(result='failed').count()
-    successful_attempts = attempts.filter(result='success').count()
-
-    # Tentatives suspectes
-    suspicious_attempts = sum(1 for attempt in attempts if attempt.is_suspicious)
-
-    # Type de tentative le plus courant
-    most_common_type = attempts.values('attempt_type').annotate(
-        count=Count('attempt_type')
-    ).order_by('-count').first()
-
-    most_common_attempt_type = most_common_type['attempt_type'] if most_common_type else 'N/A'
-
-    # Statistiques quotidiennes (7 derniers jours)
-    daily_stats = []
-    for i in range(7):
-        date = timezone.now().date() - timezone.timedelta(days=i)
-        day_attempts = attempts.filter(timestamp__date=date)
-        daily_stats.append({
-            'date': date.isoformat(),
-            'total_attempts': day_attempts.count(),
-            'failed_attempts': day_attempts.filter(result='failed').count(),
-            'photos_count': photos.filter(timestamp__date=date).count()
-        })
+    # Fenêtre des statistiques quotidiennes (?days=30)
+    try:
+        days = int(request.query_params.get('days', DEFAULT_STATS_DAYS))
+    except (TypeError, ValueError):
+        days = 0
+    if not 1 <= days <= MAX_STATS_DAYS:
+        return Response({
+            'error': f'Le paramètre days doit être compris entre 1 et {MAX_STATS_DAYS}'
+        }, status=status.HTTP_400_BAD_REQUEST)
 
-    stats_data = {
-        'total_attempts': total_attempts,
-        'failed_attempts': failed_attempts,
-        'successful_attempts': successful_attempts,
-        'suspicious_attempts': suspicious_attempts,
-        'photos_count': photos.count(),
-        'last_activity': phone.last_seen,
-        'most_common_attempt_type': most_common_attempt_type,
-        'daily_stats': daily_stats
-    }
+    stats_data = compute_phone_stats(phone, days=days)
 
     serializer = PhoneStatsSerializer(stats_data)
     return Response(serializer.data)
@@ -145,49 +331,115 @@ def phone_stats_view(request, phone_id):
 def user_devices_summary_view(request):
     """Vue pour récupérer le résumé des appareils de l'utilisateur"""
     user = request.user
-    phones = Phone.objects.filter(user=user)
-
-    # Statistiques générales
-    total_devices = phones.count()
-    active_devices = phones.filter(status='active').count()
+    cached = summary_cache.get(user.pk)
+    if cached is None:
+        # Statistiques globales (lues dans l'agrégat quotidien)
+        totals = PhoneDailyActivity.objects.filter(phone__user=user).aggregate(
+            total_unlock_attempts=Sum('total_attempts'),
+            total_photos=Sum('photos_count'),
+        )
+        cached = {
+            'devices': list(Phone.objects.filter(user=user).select_related('user').with_attempt_counts()),
+            'total_unlock_attempts': totals['total_unlock_attempts'] or 0,
+            'total_photos': totals['total_photos'] or 0,
+        }
+        summary_cache.set(user.pk, cached)
+
+    # La présence et les heartbeats en attente ne sont jamais mis en cache
+    phones = presence_registry.annotate(cached['devices'])
+
+    # Statistiques générales (calculées sur la liste déjà chargée)
+    total_devices = len(phones)
+    active_devices = sum(1 for phone in phones if phone.status == 'active')
     online_devices = sum(1 for phone in phones if phone.is_online)
 
     # Appareils avec activité récente (24h)
     yesterday = timezone.now() - timezone.timedelta(days=1)
-    devices_with_recent_activity = phones.filter(last_seen__gte=yesterday).count()
-
-    # Statistiques globales
-    total_unlock_attempts = UnlockAttempt.objects.filter(phone__user=user).count()
-    total_photos = IntrusionPhoto.objects.filter(unlock_attempt__phone__user=user).count()
+    devices_with_recent_activity = sum(1 for phone in phones if phone.current_last_seen >= yesterday)
 
     summary_data = {
         'total_devices': total_devices,
         'active_devices': active_devices,
         'online_devices': online_devices,
         'devices_with_recent_activity': devices_with_recent_activity,
-        'total_unlock_attempts': total_unlock_attempts,
-        'total_photos': total_photos,
+        'total_unlock_attempts': cached['total_unlock_attempts'],
+        'total_photos': cached['total_photos'],
         'devices': phones
     }
 
     serializer = UserDevicesSummarySerializer(summary_data)
     return Response(serializer.data)
 
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def summary_cache_stats_view(request):
+    """Compteurs du cache des résumés (DELETE remet les compteurs à zéro)"""
+    if request.method == 'DELETE':
+        summary_cache.reset_stats()
+    return Response(summary_cache.stats())
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def phone_changes_view(request):
+    """
+    Synchronisation différentielle des téléphones : renvoie les appareils
+    modifiés et supprimés depuis ?since=<sync_token> (tous sans jeton) et le
+    jeton à présenter à la prochaine synchronisation.
+    """
+    try:
+        changes = phone_changes(request.user, request.query_params.get('since'))
+    except SyncTokenError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    phones = changes['phones'].select_related('user').with_attempt_counts().with_presence()
+    return Response({
+        'full': changes['full'],
+        'changed': PhoneSerializer(phones, many=True).data,
+        'deleted': PhoneTombstoneSerializer(changes['deleted'], many=True).data,
+        'sync_token': changes['sync_token']
+    })
+
 @api_view(['POST'])
+@authentication_classes(DEVICE_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 def phone_heartbeat_view(request):
     """Vue pour mettre à jour le statut 'last_seen' d'un téléphone"""
     device_id = request.data.get('device_id')
+    # Avec un jeton d'appareil, le téléphone est déjà connu : aucune recherche
+    phone = get_authenticated_phone(request)
 
-    if not device_id:
+    if phone is not None:
+        if device_id and device_id != phone.device_id:
+            return Response({
+                'error': "device_id ne correspond pas au jeton d'appareil"
+            }, status=status.HTTP_403_FORBIDDEN)
+    elif not device_id:
         return Response({
             'error': 'device_id requis'
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    if heartbeat_buffering_enabled():
+        # Le heartbeat est mis en tampon puis écrit par lot
+        phone_id = phone.pk if phone is not None else heartbeat_buffer.resolve(request.user.pk, device_id)
+        if phone_id is None:
+            return Response({
+                'error': 'Téléphone non trouvé'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        last_seen = timezone.now()
+        heartbeat_buffer.record(phone_id, last_seen)
+        presence_registry.touch(request.user.pk, phone_id)
+        return Response({
+            'message': 'Heartbeat enregistré',
+            'last_seen': last_seen
+        })
+
     try:
-        phone = Phone.objects.get(device_id=device_id, user=request.user)
+        if phone is None:
+            phone = Phone.objects.get(device_id=device_id, user=request.user)
         phone.last_seen = timezone.now()
         phone.save(update_fields=['last_seen'])
+        presence_registry.touch(request.user.pk, phone.pk)
 
         return Response({
             'message': 'Heartbeat enregistré',
@@ -204,7 +456,8 @@ def device_detection_view(request):
     """
     Endpoint pour la détection automatique de device lors de la connexion.
     Reçoit les informations du device actuel et retourne :
-    - La liste des devices existants
+    - La liste des devices existants (ou seulement les changements depuis
+      le jeton `since`, voir phone_changes_view)
     - Un device correspondant s'il est trouvé automatiquement
     - Les informations nécessaires pour la sélection manuelle
     """
@@ -213,8 +466,18 @@ def device_detection_view(request):
         device_info = request.data
 
         # Récupérer tous les devices de l'utilisateur
-        user_devices = Phone.objects.filter(user=request.user)
-        devices_data = PhoneSerializer(user_devices, many=True).data
+        user_devices = Phone.objects.filter(user=request.user).select_related('user').with_attempt_counts().with_presence()
+
+        # Avec un jeton `since`, seuls les devices modifiés ou supprimés depuis sont renvoyés
+        changes = phone_changes(request.user, device_info.get('since'))
+        devices_data = PhoneSerializer(
+            changes['phones'].select_related('user').with_attempt_counts().with_presence(), many=True
+        ).data
+        sync_data = {
+            'full': changes['full'],
+            'deleted_devices': PhoneTombstoneSerializer(changes['deleted'], many=True).data,
+            'sync_token': changes['sync_token']
+        }
 
         # Essayer de trouver un device correspondant automatiquement
         matching_device = None
@@ -228,7 +491,9 @@ def device_detection_view(request):
                 return Response({
                     'action': 'found_existing',
                     'device': PhoneSerializer(matching_device).data,
+                    'device_token': issue_device_token(matching_device),
                     'devices': devices_data,
+                    **sync_data,
                     'match_method': 'imei',
                     'message': 'Device trouvé par IMEI'
                 })
@@ -242,7 +507,9 @@ def device_detection_view(request):
                 return Response({
                     'action': 'found_existing',
                     'device': PhoneSerializer(matching_device).data,
+                    'device_token': issue_device_token(matching_device),
                     'devices': devices_data,
+                    **sync_data,
                     'match_method': 'serial_number',
                     'message': 'Device trouvé par numéro de série'
                 })
@@ -262,7 +529,9 @@ def device_detection_view(request):
                 return Response({
                     'action': 'found_existing',
                     'device': PhoneSerializer(matching_device).data,
+                    'device_token': issue_device_token(matching_device),
                     'devices': devices_data,
+                    **sync_data,
                     'match_method': 'brand_model_os',
                     'message': 'Device trouvé par caractéristiques techniques'
                 })
@@ -273,6 +542,7 @@ def device_detection_view(request):
             return Response({
                 'action': 'create_new',
                 'devices': [],
+                **sync_data,
                 'current_device_info': device_info,
                 'message': 'Aucun device enregistré, création automatique recommandée'
             })
@@ -281,10 +551,13 @@ def device_detection_view(request):
             return Response({
                 'action': 'need_selection',
                 'devices': devices_data,
+                **sync_data,
                 'current_device_info': device_info,
                 'message': 'Sélection manuelle requise'
             })
 
+    except SyncTokenError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({
             'error': f'Erreur lors de la détection du device: {str(e)}'
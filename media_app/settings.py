@@ -13,6 +13,7 @@ from datetime import timedelta
 import os
 from pathlib import Path
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,6 +43,12 @@ EMAIL_PORT = env("EMAIL_PORT")
 EMAIL_BACKEND = env("EMAIL_BACKEND")
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL", default=EMAIL_HOST_USER)
 
+# File d'envoi des emails (commande send_queued_emails)
+EMAIL_QUEUE_AUTODRAIN = env.bool("EMAIL_QUEUE_AUTODRAIN", default=True)  # False si un worker dédié tourne
+EMAIL_QUEUE_BATCH_SIZE = env.int("EMAIL_QUEUE_BATCH_SIZE", default=50)  # Emails par connexion SMTP
+EMAIL_QUEUE_MAX_ATTEMPTS = env.int("EMAIL_QUEUE_MAX_ATTEMPTS", default=5)
+EMAIL_QUEUE_RETRY_DELAY = env.int("EMAIL_QUEUE_RETRY_DELAY", default=60)  # secondes, doublé à chaque échec
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -85,7 +92,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_THROTTLE_CLASSES': [
         # 'rest_framework.throttling.AnonRateThrottle',
@@ -150,27 +157,50 @@ TEMPLATES = [
 WSGI_APPLICATION = 'media_app.wsgi.application'
 ASGI_APPLICATION = "media_app.asgi.application"
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-        "CONFIG": {
-            "capacity": 1500,  # Augmenter la capacité
-            "expiry": 10,      # Messages expirent après 10 secondes
+# Couche de canaux : Redis dès que CHANNEL_LAYER_URL est défini (plusieurs workers
+# Daphne). La couche en mémoire ne relie que les sockets d'un même processus :
+# elle est réservée au mode DEBUG (dev / tests)
+CHANNEL_LAYER_URL = env("CHANNEL_LAYER_URL", default="")
+CHANNEL_LAYER_CAPACITY = env.int("CHANNEL_LAYER_CAPACITY", default=1500)
+CHANNEL_LAYER_EXPIRY = env.int("CHANNEL_LAYER_EXPIRY", default=10)  # Messages expirent après 10 secondes
+
+if CHANNEL_LAYER_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": env.list("CHANNEL_LAYER_URL"),
+                "capacity": CHANNEL_LAYER_CAPACITY,
+                "expiry": CHANNEL_LAYER_EXPIRY,
+                "group_expiry": env.int("CHANNEL_LAYER_GROUP_EXPIRY", default=86400),
+                "prefix": env("CHANNEL_LAYER_PREFIX", default="antivol"),
+            },
         },
-    },
+    }
+elif not DEBUG:
+    raise ImproperlyConfigured("CHANNEL_LAYER_URL est requis hors mode DEBUG (couche de canaux partagée entre workers)")
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+            "CONFIG": {
+                "capacity": CHANNEL_LAYER_CAPACITY,
+                "expiry": CHANNEL_LAYER_EXPIRY,
+            },
+        },
+    }
+
+# Cache (registre de présence des appareils, résumés par utilisateur, utilisateurs
+# et appareils authentifiés). Il doit être partagé par les workers : une
+# désactivation ou une révocation invalidée dans un seul processus laisserait les
+# autres accepter l'ancien état. Le cache en mémoire est réservé au mode DEBUG.
+CACHE_URL = env("CACHE_URL", default="")
+if not CACHE_URL and not DEBUG:
+    raise ImproperlyConfigured("CACHE_URL est requis hors mode DEBUG (ex: redis://127.0.0.1:6379/1)")
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
 }
 
-# Pour la production, utilisez Redis:
-# CHANNEL_LAYERS = {
-#     "default": {
-#         "BACKEND": "channels_redis.core.RedisChannelLayer",
-#         "CONFIG": {
-#             "hosts": [("127.0.0.1", 6379)],
-#             "capacity": 1500,
-#             "expiry": 10,
-#         },
-#     },
-# }
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
@@ -219,6 +249,28 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+AUTHENTICATION_BACKENDS = [
+    'authentication.backends.EmailBackend',  # Connexion API par email
+    'django.contrib.auth.backends.ModelBackend',  # Admin (nom d'utilisateur)
+]
+
+# Profils de hachage des mots de passe, pour mesurer la latence de connexion.
+# Les autres hashers restent listés pour vérifier les mots de passe existants.
+DEFAULT_PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASHER_PROFILES = {
+    'default': DEFAULT_PASSWORD_HASHERS,
+    'argon2': ['django.contrib.auth.hashers.Argon2PasswordHasher'] + DEFAULT_PASSWORD_HASHERS,
+    'scrypt': ['django.contrib.auth.hashers.ScryptPasswordHasher'] + DEFAULT_PASSWORD_HASHERS,
+}
+PASSWORD_HASHER_PROFILE = env("PASSWORD_HASHER_PROFILE", default="default")
+PASSWORD_HASHERS = PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]
+
 PASSWORD_RESET_TIMEOUT = 300
 
 # Internationalization
@@ -254,6 +306,35 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Configuration pour l'authentification
 FRONTEND_URL = env("FRONTEND_URL", default="")
+AUTH_OBJECT_CACHE = "default"  # Cache partagé des utilisateurs et appareils authentifiés
+AUTH_USER_CACHE_TTL = env.int("AUTH_USER_CACHE_TTL", default=60)  # Cache des utilisateurs JWT (secondes, 0 = désactivé)
+EMAIL_VERIFICATION_CODE_TTL = env.int("EMAIL_VERIFICATION_CODE_TTL", default=86400)  # Validité d'un code (secondes)
+
+# Configuration de l'app devices
+DEVICES_BULK_MAX_ATTEMPTS = env.int("DEVICES_BULK_MAX_ATTEMPTS", default=500)  # Taille max d'un lot de tentatives
+DEVICES_HEARTBEAT_MODE = env("DEVICES_HEARTBEAT_MODE", default="direct")  # 'direct' ou 'buffered'
+DEVICES_HEARTBEAT_FLUSH_INTERVAL = env.int("DEVICES_HEARTBEAT_FLUSH_INTERVAL", default=30)  # secondes
+DEVICES_PRESENCE_CACHE = "default"  # Cache partagé par les workers HTTP et WebSocket
+DEVICES_PRESENCE_TTL = env.int("DEVICES_PRESENCE_TTL", default=300)  # Présence après un heartbeat HTTP
+DEVICES_SOCKET_PRESENCE_TTL = env.int("DEVICES_SOCKET_PRESENCE_TTL", default=120)  # Présence après un ping WebSocket
+DEVICES_PUSH_EVENTS = env.bool("DEVICES_PUSH_EVENTS", default=True)  # Notifier les propriétaires via WebSocket
+DEVICES_TOKEN_MAX_AGE = env.int("DEVICES_TOKEN_MAX_AGE", default=90 * 24 * 3600)  # Validité des jetons d'appareil (secondes)
+DEVICES_TOKEN_CACHE_TTL = env.int("DEVICES_TOKEN_CACHE_TTL", default=60)  # Cache partagé des appareils authentifiés (0 = désactivé)
+DEVICES_UPLOAD_MAX_SIZE = env.int("DEVICES_UPLOAD_MAX_SIZE", default=20 * 1024 * 1024)  # Taille max d'une photo envoyée par morceaux
+DEVICES_UPLOAD_CHUNK_SIZE = env.int("DEVICES_UPLOAD_CHUNK_SIZE", default=512 * 1024)  # Taille de morceau conseillée
+# Fichiers privés, hors de MEDIA_ROOT (servi publiquement par WhiteNoise)
+DEVICES_UPLOAD_TEMP_DIR = env("DEVICES_UPLOAD_TEMP_DIR", default=os.path.join(BASE_DIR, "var", "uploads"))  # Envois en cours
+DEVICES_STORAGE_LOCK_DIR = env("DEVICES_STORAGE_LOCK_DIR", default=os.path.join(BASE_DIR, "var", "locks"))  # Verrous des photos partagées
+DEVICES_UPLOAD_SESSION_TTL = env.int("DEVICES_UPLOAD_SESSION_TTL", default=24 * 3600)  # Envois abandonnés purgés après (secondes)
+DEVICES_PHOTO_RENDITIONS = env.bool("DEVICES_PHOTO_RENDITIONS", default=True)  # Miniatures générées en arrière-plan
+DEVICES_PHOTO_EXIF = env.bool("DEVICES_PHOTO_EXIF", default=True)  # Métadonnées EXIF extraites en arrière-plan
+DEVICES_PAGE_SIZE = env.int("DEVICES_PAGE_SIZE", default=50)  # Taille de page des listes paginées par curseur
+DEVICES_MAX_PAGE_SIZE = env.int("DEVICES_MAX_PAGE_SIZE", default=200)  # Plafond du paramètre ?page_size
+DEVICES_SUMMARY_CACHE = "default"  # Cache des résumés par utilisateur
+DEVICES_SUMMARY_CACHE_TTL = env.int("DEVICES_SUMMARY_CACHE_TTL", default=60)  # Durée de vie d'un résumé (secondes, 0 = désactivé)
+DEVICES_SYNC_TOMBSTONE_TTL = env.int("DEVICES_SYNC_TOMBSTONE_TTL", default=30 * 24 * 3600)  # Rétention des suppressions pour la synchronisation
+DEVICES_SYNC_OVERLAP = env.int("DEVICES_SYNC_OVERLAP", default=5)  # Recouvrement entre deux synchronisations (secondes)
+BACKGROUND_WORKERS = env.int("BACKGROUND_WORKERS", default=4)  # Threads des tâches d'arrière-plan (appareils, emails)
 
 
 # Désactivez temporairement ces paramètres pour le débogage
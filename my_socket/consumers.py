@@ -1,21 +1,203 @@
 import json
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import WebsocketConsumer
 from asgiref.sync import async_to_sync, sync_to_async
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
 
-class NotificationConsumer(WebsocketConsumer):
-    def connect(self):
-# class NotificationConsumer(AsyncWebsocketConsumer):
-#     async def connect(self):
+from authentication.authentication import CachedJWTAuthentication
+from devices.authentication import DeviceTokenAuthentication
+from devices.models import Phone
+from devices.presence import presence_registry
+
+from .layers import owner_group
+
+
+class NotificationProtocolMixin:
+    """Protocole commun (ping / heartbeat / send_notification) des consumers"""
+
+    def authenticate(self):
+        """
+        Identifie l'utilisateur et l'appareil du socket. Les téléphones ne
+        disposent pas de session : ils s'authentifient par la query string
+        (?token=<JWT> ou ?device_token=<jeton d'appareil>). Retourne False si
+        le jeton fourni est invalide.
+        """
+        self.user = self.scope.get('user') or AnonymousUser()
+        self.phone = None
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            if params.get('device_token'):
+                self.user, phone = DeviceTokenAuthentication().authenticate_token(params['device_token'][0])
+                if phone.device_id == self.socket_id:
+                    self.phone = {'pk': phone.pk, 'user_id': phone.user_id}
+                return True
+            if params.get('token'):
+                authenticator = CachedJWTAuthentication()
+                self.user = authenticator.get_user(authenticator.get_validated_token(params['token'][0]))
+        except AuthenticationFailed:
+            return False
+        self.phone = self.resolve_phone()
+        return True
+
+    def resolve_phone(self):
+        """Retrouve l'appareil de l'utilisateur authentifié dont le device_id correspond au socket_id"""
+        if not self.user.is_authenticated:
+            # Un socket anonyme ne peut ni marquer un appareil en ligne ni recevoir ses événements
+            return None
+        return Phone.objects.filter(device_id=self.socket_id, user=self.user).values('pk', 'user_id').first()
+
+    def get_owner_group(self):
+        """Groupe de l'utilisateur authentifié (propriétaire des appareils)"""
+        if self.user.is_authenticated:
+            return owner_group(self.user.pk)
+        return None
+
+    def add_presence(self):
+        """Compte le socket parmi les connexions ouvertes de l'appareil"""
+        if getattr(self, 'phone', None):
+            presence_registry.socket_opened(
+                self.phone['user_id'],
+                self.phone['pk'],
+                ttl=settings.DEVICES_SOCKET_PRESENCE_TTL
+            )
+            self.presence_counted = True
+
+    def touch_presence(self):
+        """Prolonge la présence de l'appareil connecté"""
+        if getattr(self, 'presence_counted', False):
+            presence_registry.socket_alive(
+                self.phone['user_id'],
+                self.phone['pk'],
+                ttl=settings.DEVICES_SOCKET_PRESENCE_TTL
+            )
+
+    def remove_presence(self):
+        """
+        Décompte le socket : l'appareil reste en ligne tant qu'un autre socket
+        est ouvert ou qu'un heartbeat HTTP récent n'a pas expiré
+        """
+        if getattr(self, 'presence_counted', False):
+            presence_registry.socket_closed(self.phone['user_id'], self.phone['pk'])
+            self.presence_counted = False
+
+    def build_reply(self, data):
+        """Construit la réponse à un message client (None si aucune réponse)"""
+        message_type = data.get('type', '')
+
+        if message_type == 'ping':
+            # Répondre au ping pour maintenir la connexion
+            return {
+                'type': 'pong',
+                'timestamp': data.get('timestamp')
+            }
+        elif message_type == 'heartbeat':
+            # Heartbeat pour vérifier que la connexion est active
+            return {
+                'type': 'heartbeat_ack',
+                'status': 'alive'
+            }
+        print(f"Message reçu: {data}")
+        return None
+
+    def build_notification(self, event):
+        return {
+            'event': event.get('event'),
+            'type': event.get('my_type'),
+            'data': event.get('data'),
+            'message': event.get('message')
+        }
+
+
+class NotificationConsumer(NotificationProtocolMixin, AsyncWebsocketConsumer):
+    """
+    Consumer asynchrone : un socket inactif ne mobilise aucun thread, seules
+    les opérations base de données / cache passent par un thread.
+    """
+
+    async def connect(self):
         try:
-            self.user = self.scope['user']
             self.socket_id = self.scope['url_route']['kwargs']['socket_id']
-            # self.socket_id = "toto"
+            if not await database_sync_to_async(self.authenticate)():
+                await self.close(code=4001)  # Jeton invalide ou expiré
+                return
+
+            print(f"WebSocket connecting for socket_id: {self.socket_id}")
+
+            # Add the socket to the group
+            await self.channel_layer.group_add(
+                self.socket_id,
+                self.channel_name
+            )
+            await self.accept()
+            print(f"WebSocket connection accepted for: {self.socket_id}")
+
+            # Enregistrer la présence de l'appareil associé au socket
+            if self.phone:
+                await sync_to_async(self.add_presence, thread_sensitive=False)()
 
-            # Vérifier si l'utilisateur est authentifié (optionnel)
-            # if not self.user.is_authenticated:
-            #     self.close(code=4001)  # Code d'erreur personnalisé pour non-authentifié
-            #     return
+            # Rejoindre le groupe du propriétaire pour recevoir les événements d'intrusion
+            self.owner_group = self.get_owner_group()
+            if self.owner_group:
+                await self.channel_layer.group_add(self.owner_group, self.channel_name)
+        except Exception as e:
+            print(f"Error during WebSocket connection: {e}")
+            await self.close(code=4000)  # Code d'erreur générique
+
+    async def disconnect(self, close_code):
+        if not hasattr(self, 'socket_id'):
+            return
+        # Nettoyer le groupe avant la déconnexion
+        await self.channel_layer.group_discard(
+            self.socket_id,
+            self.channel_name
+        )
+        if getattr(self, 'owner_group', None):
+            await self.channel_layer.group_discard(self.owner_group, self.channel_name)
+        if getattr(self, 'presence_counted', False):
+            await sync_to_async(self.remove_presence, thread_sensitive=False)()
+        # Ne pas appeler self.close() ici - la déconnexion est déjà en cours
+        print(f"WebSocket disconnected with code: {close_code}")
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """
+        Gérer les messages reçus du client pour maintenir la connexion active
+        """
+        try:
+            data = json.loads(text_data)
+
+            if data.get('type') in ('ping', 'heartbeat') and getattr(self, 'presence_counted', False):
+                await sync_to_async(self.touch_presence, thread_sensitive=False)()
+
+            reply = self.build_reply(data)
+            if reply is not None:
+                await self.send(text_data=json.dumps(reply))
+
+        except json.JSONDecodeError:
+            print(f"Message non-JSON reçu: {text_data}")
+        except Exception as e:
+            print(f"Erreur lors du traitement du message: {e}")
+
+    async def send_notification(self, event):
+        await self.send(text_data=json.dumps(self.build_notification(event)))
+
+
+class SyncNotificationConsumer(NotificationProtocolMixin, WebsocketConsumer):
+    """
+    Ancienne implémentation synchrone : chaque message passe par le thread
+    synchrone partagé. Conservée pour comparaison (commande ws_load_test).
+    """
+
+    def connect(self):
+        try:
+            self.socket_id = self.scope['url_route']['kwargs']['socket_id']
+            if not self.authenticate():
+                self.close(code=4001)  # Jeton invalide ou expiré
+                return
 
             print(f"WebSocket connecting for socket_id: {self.socket_id}")
 
@@ -26,51 +208,45 @@ class NotificationConsumer(WebsocketConsumer):
             )
             self.accept()
             print(f"WebSocket connection accepted for: {self.socket_id}")
-            # await self.accept()
 
-            # Update the is_connected field to True
+            # Enregistrer la présence de l'appareil associé au socket
+            self.add_presence()
+
+            # Rejoindre le groupe du propriétaire pour recevoir les événements d'intrusion
+            self.owner_group = self.get_owner_group()
+            if self.owner_group:
+                async_to_sync(self.channel_layer.group_add)(self.owner_group, self.channel_name)
         except Exception as e:
             print(f"Error during WebSocket connection: {e}")
             self.close(code=4000)  # Code d'erreur générique
 
-        
-        
     def disconnect(self, close_code):
-    # async def disconnect(self, close_code):
+        if not hasattr(self, 'socket_id'):
+            return
         # Nettoyer le groupe avant la déconnexion
         async_to_sync(self.channel_layer.group_discard)(
-                self.socket_id,
-                self.channel_name
-            )
+            self.socket_id,
+            self.channel_name
+        )
+        if getattr(self, 'owner_group', None):
+            async_to_sync(self.channel_layer.group_discard)(self.owner_group, self.channel_name)
+        self.remove_presence()
         # Ne pas appeler self.close() ici - la déconnexion est déjà en cours
         print(f"WebSocket disconnected with code: {close_code}")
-        # await self.close()
-            
-            # Update the is_connected field to False
-
 
-    def receive(self, text_data):
+    def receive(self, text_data=None, bytes_data=None):
         """
         Gérer les messages reçus du client pour maintenir la connexion active
         """
         try:
             data = json.loads(text_data)
-            message_type = data.get('type', '')
-
-            if message_type == 'ping':
-                # Répondre au ping pour maintenir la connexion
-                self.send(text_data=json.dumps({
-                    'type': 'pong',
-                    'timestamp': data.get('timestamp')
-                }))
-            elif message_type == 'heartbeat':
-                # Heartbeat pour vérifier que la connexion est active
-                self.send(text_data=json.dumps({
-                    'type': 'heartbeat_ack',
-                    'status': 'alive'
-                }))
-            else:
-                print(f"Message reçu: {data}")
+
+            if data.get('type') in ('ping', 'heartbeat'):
+                self.touch_presence()
+
+            reply = self.build_reply(data)
+            if reply is not None:
+                self.send(text_data=json.dumps(reply))
 
         except json.JSONDecodeError:
             print(f"Message non-JSON reçu: {text_data}")
@@ -78,13 +254,4 @@ class NotificationConsumer(WebsocketConsumer):
             print(f"Erreur lors du traitement du message: {e}")
 
     def send_notification(self, event):
-        message = event.get('message')
-        type = event.get('my_type')
-        data = event.get('data')
-        my_event = event.get('event')
-        self.send(text_data=json.dumps({
-            'event': my_event,
-            'type': type,
-            'data': data,
-            'message': message
-        }))
\ No newline at end of file
+        self.send(text_data=json.dumps(self.build_notification(event)))
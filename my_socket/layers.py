@@ -0,0 +1,42 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+def build_notification(event, data=None, message=None, my_type=None):
+    """Construit un message traité par NotificationConsumer.send_notification"""
+    return {
+        'type': 'send_notification',
+        'event': event,
+        'my_type': my_type,
+        'data': data,
+        'message': message,
+    }
+
+
+async def agroup_send_many(messages, layer=None):
+    """
+    Envoie un lot de messages [(groupe, message), ...] sur la couche de
+    canaux. Les envois sont concurrents dans un seul passage de la boucle
+    d'événements (un aller-retour Redis par groupe, mais en parallèle).
+    """
+    layer = layer or get_channel_layer()
+    if layer is None or not messages:
+        return 0
+    await asyncio.gather(*[layer.group_send(group, message) for group, message in messages])
+    return len(messages)
+
+
+def group_send_many(messages, layer=None):
+    """Version synchrone de agroup_send_many (un seul passage dans la boucle)"""
+    return async_to_sync(agroup_send_many)(messages, layer)
+
+
+def group_send(group, message, layer=None):
+    return group_send_many([(group, message)], layer)
+
+
+def owner_group(user_id):
+    """Groupe rejoint par tous les sockets des appareils d'un utilisateur"""
+    return f'owner.{user_id}'
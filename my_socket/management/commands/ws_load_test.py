@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+import io
+import json
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.urls import re_path
+
+from my_socket.consumers import NotificationConsumer, SyncNotificationConsumer
+
+CONSUMERS = {
+    'async': NotificationConsumer,
+    'sync': SyncNotificationConsumer,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge WebSocket en processus : ouvre N connexions sur le "
+        "consumer synchrone (avant) et asynchrone (après), envoie un ping sur "
+        "chacune et compare le nombre de connexions tenues et les débits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000, help='Nombre de connexions simultanées')
+        parser.add_argument('--consumer', choices=['both', 'async', 'sync'], default='both')
+        parser.add_argument('--timeout', type=float, default=10, help='Délai max par opération (secondes)')
+
+    def handle(self, *args, **options):
+        names = ['sync', 'async'] if options['consumer'] == 'both' else [options['consumer']]
+
+        self.stdout.write(
+            f"{'consumer':<8} {'connectées':>10} {'connexion/s':>12} {'ping/s':>10} {'threads max':>12}"
+        )
+        for name in names:
+            # Les consumers affichent chaque connexion : on masque ces traces
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = async_to_sync(self.run_load)(
+                    CONSUMERS[name], options['connections'], options['timeout']
+                )
+            self.stdout.write(
+                f"{name:<8} {result['connected']:>10} {result['connect_rate']:>12.0f} "
+                f"{result['ping_rate']:>10.0f} {result['max_threads']:>12}"
+            )
+
+    async def run_load(self, consumer_class, connections, timeout):
+        application = URLRouter([
+            re_path(r'ws/notifications/(?P<socket_id>\w+)/$', consumer_class.as_asgi()),
+        ])
+        max_threads = threading.active_count()
+
+        async def open_connection(index):
+            communicator = WebsocketCommunicator(application, f'/ws/notifications/load{index}/')
+            communicator.scope['user'] = AnonymousUser()
+            try:
+                connected, _ = await communicator.connect(timeout=timeout)
+            except asyncio.TimeoutError:
+                connected = False
+            return communicator if connected else None
+
+        async def ping(communicator):
+            await communicator.send_to(text_data=json.dumps({'type': 'ping', 'timestamp': 0}))
+            try:
+                return json.loads(await communicator.receive_from(timeout=timeout))['type'] == 'pong'
+            except asyncio.TimeoutError:
+                return False
+
+        start = time.perf_counter()
+        communicators = await asyncio.gather(*[open_connection(i) for i in range(connections)])
+        connect_time = time.perf_counter() - start
+        communicators = [communicator for communicator in communicators if communicator]
+        max_threads = max(max_threads, threading.active_count())
+
+        start = time.perf_counter()
+        pongs = await asyncio.gather(*[ping(communicator) for communicator in communicators])
+        ping_time = time.perf_counter() - start
+        max_threads = max(max_threads, threading.active_count())
+
+        await asyncio.gather(*[communicator.disconnect() for communicator in communicators])
+
+        return {
+            'connected': len(communicators),
+            'connect_rate': len(communicators) / connect_time if connect_time else 0,
+            'ping_rate': sum(pongs) / ping_time if ping_time else 0,
+            'max_threads': max_threads,
+        }
@@ -1,3 +1,119 @@
+import json
+
+from asgiref.sync import sync_to_async
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import re_path
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from devices.authentication import issue_device_token
+from devices.models import Phone
+from devices.presence import presence_registry
+
+from .consumers import NotificationConsumer
+from .layers import agroup_send_many, build_notification, group_send_many, owner_group
+
+application = URLRouter([
+    re_path(r'ws/notifications/(?P<socket_id>\w+)/$', NotificationConsumer.as_asgi()),
+])
+
+
+class NotificationConsumerAuthTest(TestCase):
+    """Vérifie qu'un socket ne reçoit les événements d'un propriétaire qu'avec un jeton valide"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.phone = Phone.objects.create(user=self.user, device_id='device1', name='Phone')
+
+    async def connect(self, query=''):
+        communicator = WebsocketCommunicator(application, f'/ws/notifications/device1/{query}')
+        communicator.scope['user'] = AnonymousUser()
+        connected, code = await communicator.connect()
+        if connected:
+            # Le groupe du propriétaire est rejoint après l'acceptation : attendre la fin de connect()
+            await communicator.send_to(text_data=json.dumps({'type': 'ping'}))
+            await communicator.receive_from()
+        return communicator, connected, code
+
+    async def notify_owner(self):
+        await get_channel_layer().group_send(
+            owner_group(self.user.pk), build_notification('unlock_attempt_created', data={'id': 1})
+        )
+
+    async def test_anonymous_socket_gets_no_owner_events_nor_presence(self):
+        communicator, connected, _ = await self.connect()
+        self.assertTrue(connected)
+        await self.notify_owner()
+        self.assertTrue(await communicator.receive_nothing())
+        self.assertFalse(await sync_to_async(presence_registry.is_online)(self.user.pk, self.phone.pk))
+        await communicator.disconnect()
+
+    async def test_device_token_joins_owner_group(self):
+        token = await sync_to_async(issue_device_token)(self.phone)
+        communicator, connected, _ = await self.connect(f'?device_token={token}')
+        self.assertTrue(connected)
+        self.assertTrue(await sync_to_async(presence_registry.is_online)(self.user.pk, self.phone.pk))
+        await self.notify_owner()
+        message = json.loads(await communicator.receive_from())
+        self.assertEqual(message['event'], 'unlock_attempt_created')
+        await communicator.disconnect()
+
+    async def test_presence_survives_until_last_socket_closes(self):
+        token = await sync_to_async(issue_device_token)(self.phone)
+        first, _, _ = await self.connect(f'?device_token={token}')
+        second, _, _ = await self.connect(f'?device_token={token}')
+        is_online = sync_to_async(presence_registry.is_online)
+
+        await first.disconnect()
+        self.assertTrue(await is_online(self.user.pk, self.phone.pk))
+        await second.disconnect()
+        self.assertFalse(await is_online(self.user.pk, self.phone.pk))
+
+    async def test_jwt_joins_owner_group(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+        communicator, connected, _ = await self.connect(f'?token={token}')
+        self.assertTrue(connected)
+        await self.notify_owner()
+        self.assertEqual(json.loads(await communicator.receive_from())['event'], 'unlock_attempt_created')
+        await communicator.disconnect()
+
+    async def test_invalid_token_is_rejected(self):
+        _, connected, code = await self.connect('?device_token=forged')
+        self.assertFalse(connected)
+        self.assertEqual(code, 4001)
+
+
+class NotificationLayerTest(TestCase):
+    """Vérifie la construction des notifications et l'envoi groupé sur la couche de canaux"""
+
+    def test_build_notification_targets_the_consumer_handler(self):
+        self.assertEqual(build_notification('phone_updated', data={'id': 1}), {
+            'type': 'send_notification',
+            'event': 'phone_updated',
+            'my_type': None,
+            'data': {'id': 1},
+            'message': None,
+        })
+
+    async def test_group_send_many_reaches_every_group(self):
+        layer = InMemoryChannelLayer()
+        first, second = await layer.new_channel(), await layer.new_channel()
+        await layer.group_add(owner_group(1), first)
+        await layer.group_add(owner_group(2), second)
+
+        sent = await sync_to_async(group_send_many)([
+            (owner_group(1), build_notification('a')),
+            (owner_group(2), build_notification('b')),
+            (owner_group(3), build_notification('c')),
+        ], layer)
+        self.assertEqual(sent, 3)
+        self.assertEqual((await layer.receive(first))['event'], 'a')
+        self.assertEqual((await layer.receive(second))['event'], 'b')
 
-# Create your tests here.
+    async def test_empty_batch_sends_nothing(self):
+        self.assertEqual(await agroup_send_many([], InMemoryChannelLayer()), 0)